@@ -5,14 +5,21 @@ Production-grade API for multi-agent AI learning assistant
 
 import os
 import sys
+import re
+import json
+import time
+import asyncio
 import logging
-from datetime import datetime
-from typing import Dict, List, Optional
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Callable, Iterator, AsyncIterator
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from pydantic import BaseModel, Field
 import yaml
 import uvicorn
@@ -20,10 +27,15 @@ import uvicorn
 # Add src to path for imports
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-from studybuddy.core.llm_client import ensure_production_llm, QwenLangChainLLM
-from studybuddy.agents.tutor import TutorAgent
-from studybuddy.agents.session import SessionAgent
-from studybuddy.agents.goal import GoalAgent
+from studybuddy.core.metrics import LatencyMetrics, prometheus_sample
+from studybuddy.core.model_registry import model_registry
+from studybuddy.core.request_scheduler import Priority, request_context
+from studybuddy.core.response_cache import ResponseCache
+from studybuddy.agents.agent_pool import AgentPool, STUDENT_ID_PATTERN
+from studybuddy.agents.context_gathering import context_gatherer
+from studybuddy.agents.length_policy import length_metrics, length_policy_stats
+from studybuddy.tools.search_index import search_index
+from studybuddy.tools.search_cache import search_result_cache, web_search_breaker
 
 # Configure logging
 logging.basicConfig(
@@ -32,11 +44,21 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Global agents (initialized on startup)
-tutor_agent = None
-session_agent = None
-goal_agent = None
+# Global agent pool and shared LLM client (initialized on startup)
+agent_pool = None
 llm_client = None
+# Model slots this process holds references to, released on shutdown
+model_references = []
+
+# Process start, for uptime, and request latency per endpoint and agent type
+STARTED_AT = time.time()
+api_metrics = LatencyMetrics(namespace="studybuddy_api")
+
+DEFAULT_STUDENT_ID = "default_student"
+
+# Agent method behind each agent type, blocking and streaming
+AGENT_METHODS = {"tutor": "teach", "session": "manage_time", "goal": "coach"}
+AGENT_STREAM_METHODS = {"tutor": "teach_stream", "session": "manage_time_stream", "goal": "coach_stream"}
 
 # Load configuration
 def load_config():
@@ -54,34 +76,259 @@ def load_config():
 
 config = load_config()
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    """Initialize and cleanup resources"""
-    global tutor_agent, session_agent, goal_agent, llm_client
+
+class InferenceQueueFullError(Exception):
+    """Raised when the inference executor has no free worker or queue slot"""
+    pass
+
+
+class InferenceExecutor:
+    """
+    Runs blocking agent calls on a dedicated thread pool so the event loop
+    stays free for health checks and other requests.
     
-    logger.info("🚀 Starting StudyBuddy API...")
+    At most `max_workers` calls run at once and at most `max_queue_size`
+    more may wait; anything beyond that is rejected immediately.
+    """
     
-    try:
-        # Initialize LLM client
-        logger.info("🧠 Initializing LLM client...")
-        llm_client = ensure_production_llm()
-        langchain_llm = QwenLangChainLLM(llm_client)
+    def __init__(self, max_workers: int = 4, max_queue_size: int = 32):
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="studybuddy-inference")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+    
+    def _acquire(self):
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue_size:
+                self.rejected += 1
+                raise InferenceQueueFullError("Inference queue is full")
+            self._pending += 1
+    
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+            self.completed += 1
+    
+    async def run(self, func: Callable, *args, **kwargs):
+        """Run func(*args, **kwargs) on the inference pool and await its result"""
+        self._acquire()
         
-        # Initialize agents
-        logger.info("🤖 Initializing agents...")
-        tutor_agent = TutorAgent(langchain_llm)
-        session_agent = SessionAgent(langchain_llm)
-        goal_agent = GoalAgent(langchain_llm)
+        def job():
+            # The slot is held until the work itself finishes, even if the caller gave up
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._release()
         
-        logger.info("✅ StudyBuddy API initialized successfully!")
+        try:
+            future = self._executor.submit(job)
+        except Exception:
+            self._release()
+            raise
+        return await asyncio.wrap_future(future)
+    
+    async def stream(self, chunks: Iterator[str]) -> AsyncIterator[str]:
+        """
+        Advance a blocking chunk iterator on the inference pool, holding one slot throughout.
         
+        If the consumer stops early (e.g. the client disconnected) the
+        iterator is closed on the pool, which releases the agent lease and
+        cancels the generation, and only then is the slot freed.
+        """
+        self._acquire()
+        done = object()
+        finished = False
+        step = None
+        # Steps may land on different workers; one Context keeps the stream's
+        # request context (priority, student, deadline) intact across them
+        context = contextvars.copy_context()
+        try:
+            while True:
+                step = self._executor.submit(context.run, next, chunks, done)
+                chunk = await asyncio.wrap_future(step)
+                if chunk is done:
+                    finished = True
+                    break
+                yield chunk
+        finally:
+            if finished or not hasattr(chunks, "close"):
+                self._release()
+            else:
+                self._executor.submit(self._close_stream, chunks, context, step)
+    
+    def _close_stream(self, chunks, context: contextvars.Context, step):
+        """Close an abandoned chunk generator once its last step is done, then free its slot"""
+        try:
+            if step is not None:
+                # A generator cannot be closed while another thread is advancing it
+                wait([step])
+            context.run(chunks.close)
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to close abandoned stream: {e}")
+        finally:
+            self._release()
+    
+    def get_stats(self) -> Dict:
+        """Executor load for monitoring"""
+        with self._lock:
+            pending = self._pending
+        return {
+            "max_workers": self.max_workers,
+            "max_queue_size": self.max_queue_size,
+            "in_flight": min(pending, self.max_workers),
+            "queued": max(pending - self.max_workers, 0),
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
+    
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+performance_config = config.get('performance', {})
+inference_executor = InferenceExecutor(
+    max_workers=performance_config.get('max_concurrent_requests', 4),
+    max_queue_size=performance_config.get('max_queued_requests', 32)
+)
+RETRY_AFTER_SECONDS = performance_config.get('retry_after_seconds', 5)
+# Agent calls still running after this long answer 504, and their queued LLM work is dropped
+REQUEST_TIMEOUT_SECONDS = performance_config.get('request_timeout_seconds', 300)
+
+
+def queue_full_error() -> HTTPException:
+    """503 response telling the client when to retry"""
+    return HTTPException(
+        status_code=503,
+        detail="StudyBuddy is busy right now, please retry shortly",
+        headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+    )
+
+
+def request_deadline() -> float:
+    """Monotonic time after which nobody is waiting for a request's answer"""
+    return time.monotonic() + REQUEST_TIMEOUT_SECONDS
+
+
+async def run_inference(func: Callable, *args, **kwargs):
+    """Run a blocking agent call off the event loop, mapping a full queue to 503 and a timeout to 504"""
+    try:
+        return await asyncio.wait_for(inference_executor.run(func, *args, **kwargs), REQUEST_TIMEOUT_SECONDS)
+    except InferenceQueueFullError:
+        raise queue_full_error()
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="StudyBuddy took too long to answer, please try again")
+
+# Startup progress, reported by the readiness endpoint
+startup_state = {"status": "starting", "error": None, "timings": {}}
+
+
+def initialize_services():
+    """Load the LLM client and agent pool, recording how long each phase takes"""
+    global agent_pool, llm_client
+    timings = startup_state["timings"]
+    started_at = time.perf_counter()
+    
+    # Initialize LLM client
+    logger.info("🧠 Initializing LLM client...")
+    llm_client = model_registry.acquire("default")
+    model_references.append("default")
+    # Shares the default model unless model_config.yaml gives tools their own
+    tool_llm_client = None
+    if "tool" in model_registry.slot_names():
+        tool_llm_client = model_registry.acquire("tool")
+        model_references.append("tool")
+    timings["llm_client_seconds"] = round(time.perf_counter() - started_at, 3)
+    timings.update(llm_client.load_timings)
+    
+    performance_config = config.get('performance', {})
+    if performance_config.get('enable_caching', False) and llm_client.response_cache is None:
+        llm_client.response_cache = ResponseCache(
+            max_entries=performance_config.get('cache_max_entries', 1024),
+            ttl_seconds=performance_config.get('cache_ttl_seconds', 3600),
+            disk_path=performance_config.get('cache_path', './cache/responses.sqlite')
+        )
+        logger.info("💾 Response cache enabled")
+    
+    # Offline search index; only new or changed corpus files are parsed
+    search_config = config.get('search', {})
+    project_dir = os.path.join(os.path.dirname(__file__), '..')
+    corpus_paths = [os.path.join(project_dir, path) for path in search_config.get('corpus_paths', [])]
+    # Resolved like the corpus, so the API opens the index build_search_index.py wrote
+    index_path = search_config.get('index_path')
+    search_index.configure(corpus_paths=corpus_paths or None,
+                           index_path=os.path.join(project_dir, index_path) if index_path else None)
+    index_started_at = time.perf_counter()
+    search_index.update()
+    timings["search_index_seconds"] = round(time.perf_counter() - index_started_at, 3)
+    
+    # Repeated web searches come from the cache; a failing backend is skipped for a while
+    search_result_cache.configure(
+        max_entries=search_config.get('result_cache_max_entries'),
+        ttl_seconds=search_config.get('result_cache_ttl_seconds'),
+        negative_ttl_seconds=search_config.get('negative_ttl_seconds'),
+        disk_path=search_config.get('result_cache_path')
+    )
+    web_search_breaker.failure_threshold = search_config.get('failure_threshold', web_search_breaker.failure_threshold)
+    web_search_breaker.cooldown_seconds = search_config.get('cooldown_seconds', web_search_breaker.cooldown_seconds)
+    
+    # Per-student agents are created on demand and all share the one LLM client
+    logger.info("🤖 Initializing agent pool...")
+    agent_pool = AgentPool(
+        llm_client,
+        state_dir=config.get('storage', {}).get('agents_dir', './data/agents'),
+        max_agents=performance_config.get('max_loaded_agents', 256),
+        max_history=performance_config.get('max_agent_history', 200),
+        tool_llm_client=tool_llm_client,
+        agent_options={"tutor": config.get('tutor', {})}
+    )
+    timings["total_seconds"] = round(time.perf_counter() - started_at, 3)
+
+
+async def run_startup():
+    """Initialize off the event loop and record the outcome for /health/ready"""
+    try:
+        await asyncio.to_thread(initialize_services)
     except Exception as e:
         logger.error(f"❌ Failed to initialize StudyBuddy API: {e}")
+        startup_state["status"] = "failed"
+        startup_state["error"] = str(e)
         raise
+    startup_state["status"] = "ready"
+    logger.info(f"✅ StudyBuddy API ready in {startup_state['timings']['total_seconds']}s")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize and cleanup resources"""
+    logger.info("🚀 Starting StudyBuddy API...")
+    
+    startup_task = None
+    if config.get('startup', {}).get('background_load', True):
+        # Serve liveness checks while the model loads; /health/ready flips once it is up
+        startup_task = asyncio.create_task(run_startup())
+    else:
+        await run_startup()
     
     yield
     
     logger.info("🔄 Shutting down StudyBuddy API...")
+    if startup_task is not None:
+        # The loading thread cannot be interrupted; let it finish before cleaning up
+        try:
+            await startup_task
+        except Exception:
+            pass
+    inference_executor.shutdown()
+    context_gatherer.shutdown()
+    search_result_cache.close()
+    if agent_pool is not None:
+        agent_pool.save_all()
+    while model_references:
+        model_registry.release(model_references.pop())
+    model_registry.unload_all()
 
 # Create FastAPI app
 app = FastAPI(
@@ -100,10 +347,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Observe handler latency per route; streams are timed until their headers are sent"""
+    started_at = time.perf_counter()
+    response = await call_next(request)
+    # Label with the route template, not the raw path, to keep series bounded
+    route = request.scope.get("route")
+    api_metrics.observe(
+        "http_request_seconds",
+        time.perf_counter() - started_at,
+        endpoint=getattr(route, "path", "unmatched"),
+        method=request.method,
+        status=str(response.status_code)
+    )
+    return response
+
 # Pydantic models for request/response
 class ChatRequest(BaseModel):
     message: str = Field(..., description="User message to send to the agent")
     agent_type: str = Field(..., description="Type of agent: 'tutor', 'session', or 'goal'")
+    student_id: str = Field(default=DEFAULT_STUDENT_ID, pattern=STUDENT_ID_PATTERN,
+                            description="Student whose agents and history to use")
     context: Optional[Dict] = Field(default=None, description="Additional context for the request")
 
 class ChatResponse(BaseModel):
@@ -121,25 +386,40 @@ class HealthResponse(BaseModel):
 class SystemStatsResponse(BaseModel):
     llm_stats: Dict = Field(..., description="LLM usage statistics")
     uptime: str = Field(..., description="API uptime")
+    uptime_seconds: float = Field(default=0.0, description="API uptime in seconds")
+    latency: Dict = Field(default_factory=dict, description="Request latency percentiles per endpoint and agent type")
     agents_status: Dict = Field(..., description="Agent status information")
+    inference_stats: Dict = Field(default_factory=dict, description="Inference executor load")
 
-# Dependency to get the appropriate agent
-def get_agent(agent_type: str):
-    """Get the appropriate agent based on type"""
-    if agent_type == "tutor":
-        if tutor_agent is None:
-            raise HTTPException(status_code=503, detail="TutorAgent not initialized")
-        return tutor_agent
-    elif agent_type == "session":
-        if session_agent is None:
-            raise HTTPException(status_code=503, detail="SessionAgent not initialized")
-        return session_agent
-    elif agent_type == "goal":
-        if goal_agent is None:
-            raise HTTPException(status_code=503, detail="GoalAgent not initialized")
-        return goal_agent
-    else:
+# Validate an agent request before it is queued
+def check_agent_request(agent_type: str, student_id: str = DEFAULT_STUDENT_ID):
+    """Raise an HTTP error for unknown agents, bad student ids or an uninitialized pool"""
+    if agent_type not in AGENT_METHODS:
         raise HTTPException(status_code=400, detail=f"Invalid agent type: {agent_type}")
+    if not re.match(STUDENT_ID_PATTERN, student_id):
+        raise HTTPException(status_code=400, detail=f"Invalid student id: {student_id}")
+    if agent_pool is None:
+        raise HTTPException(status_code=503, detail="Agents not initialized")
+
+
+def call_agent(student_id: str, agent_type: str, message: str, deadline: Optional[float] = None) -> str:
+    """
+    Run an agent's main method; runs on the inference pool, including agent hydration.
+    Its LLM calls are scheduled as the student's interactive requests until `deadline`.
+    """
+    with api_metrics.time("agent_request_seconds", agent_type=agent_type):
+        with request_context(priority=Priority.INTERACTIVE, student_id=student_id, deadline=deadline):
+            with agent_pool.lease(student_id, agent_type) as agent:
+                return getattr(agent, AGENT_METHODS[agent_type])(message)
+
+
+def stream_agent(student_id: str, agent_type: str, message: str,
+                 deadline: Optional[float] = None) -> Iterator[str]:
+    """Streaming counterpart of call_agent; the agent stays leased until the stream ends"""
+    with api_metrics.time("agent_stream_seconds", agent_type=agent_type):
+        with request_context(priority=Priority.INTERACTIVE, student_id=student_id, deadline=deadline):
+            with agent_pool.lease(student_id, agent_type) as agent:
+                yield from getattr(agent, AGENT_STREAM_METHODS[agent_type])(message)
 
 # API Routes
 @app.get("/", response_model=Dict)
@@ -152,21 +432,20 @@ async def root():
         "health": "/health",
         "endpoints": {
             "chat": "/chat",
+            "chat_stream": "/chat/stream",
             "health": "/health", 
-            "stats": "/stats"
+            "live": "/health/live",
+            "ready": "/health/ready",
+            "stats": "/stats",
+            "metrics": "/metrics"
         }
     }
 
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
-    agents_loaded = []
-    if tutor_agent is not None:
-        agents_loaded.append("tutor")
-    if session_agent is not None:
-        agents_loaded.append("session")
-    if goal_agent is not None:
-        agents_loaded.append("goal")
+    # Agents are created per student on demand, so all types are available once the pool is up
+    agents_loaded = list(AGENT_METHODS) if agent_pool is not None else []
     
     return HealthResponse(
         status="healthy" if len(agents_loaded) == 3 else "degraded",
@@ -174,6 +453,26 @@ async def health_check():
         agents_loaded=agents_loaded
     )
 
+@app.get("/health/live")
+async def liveness_check():
+    """Liveness probe: the process is serving requests, even while the model loads"""
+    if startup_state["status"] == "failed":
+        return JSONResponse(status_code=503, content={"status": "failed", "error": startup_state["error"]})
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness probe: 200 once the model is loaded and warmed up, with load-phase timings"""
+    content = {
+        "status": startup_state["status"],
+        "timings": startup_state["timings"],
+    }
+    if startup_state["status"] != "ready":
+        if startup_state["error"]:
+            content["error"] = startup_state["error"]
+        return JSONResponse(status_code=503, content=content, headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+    return content
+
 @app.get("/stats", response_model=SystemStatsResponse)
 async def get_system_stats():
     """Get system statistics"""
@@ -181,59 +480,143 @@ async def get_system_stats():
         raise HTTPException(status_code=503, detail="LLM client not initialized")
     
     llm_stats = llm_client.get_stats()
-    
-    agents_status = {
-        "tutor": tutor_agent is not None,
-        "session": session_agent is not None,
-        "goal": goal_agent is not None
+    llm_stats["models"] = model_registry.get_stats()
+    llm_stats["context_gathering"] = context_gatherer.get_stats()
+    llm_stats["search_index"] = search_index.get_stats()
+    llm_stats["web_search"] = {
+        "result_cache": search_result_cache.get_stats(),
+        "circuit_breaker": web_search_breaker.get_stats()
     }
     
+    agents_status = {agent_type: agent_pool is not None for agent_type in AGENT_METHODS}
+    if agent_pool is not None:
+        agents_status["loaded"] = agent_pool.loaded_agent_types()
+        agents_status["pool"] = agent_pool.get_stats()
+    agents_status["length_policy"] = length_policy_stats()
+    
+    uptime_seconds = time.time() - STARTED_AT
     return SystemStatsResponse(
         llm_stats=llm_stats,
-        uptime="Runtime stats not implemented",  # Could add actual uptime tracking
-        agents_status=agents_status
+        uptime=str(timedelta(seconds=int(uptime_seconds))),
+        uptime_seconds=round(uptime_seconds, 1),
+        latency=api_metrics.to_dict(),
+        agents_status=agents_status,
+        inference_stats=inference_executor.get_stats()
     )
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus metrics: latency histograms plus load gauges and counters"""
+    parts = [
+        prometheus_sample("studybuddy_uptime_seconds", round(time.time() - STARTED_AT, 1),
+                          help_text="Seconds since the API process started"),
+        api_metrics.to_prometheus(),
+    ]
+    
+    inference_stats = inference_executor.get_stats()
+    parts.append(prometheus_sample("studybuddy_inference_in_flight", inference_stats["in_flight"],
+                                   help_text="Agent calls running on the inference pool"))
+    parts.append(prometheus_sample("studybuddy_inference_queued", inference_stats["queued"],
+                                   help_text="Agent calls waiting for an inference slot"))
+    parts.append(prometheus_sample("studybuddy_inference_rejected_total", inference_stats["rejected"],
+                                   metric_type="counter", help_text="Agent calls rejected with 503"))
+    
+    if llm_client is not None:
+        parts.append(prometheus_sample("studybuddy_llm_in_flight", llm_client.in_flight,
+                                       help_text="Generations currently running"))
+        parts.append(prometheus_sample("studybuddy_llm_requests_total", llm_client.request_count,
+                                       metric_type="counter", help_text="Generation requests received"))
+        parts.append(prometheus_sample("studybuddy_llm_tokens_total", llm_client.total_tokens_generated,
+                                       metric_type="counter", help_text="Tokens generated"))
+        parts.append(prometheus_sample("studybuddy_llm_coalesced_requests_total", llm_client.coalesced_requests,
+                                       metric_type="counter", help_text="Requests answered by an identical in-flight generation"))
+        parts.append(llm_client.metrics.to_prometheus())
+    parts.append(context_gatherer.metrics.to_prometheus())
+    parts.append(prometheus_sample("studybuddy_length_tokens_saved_total",
+                                   sum(stats["tokens_saved"] for stats in length_policy_stats().values()),
+                                   metric_type="counter", help_text="max_tokens below the agents' fixed caps, summed over requests"))
+    parts.append(length_metrics.to_prometheus())
+    
+    return PlainTextResponse("".join(parts), media_type="text/plain; version=0.0.4")
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat_with_agent(request: ChatRequest):
     """Chat with a specific agent"""
     try:
-        # Get the appropriate agent
-        agent = get_agent(request.agent_type)
+        check_agent_request(request.agent_type, request.student_id)
         
-        # Call the agent's main method
-        if request.agent_type == "tutor":
-            response = agent.teach(request.message)
-        elif request.agent_type == "session":
-            response = agent.manage_time(request.message)
-        elif request.agent_type == "goal":
-            response = agent.coach(request.message)
-        else:
-            raise HTTPException(status_code=400, detail="Invalid agent type")
+        # Call the student's agent on the inference pool
+        response = await run_inference(
+            call_agent, request.student_id, request.agent_type, request.message, request_deadline()
+        )
         
         return ChatResponse(
             response=response,
             agent_type=request.agent_type,
-            metadata={"context": request.context}
+            metadata={"context": request.context, "student_id": request.student_id}
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in chat endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.post("/chat/stream")
+async def chat_with_agent_stream(request: ChatRequest, http_request: Request):
+    """Chat with a specific agent, streaming the response as server-sent events"""
+    check_agent_request(request.agent_type, request.student_id)
+    chunks = stream_agent(request.student_id, request.agent_type, request.message, request_deadline())
+    
+    try:
+        # Claim an inference slot up front so a full queue is reported as 503
+        agent_chunks = inference_executor.stream(chunks)
+        first_chunk = await agent_chunks.__anext__()
+    except InferenceQueueFullError:
+        raise queue_full_error()
+    except StopAsyncIteration:
+        first_chunk = ""
+    
+    async def event_stream():
+        try:
+            if first_chunk:
+                yield f"data: {json.dumps({'token': first_chunk})}\n\n"
+            async for chunk in agent_chunks:
+                if await http_request.is_disconnected():
+                    logger.info(f"🔌 Client left a {request.agent_type} stream; stopping generation")
+                    return
+                if chunk:
+                    yield f"data: {json.dumps({'token': chunk})}\n\n"
+            done = {"agent_type": request.agent_type, "timestamp": datetime.now().isoformat()}
+            yield f"event: done\ndata: {json.dumps(done)}\n\n"
+        except Exception as e:
+            logger.error(f"Error in chat stream endpoint: {e}")
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+        finally:
+            # Closes the agent's chunk generator too, releasing its lease and cancelling the decode
+            await agent_chunks.aclose()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/tutor/teach")
 async def tutor_teach(request: Dict):
     """Direct endpoint for tutor agent"""
-    if tutor_agent is None:
-        raise HTTPException(status_code=503, detail="TutorAgent not initialized")
+    student_id = str(request.get("student_id", DEFAULT_STUDENT_ID))
+    check_agent_request("tutor", student_id)
     
     message = request.get("message", "")
     if not message:
         raise HTTPException(status_code=400, detail="Message is required")
     
     try:
-        response = tutor_agent.teach(message)
+        response = await run_inference(call_agent, student_id, "tutor", message, request_deadline())
         return {"response": response, "agent": "tutor", "timestamp": datetime.now()}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in tutor endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -241,16 +624,18 @@ async def tutor_teach(request: Dict):
 @app.post("/session/manage")
 async def session_manage(request: Dict):
     """Direct endpoint for session agent"""
-    if session_agent is None:
-        raise HTTPException(status_code=503, detail="SessionAgent not initialized")
+    student_id = str(request.get("student_id", DEFAULT_STUDENT_ID))
+    check_agent_request("session", student_id)
     
     message = request.get("message", "")
     if not message:
         raise HTTPException(status_code=400, detail="Message is required")
     
     try:
-        response = session_agent.manage_time(message)
+        response = await run_inference(call_agent, student_id, "session", message, request_deadline())
         return {"response": response, "agent": "session", "timestamp": datetime.now()}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in session endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -258,16 +643,18 @@ async def session_manage(request: Dict):
 @app.post("/goal/coach")
 async def goal_coach(request: Dict):
     """Direct endpoint for goal agent"""
-    if goal_agent is None:
-        raise HTTPException(status_code=503, detail="GoalAgent not initialized")
+    student_id = str(request.get("student_id", DEFAULT_STUDENT_ID))
+    check_agent_request("goal", student_id)
     
     message = request.get("message", "")
     if not message:
         raise HTTPException(status_code=400, detail="Message is required")
     
     try:
-        response = goal_agent.coach(message)
+        response = await run_inference(call_agent, student_id, "goal", message, request_deadline())
         return {"response": response, "agent": "goal", "timestamp": datetime.now()}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in goal endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
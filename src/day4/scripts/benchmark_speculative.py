@@ -0,0 +1,88 @@
+"""
+StudyBuddy speculative decoding benchmark
+Compares CPU tokens/sec of the LLM client with and without a draft model
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# Add src to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from transformers import AutoTokenizer
+
+from studybuddy.core.cpu_backend import CPUBackendConfig, load_cpu_model, resident_memory_mb
+from studybuddy.core.llm_client import ProductionLLMClient, load_model_config
+
+PROMPTS = [
+    "Explain Python functions with examples",
+    "Help me understand how recursion works",
+    "Create a study guide for data structures",
+    "What is the difference between a list and a tuple?",
+]
+
+
+def run(client: ProductionLLMClient, max_tokens: int, temperature: float, runs: int):
+    """Generate every prompt `runs` times and return (new tokens, seconds)"""
+    tokens = 0
+    started_at = time.perf_counter()
+    for _ in range(runs):
+        for prompt in PROMPTS:
+            inputs = client._prepare_inputs(prompt)
+            tokens += len(client._direct_generate(inputs, max_tokens, temperature))
+    return tokens, time.perf_counter() - started_at
+
+
+def main():
+    config = load_model_config()
+    cpu_settings = config.get("cpu") or {}
+    draft_settings = config.get("draft") or {}
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", default=cpu_settings.get("model_name") or config.get("model", {}).get("name"))
+    parser.add_argument("--draft", default=draft_settings.get("model_name"))
+    parser.add_argument("--dtype", default=cpu_settings.get("dtype", "bfloat16"))
+    parser.add_argument("--num-assistant-tokens", type=int, default=draft_settings.get("num_assistant_tokens", 5))
+    parser.add_argument("--max-tokens", type=int, default=200)
+    parser.add_argument("--temperature", type=float, default=0.0)
+    parser.add_argument("--runs", type=int, default=1)
+    args = parser.parse_args()
+    if not args.draft:
+        parser.error("no draft model: pass --draft or set draft.model_name in model_config.yaml")
+
+    cpu_config = CPUBackendConfig.from_dict({**cpu_settings, "dtype": args.dtype})
+    print(f"🔄 Loading {args.model} and draft {args.draft} ({cpu_config.backend_name})")
+    tokenizer = AutoTokenizer.from_pretrained(args.model, trust_remote_code=True)
+    model = load_cpu_model(args.model, cpu_config)
+    draft_model = load_cpu_model(args.draft, cpu_config)
+    draft_model.generation_config.num_assistant_tokens = args.num_assistant_tokens
+
+    baseline = ProductionLLMClient(model=model, tokenizer=tokenizer, model_name=args.model,
+                                   enable_batching=False, prefix_cache_mb=0)
+    assisted = ProductionLLMClient(model=model, tokenizer=tokenizer, model_name=args.model,
+                                   enable_batching=False, prefix_cache_mb=0,
+                                   draft_model=draft_model, draft_model_name=args.draft)
+
+    # One untimed pass so both runs start warm
+    run(baseline, 8, args.temperature, 1)
+
+    results = {}
+    for name, client in (("baseline", baseline), ("speculative", assisted)):
+        tokens, seconds = run(client, args.max_tokens, args.temperature, args.runs)
+        results[name] = tokens / seconds
+        print(f"📊 {name:<12} {tokens:>6} tokens in {seconds:7.2f}s = {results[name]:7.2f} tokens/s")
+
+    speculative = assisted.get_stats()["speculative"]
+    print(f"🎯 Acceptance rate: {speculative['acceptance_rate']:.1%}, "
+          f"{speculative['tokens_per_target_step']} tokens per target forward pass")
+    print(f"🚀 Speedup: {results['speculative'] / results['baseline']:.2f}x")
+    print(f"💾 Resident memory: {resident_memory_mb()} MB")
+
+    baseline.close()
+    assisted.close()
+
+
+if __name__ == "__main__":
+    main()
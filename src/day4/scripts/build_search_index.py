@@ -0,0 +1,56 @@
+"""
+StudyBuddy offline search index builder
+Indexes the search corpus from app_config.yaml and imports any documentation
+dumps given on the command line, so an air-gapped deployment starts with a
+ready index. Imported dumps are recorded in the index file and stay indexed
+when the API reopens it with its own corpus_paths.
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import yaml
+
+# Add src to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from studybuddy.tools.search_index import SearchIndex, DEFAULT_CORPUS_PATHS
+
+PROJECT_DIR = os.path.join(os.path.dirname(__file__), '..')
+
+
+def main():
+    with open(os.path.join(PROJECT_DIR, 'config', 'app_config.yaml'), 'r') as f:
+        search_config = (yaml.safe_load(f) or {}).get('search') or {}
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("paths", nargs="*",
+                        help="corpus files or directories to import (.md, .txt, or .jsonl dumps of {title, url, text})")
+    # The configured path is relative to the project directory, like the API resolves it
+    parser.add_argument("--index", default=os.path.join(PROJECT_DIR, search_config.get("index_path", "./cache/search_index.json")))
+    parser.add_argument("--query", action="append", default=[], help="run a sample query after indexing")
+    args = parser.parse_args()
+
+    corpus_paths = [os.path.join(PROJECT_DIR, path) for path in search_config.get("corpus_paths") or []]
+    index = SearchIndex(corpus_paths=corpus_paths or DEFAULT_CORPUS_PATHS, index_path=args.index)
+    if args.paths:
+        index.import_paths(args.paths)
+    changes = index.update()
+    stats = index.get_stats()
+    print(f"🔎 {changes['added']} files added, {changes['changed']} changed, {changes['removed']} removed")
+    print(f"📚 {stats['documents']} passages from {stats['files']} files, {stats['terms']} terms -> {args.index}")
+    if index.imported_paths:
+        print(f"📥 Imported: {', '.join(index.imported_paths)}")
+
+    for query in args.query:
+        started_at = time.perf_counter()
+        results = index.search(query, limit=3)
+        print(f"\n❓ {query} ({(time.perf_counter() - started_at) * 1000:.2f} ms)")
+        for document, score in results:
+            print(f"   {score:6.2f}  {document.title} <{document.url}>")
+
+
+if __name__ == "__main__":
+    main()
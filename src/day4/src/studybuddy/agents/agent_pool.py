@@ -0,0 +1,234 @@
+"""
+Per-student agent pool for the StudyBuddy API
+Keeps each student's agents separate while sharing one LLM client
+"""
+
+import os
+import re
+import json
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+from .enhanced_tutor import TutorAgent
+from .enhanced_session import SessionAgent
+from .enhanced_goal import GoalAgent
+
+logger = logging.getLogger(__name__)
+
+# Student ids become file names, so keep them to a safe alphabet
+STUDENT_ID_PATTERN = r"^[A-Za-z0-9_.-]{1,64}$"
+_STUDENT_ID_RE = re.compile(STUDENT_ID_PATTERN)
+
+
+class AgentPool:
+    """
+    LRU registry of agents keyed by (student_id, agent_type).
+
+    Agents are created on first use and hydrated from their saved state.
+    When more than `max_agents` are loaded, the least recently used idle
+    agent is saved to `state_dir` and dropped. In-memory history lists are
+    capped at `max_history` entries per agent. Every agent shares the same
+    LLM client; agents with tools send tool prompts to `tool_llm_client`
+    when one is given. `agent_options` holds extra constructor arguments
+    per agent type, e.g. {"tutor": {"gather_context": True}}.
+
+    Concurrent requests from the same student share one agent instance and
+    there is no per-agent lock: their history and memory writes may
+    interleave. Only eviction waits for leases to end.
+    """
+
+    AGENT_CLASSES = {
+        "tutor": TutorAgent,
+        "session": SessionAgent,
+        "goal": GoalAgent
+    }
+
+    # Agent types that accept a separate client for their tools
+    TOOL_AGENT_TYPES = {"tutor"}
+
+    def __init__(self, llm_client, state_dir: str = "./data/agents",
+                 max_agents: int = 256, max_history: int = 200, tool_llm_client=None,
+                 agent_options: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.llm_client = llm_client
+        self.tool_llm_client = tool_llm_client
+        self.agent_options = agent_options or {}
+        self.state_dir = state_dir
+        self.max_agents = max_agents
+        self.max_history = max_history
+        os.makedirs(state_dir, exist_ok=True)
+
+        self._agents: "OrderedDict[tuple, Any]" = OrderedDict()
+        self._leases: Dict[tuple, int] = {}
+        # Agents removed from the pool whose state is still being saved
+        self._unloading: Dict[tuple, threading.Event] = {}
+        self._lock = threading.Lock()
+
+        # Pool metrics
+        self.hits = 0
+        self.hydrations = 0
+        self.evictions = 0
+
+    def _state_file(self, student_id: str, agent_type: str) -> str:
+        return os.path.join(self.state_dir, f"{student_id}_{agent_type}.json")
+
+    def acquire(self, student_id: str, agent_type: str):
+        """Return the student's agent, creating it if needed; pair with release()"""
+        if agent_type not in self.AGENT_CLASSES:
+            raise ValueError(f"Invalid agent type: {agent_type}")
+        if not _STUDENT_ID_RE.match(student_id):
+            raise ValueError(f"Invalid student id: {student_id!r}")
+
+        key = (student_id, agent_type)
+        with self._lock:
+            agent = self._agents.get(key)
+            if agent is not None:
+                self._agents.move_to_end(key)
+                self._leases[key] = self._leases.get(key, 0) + 1
+                self.hits += 1
+                return agent
+            saving = self._unloading.get(key)
+
+        if saving is not None:
+            # Evicted a moment ago: hydrate from the state it is saving, not an older one
+            saving.wait()
+        # Hydrate outside the lock; loading a long history must not stall other students
+        hydrated = self._hydrate(student_id, agent_type)
+
+        with self._lock:
+            agent = self._agents.get(key)
+            if agent is None:
+                agent = self._agents[key] = hydrated
+                self.hydrations += 1
+            else:
+                # Another request loaded it first; keep theirs
+                self._agents.move_to_end(key)
+                self.hits += 1
+            self._leases[key] = self._leases.get(key, 0) + 1
+            evicted = self._evict_locked()
+
+        self._unload_all(evicted)
+        if agent is not hydrated:
+            self._close(hydrated)
+        return agent
+
+    def release(self, student_id: str, agent_type: str):
+        """Finish using an agent returned by acquire()"""
+        key = (student_id, agent_type)
+        with self._lock:
+            self._leases[key] -= 1
+            if not self._leases[key]:
+                del self._leases[key]
+            agent = self._agents.get(key)
+            if agent is not None:
+                agent.trim_history(self.max_history)
+            evicted = self._evict_locked()
+        self._unload_all(evicted)
+
+    @contextmanager
+    def lease(self, student_id: str, agent_type: str) -> Iterator[Any]:
+        """acquire() and release() around a block; the agent may be leased by other requests at the same time"""
+        agent = self.acquire(student_id, agent_type)
+        try:
+            yield agent
+        finally:
+            self.release(student_id, agent_type)
+
+    def _hydrate(self, student_id: str, agent_type: str):
+        """Create an agent and load its saved state, if any"""
+        kwargs = dict(self.agent_options.get(agent_type) or {})
+        if self.tool_llm_client is not None and agent_type in self.TOOL_AGENT_TYPES:
+            kwargs["tool_llm_client"] = self.tool_llm_client
+        agent = self.AGENT_CLASSES[agent_type](self.llm_client, student_id=student_id, **kwargs)
+        state_file = self._state_file(student_id, agent_type)
+        if os.path.exists(state_file):
+            try:
+                with open(state_file, 'r') as f:
+                    agent.load_state(json.load(f))
+            except (json.JSONDecodeError, OSError) as e:
+                logger.warning(f"Could not load {state_file}, starting fresh: {e}")
+        agent.trim_history(self.max_history)
+        return agent
+
+    def _save(self, student_id: str, agent_type: str, agent):
+        state_file = self._state_file(student_id, agent_type)
+        tmp_file = state_file + ".tmp"
+        try:
+            with open(tmp_file, 'w') as f:
+                json.dump(agent.get_state(), f)
+            os.replace(tmp_file, state_file)
+        except (OSError, TypeError, ValueError) as e:
+            logger.error(f"Failed to save agent state to {state_file}: {e}")
+
+    @staticmethod
+    def _close(agent):
+        close = getattr(agent, "close", None)
+        if close is not None:
+            close()
+
+    def _unload(self, key: tuple, agent):
+        self._save(*key, agent)
+        self._close(agent)
+
+    def _unload_all(self, agents: List[Tuple[tuple, Any]]):
+        """Save and close agents already removed from the pool; call without holding the lock"""
+        for key, agent in agents:
+            try:
+                self._unload(key, agent)
+            finally:
+                with self._lock:
+                    saved = self._unloading.pop(key, None)
+                if saved is not None:
+                    saved.set()
+
+    def _remove_locked(self, key: tuple) -> Tuple[tuple, Any]:
+        self._unloading[key] = threading.Event()
+        return key, self._agents.pop(key)
+
+    def _evict_locked(self) -> List[Tuple[tuple, Any]]:
+        """
+        Remove least recently used agents that nobody is using until under
+        the cap, and return them for _unload_all() once the lock is released
+        """
+        evicted = []
+        if len(self._agents) <= self.max_agents:
+            return evicted
+        for key in list(self._agents):
+            if len(self._agents) <= self.max_agents:
+                break
+            if key in self._leases:
+                continue
+            evicted.append(self._remove_locked(key))
+            self.evictions += 1
+        return evicted
+
+    def loaded_agent_types(self) -> Dict[str, int]:
+        """How many agents of each type are currently in memory"""
+        with self._lock:
+            counts = {agent_type: 0 for agent_type in self.AGENT_CLASSES}
+            for _, agent_type in self._agents:
+                counts[agent_type] += 1
+            return counts
+
+    def save_all(self):
+        """Persist every loaded agent, e.g. on shutdown"""
+        with self._lock:
+            agents = [self._remove_locked(key) for key in list(self._agents)]
+        self._unload_all(agents)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Pool occupancy and hit rate for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.hydrations
+            return {
+                "loaded_agents": len(self._agents),
+                "max_agents": self.max_agents,
+                "students": len({student_id for student_id, _ in self._agents}),
+                "in_use": len(self._leases),
+                "hits": self.hits,
+                "hydrations": self.hydrations,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / max(lookups, 1), 3)
+            }
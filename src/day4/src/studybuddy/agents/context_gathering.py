@@ -0,0 +1,134 @@
+"""
+Concurrent context gathering for the StudyBuddy agents
+Runs independent enrichment sources side by side under one latency budget
+"""
+
+import time
+import logging
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Dict, Any, Callable, Optional
+
+from ..core.metrics import LatencyMetrics
+from ..core.request_scheduler import Priority, request_context
+
+logger = logging.getLogger(__name__)
+
+# Sources are mostly I/O and queued LLM prompts, so a few threads go a long way
+DEFAULT_MAX_WORKERS = 8
+
+
+@dataclass
+class GatheredContext:
+    """
+    Results of one gather() call.
+
+    `results` only holds sources that finished in time without raising;
+    `timings` has an entry for every source with its status ("ok",
+    "error" or "timeout") and the seconds it took, or had taken when the
+    budget ran out.
+    """
+    results: Dict[str, Any] = field(default_factory=dict)
+    timings: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    budget_seconds: float = 0.0
+    elapsed_seconds: float = 0.0
+
+
+class ContextGatherer:
+    """
+    Runs context sources (memory retrieval, web search, code analysis, ...)
+    concurrently and waits at most `budget_seconds` for them.
+
+    Sources that miss the budget are left out of the result instead of
+    delaying the answer. Each source runs with the caller's request context
+    at tool priority and with a deadline at the end of the budget, so LLM
+    prompts of late sources are dropped by the scheduler rather than
+    competing with the answer they were meant to enrich.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS):
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.metrics = LatencyMetrics(namespace="studybuddy_context")
+
+        # Gathering metrics
+        self.gathers = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="studybuddy-context")
+            return self._executor
+
+    def gather(self, sources: Dict[str, Callable[[], Any]], budget_seconds: float) -> GatheredContext:
+        """Run every source at once and return whatever finished within the budget"""
+        gathered = GatheredContext(budget_seconds=budget_seconds)
+        if not sources:
+            return gathered
+
+        started_at = time.perf_counter()
+        futures: Dict[str, Future] = {}
+        with request_context(priority=Priority.TOOL, timeout=budget_seconds):
+            for name, source in sources.items():
+                # Each source gets its own copy of the request context
+                futures[name] = self._pool().submit(contextvars.copy_context().run, self._run, name, source)
+        wait(list(futures.values()), timeout=budget_seconds)
+        gathered.elapsed_seconds = round(time.perf_counter() - started_at, 4)
+
+        for name, future in futures.items():
+            if not future.done():
+                # Not started yet: skip it; already running: let it finish unobserved
+                future.cancel()
+                gathered.timings[name] = {"status": "timeout", "seconds": gathered.elapsed_seconds}
+                continue
+            outcome = future.result()
+            # Finished while we were collecting, but too late to count
+            status = "timeout" if outcome["seconds"] > budget_seconds else outcome["status"]
+            gathered.timings[name] = {"status": status, "seconds": outcome["seconds"]}
+            if status == "ok":
+                gathered.results[name] = outcome["result"]
+
+        with self._lock:
+            self.gathers += 1
+            self.timeouts += sum(timing["status"] == "timeout" for timing in gathered.timings.values())
+            self.errors += sum(timing["status"] == "error" for timing in gathered.timings.values())
+        logger.debug(f"Context gathered in {gathered.elapsed_seconds}s: {gathered.timings}")
+        return gathered
+
+    def _run(self, name: str, source: Callable[[], Any]) -> Dict[str, Any]:
+        """Run one source, recording its duration even when it finishes after the budget"""
+        started_at = time.perf_counter()
+        status, result = "ok", None
+        try:
+            result = source()
+        except Exception as e:
+            status = "error"
+            logger.warning(f"⚠️ Context source '{name}' failed: {e}")
+        seconds = round(time.perf_counter() - started_at, 4)
+        self.metrics.observe("source_seconds", seconds, source=name, status=status)
+        return {"status": status, "result": result, "seconds": seconds}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Gathering totals and per-source latency for monitoring"""
+        return {
+            "gathers": self.gathers,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "sources": self.metrics.to_dict().get("source_seconds", {}),
+        }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+# Process-wide gatherer shared by every agent
+context_gatherer = ContextGatherer()
@@ -4,11 +4,17 @@ Enhanced GoalAgent - Progress tracking and motivational coach with emotional int
 
 import sys
 import os
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Iterator
 import logging
 from datetime import datetime, timedelta
 import json
 
+from .streaming import stream_llm_response, stream_tail
+from .prompts import fit_prompt
+from .length_policy import shared_length_policy
+from ..core.context_budget import PromptSection
+from ..core.keyword_matcher import shared_matcher, first_category, top_category
+
 logger = logging.getLogger(__name__)
 
 
@@ -21,6 +27,8 @@ class EnhancedGoalAgent:
         self.llm_client = llm_client
         self.student_id = student_id
         self.agent_type = "goal_coach"
+        # Coaching length budget per request, up to 400 tokens
+        self.length_policy = shared_length_policy("goal", max_tokens=400)
         
         # Student goals and achievements
         self.student_goals = []
@@ -149,44 +157,53 @@ class EnhancedGoalAgent:
         
         return response
     
+    def coach_stream(self, request: str, current_goal: Optional[str] = None,
+                     progress_update: Optional[float] = None) -> Iterator[str]:
+        """
+        Streaming variant of coach() that yields the response while it is generated
+        """
+        logger.info(f"GoalAgent streaming: {request[:50]}...")
+        
+        motivation_analysis = self._analyze_motivational_state(request)
+        strategy = self._select_motivational_strategy(motivation_analysis)
+        goal_action = self._detect_goal_action(request)
+        system_prompt = self._build_coaching_system_prompt(motivation_analysis, strategy)
+        max_tokens = self.length_policy.predict(request)
+        user_prompt = self._build_coaching_prompt(request, current_goal, progress_update,
+                                                motivation_analysis, goal_action, system_prompt, max_tokens)
+        
+        streamed = ""
+        try:
+            # Celebrations open the message, so they are sent before the LLM output
+            if motivation_analysis.get("needs_celebration", False):
+                streamed = "🎉 Congratulations! "
+                yield streamed
+            
+            for chunk in stream_llm_response(self.llm_client, user_prompt, system_prompt,
+                                             max_tokens=max_tokens, temperature=0.8,
+                                             use_cache=False):
+                streamed += chunk
+                yield chunk
+            
+            response = self._enhance_with_motivation(streamed, motivation_analysis, strategy)
+            yield stream_tail(streamed, response)
+            
+        except Exception as e:
+            logger.error(f"Error streaming goal coaching response: {e}")
+            yield self._generate_coaching_fallback(request, motivation_analysis, strategy)
+        
+        self._handle_goal_management(goal_action, request, current_goal, progress_update)
+    
     def _analyze_motivational_state(self, request: str) -> Dict[str, Any]:
         """Analyze student's current motivational and emotional state"""
-        request_lower = request.lower()
+        scores = shared_matcher.score(request)
         
         # Detect motivational states
-        state_keywords = {
-            "discouraged": ["discouraged", "giving up", "can't do", "too hard", "failing", "hopeless"],
-            "overwhelmed": ["overwhelmed", "too much", "stressed", "pressure", "can't handle"],
-            "stuck": ["stuck", "not progressing", "plateau", "same place", "not moving forward"],
-            "motivated": ["motivated", "excited", "ready", "determined", "energized", "pumped"],
-            "anxious": ["anxious", "worried", "nervous", "scared", "uncertain", "doubt"],
-            "celebrating": ["achieved", "completed", "finished", "success", "did it", "accomplished"],
-            "procrastinating": ["procrastinating", "avoiding", "putting off", "don't want to"],
-            "confused": ["confused", "don't understand", "unclear", "lost", "don't know how"]
-        }
-        
-        detected_states = {}
-        for state, keywords in state_keywords.items():
-            score = sum(1 for keyword in keywords if keyword in request_lower)
-            if score > 0:
-                detected_states[state] = score
-        
-        primary_state = "neutral"
-        if detected_states:
-            primary_state = max(detected_states.keys(), key=lambda x: detected_states[x])
+        detected_states = scores["motivation_state"]
+        primary_state = top_category(detected_states)
         
         # Detect progress indicators
-        progress_indicators = {
-            "making_progress": ["making progress", "getting better", "improving", "learning"],
-            "struggling": ["struggling", "difficult", "hard time", "challenges"],
-            "breakthrough": ["breakthrough", "finally got it", "clicked", "understand now"]
-        }
-        
-        progress_state = "unknown"
-        for state, indicators in progress_indicators.items():
-            if any(indicator in request_lower for indicator in indicators):
-                progress_state = state
-                break
+        progress_state = first_category(scores["progress"])
         
         return {
             "primary_state": primary_state,
@@ -216,20 +233,7 @@ class EnhancedGoalAgent:
     
     def _detect_goal_action(self, request: str) -> Dict[str, Any]:
         """Detect if student wants to set, update, or complete goals"""
-        request_lower = request.lower()
-        
-        actions = {
-            "set_goal": ["set a goal", "want to achieve", "goal is", "want to learn", "my goal"],
-            "update_progress": ["made progress", "completed", "finished", "done with", "update"],
-            "complete_goal": ["achieved", "finished my goal", "completed my goal", "goal accomplished"],
-            "need_help": ["stuck on", "struggling with", "need help", "don't know how"],
-            "change_goal": ["change my goal", "different goal", "new goal", "modify goal"]
-        }
-        
-        detected_actions = []
-        for action, keywords in actions.items():
-            if any(keyword in request_lower for keyword in keywords):
-                detected_actions.append(action)
+        detected_actions = list(shared_matcher.score(request)["goal_action"])
         
         primary_action = detected_actions[0] if detected_actions else None
         
@@ -248,15 +252,17 @@ class EnhancedGoalAgent:
         system_prompt = self._build_coaching_system_prompt(motivation_analysis, strategy)
         
         # Build contextual prompt
+        max_tokens = self.length_policy.predict(request)
         user_prompt = self._build_coaching_prompt(request, current_goal, progress_update, 
-                                                motivation_analysis, goal_action)
+                                                motivation_analysis, goal_action, system_prompt, max_tokens)
         
         try:
             response = self.llm_client.generate_response(
                 prompt=user_prompt,
                 system_message=system_prompt,
-                max_tokens=400,
-                temperature=0.8  # Slightly more creative for motivational content
+                max_tokens=max_tokens,
+                temperature=0.8,  # Slightly more creative for motivational content
+                use_cache=False  # Motivation should not repeat word for word
             )
             
             # Add personalized motivational elements
@@ -313,33 +319,40 @@ Remember: Your role is to help them believe in themselves while providing practi
         return system_prompt
     
     def _build_coaching_prompt(self, request: str, current_goal: Optional[str], progress_update: Optional[float],
-                             motivation_analysis: Dict[str, Any], goal_action: Dict[str, Any]) -> str:
-        """Build context-rich prompt for coaching"""
+                             motivation_analysis: Dict[str, Any], goal_action: Dict[str, Any],
+                             system_prompt: Optional[str] = None, max_tokens: int = 400) -> str:
+        """Build context-rich prompt for coaching, trimming past goals before the request"""
         
-        prompt_parts = [f"Student Request: {request}"]
+        prompt_parts = [PromptSection(f"Student Request: {request}", name="request", required=True)]
         
         if current_goal:
-            prompt_parts.append(f"Current Goal: {current_goal}")
+            prompt_parts.append(PromptSection(f"Current Goal: {current_goal}", name="goal", priority=2))
         
         if progress_update is not None:
-            prompt_parts.append(f"Progress Update: {progress_update}/10")
+            prompt_parts.append(PromptSection(f"Progress Update: {progress_update}/10", name="progress", priority=2))
         
-        prompt_parts.append(f"Motivational State: {motivation_analysis['primary_state']}")
+        prompt_parts.append(PromptSection(
+            f"Motivational State: {motivation_analysis['primary_state']}", name="state", priority=1
+        ))
         
         if goal_action["goal_related"]:
-            prompt_parts.append(f"Goal Action Detected: {goal_action['primary_action']}")
+            prompt_parts.append(PromptSection(
+                f"Goal Action Detected: {goal_action['primary_action']}", name="action", priority=1
+            ))
         
         # Add context about previous goals if available
         if self.student_goals:
             recent_goals = [goal["title"] for goal in self.student_goals[-2:]]
-            prompt_parts.append(f"Recent Goals: {', '.join(recent_goals)}")
+            prompt_parts.append(PromptSection(f"Recent Goals: {', '.join(recent_goals)}", name="goals", keep="end"))
         
         # Add achievements context
         if self.achievements:
             recent_achievements = [ach["title"] for ach in self.achievements[-2:]]
-            prompt_parts.append(f"Recent Achievements: {', '.join(recent_achievements)}")
+            prompt_parts.append(PromptSection(
+                f"Recent Achievements: {', '.join(recent_achievements)}", name="achievements", keep="end"
+            ))
         
-        return "\n\n".join(prompt_parts)
+        return fit_prompt(self.llm_client, prompt_parts, system_prompt, max_tokens)
     
     def _enhance_with_motivation(self, response: str, motivation_analysis: Dict[str, Any], 
                                strategy: Dict[str, Any]) -> str:
@@ -646,6 +659,29 @@ What would you like to work on? I'm excited to support your learning journey! 
         
         return suggestions[:3]  # Return top 3 suggestions
 
+    
+    def get_state(self) -> Dict[str, Any]:
+        """Per-student state to persist between sessions"""
+        return {
+            "student_goals": self.student_goals,
+            "achievements": self.achievements,
+            "progress_history": self.progress_history
+        }
+    
+    def load_state(self, state: Dict[str, Any]):
+        """Restore state saved by get_state()"""
+        self.student_goals = state.get("student_goals", [])
+        self.achievements = state.get("achievements", [])
+        self.progress_history = state.get("progress_history", [])
+    
+    def trim_history(self, max_items: int):
+        """Keep only the most recent history entries in memory (goals and achievements are kept)"""
+        if max_items <= 0:
+            # [:-0] would be an empty slice and keep everything
+            self.progress_history.clear()
+        else:
+            del self.progress_history[:-max_items]
+
 
 # Backward compatibility
 class GoalAgent(EnhancedGoalAgent):
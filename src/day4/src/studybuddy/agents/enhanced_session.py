@@ -4,11 +4,17 @@ Enhanced SessionAgent - Time management and productivity specialist with emotion
 
 import sys
 import os
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Iterator
 import logging
 from datetime import datetime, timedelta
 import json
 
+from .streaming import stream_llm_response, stream_tail
+from .prompts import fit_prompt
+from .length_policy import shared_length_policy
+from ..core.context_budget import PromptSection
+from ..core.keyword_matcher import shared_matcher, top_category
+
 logger = logging.getLogger(__name__)
 
 
@@ -21,6 +27,8 @@ class EnhancedSessionAgent:
         self.llm_client = llm_client
         self.student_id = student_id
         self.agent_type = "session_manager"
+        # Advice length budget per request, up to 350 tokens
+        self.length_policy = shared_length_policy("session", max_tokens=350)
         
         # Session history for this student
         self.session_history = []
@@ -143,33 +151,54 @@ class EnhancedSessionAgent:
         
         return response
     
+    def manage_time_stream(self, request: str, current_topic: str = "studying",
+                           available_time: int = 60) -> Iterator[str]:
+        """
+        Streaming variant of manage_time() that yields the response while it is generated
+        """
+        logger.info(f"SessionAgent streaming: {request[:50]}...")
+        
+        state_analysis = self._analyze_student_state(request)
+        strategy = self._select_productivity_strategy(state_analysis)
+        time_plan = self._create_time_management_plan(
+            request=request,
+            topic=current_topic,
+            available_time=available_time,
+            student_state=state_analysis,
+            strategy=strategy
+        )
+        system_prompt = self._build_session_manager_prompt(state_analysis, strategy)
+        max_tokens = self.length_policy.predict(request)
+        user_prompt = self._build_time_management_prompt(request, time_plan, state_analysis,
+                                                         system_prompt, max_tokens)
+        
+        streamed = ""
+        try:
+            for chunk in stream_llm_response(self.llm_client, user_prompt, system_prompt,
+                                             max_tokens=max_tokens, temperature=0.7,
+                                             use_cache=False):
+                streamed += chunk
+                yield chunk
+            
+            # Schedule details follow the streamed advice
+            yield stream_tail(streamed, self._add_schedule_details(streamed, time_plan))
+            
+        except Exception as e:
+            logger.error(f"Error streaming session response: {e}")
+            yield self._generate_productivity_fallback(request, time_plan, state_analysis)
+        
+        self._record_session_request(request, time_plan, state_analysis)
+    
     def _analyze_student_state(self, request: str) -> Dict[str, Any]:
         """Analyze student's current emotional and productivity state"""
-        request_lower = request.lower()
+        scores = shared_matcher.score(request)
         
         # Detect productivity-related emotions
-        state_keywords = {
-            "overwhelmed": ["overwhelmed", "too much", "stressed", "can't handle", "drowning"],
-            "tired": ["tired", "exhausted", "sleepy", "worn out", "drained", "low energy"],
-            "distracted": ["distracted", "can't focus", "keep getting distracted", "mind wandering"],
-            "motivated": ["motivated", "ready", "energized", "excited to learn", "let's do this"],
-            "anxious": ["anxious", "worried", "nervous", "stressed about", "pressure"],
-            "procrastinating": ["procrastinating", "putting off", "avoiding", "don't want to start"],
-            "frustrated": ["frustrated", "stuck", "not working", "annoying"]
-        }
-        
-        detected_states = {}
-        for state, keywords in state_keywords.items():
-            score = sum(1 for keyword in keywords if keyword in request_lower)
-            if score > 0:
-                detected_states[state] = score
-        
-        primary_state = "neutral"
-        if detected_states:
-            primary_state = max(detected_states.keys(), key=lambda x: detected_states[x])
+        detected_states = scores["productivity_state"]
+        primary_state = top_category(detected_states)
         
         # Detect time-related information
-        time_pressure = any(word in request_lower for word in ["deadline", "due", "urgent", "quickly", "rush"])
+        time_pressure = bool(scores["time_pressure"])
         
         # Detect available time hints
         available_time_hints = self._extract_time_mentions(request)
@@ -344,14 +373,17 @@ class EnhancedSessionAgent:
         system_prompt = self._build_session_manager_prompt(state_analysis, strategy)
         
         # Build detailed user prompt
-        user_prompt = self._build_time_management_prompt(request, time_plan, state_analysis)
+        max_tokens = self.length_policy.predict(request)
+        user_prompt = self._build_time_management_prompt(request, time_plan, state_analysis,
+                                                         system_prompt, max_tokens)
         
         try:
             response = self.llm_client.generate_response(
                 prompt=user_prompt,
                 system_message=system_prompt,
-                max_tokens=350,
-                temperature=0.7
+                max_tokens=max_tokens,
+                temperature=0.7,
+                use_cache=False  # Sampled answers should vary between turns
             )
             
             # Add schedule details
@@ -403,19 +435,20 @@ Remember: Good time management is about working WITH your brain and energy, not
         return system_prompt
     
     def _build_time_management_prompt(self, request: str, time_plan: Dict[str, Any],
-                                    state_analysis: Dict[str, Any]) -> str:
-        """Build context-rich prompt for time management advice"""
+                                    state_analysis: Dict[str, Any], system_prompt: Optional[str] = None,
+                                    max_tokens: int = 350) -> str:
+        """Build context-rich prompt for time management advice, trimming the rationale before the request"""
         
         prompt_parts = [
-            f"Student Request: {request}",
-            f"Current State: {state_analysis['primary_state']}",
-            f"Recommended Session Type: {time_plan['session_type']}",
-            f"Available Time: {time_plan['total_time']} minutes",
-            f"Number of Work Sessions: {time_plan['work_sessions']}",
-            f"Strategy Rationale: {time_plan['strategy_rationale']}"
+            PromptSection(f"Student Request: {request}", name="request", required=True),
+            PromptSection(f"Current State: {state_analysis['primary_state']}", name="state", priority=1),
+            PromptSection(f"Recommended Session Type: {time_plan['session_type']}", name="session_type", priority=2),
+            PromptSection(f"Available Time: {time_plan['total_time']} minutes", name="time", priority=2),
+            PromptSection(f"Number of Work Sessions: {time_plan['work_sessions']}", name="sessions", priority=2),
+            PromptSection(f"Strategy Rationale: {time_plan['strategy_rationale']}", name="rationale")
         ]
         
-        return "\n\n".join(prompt_parts)
+        return fit_prompt(self.llm_client, prompt_parts, system_prompt, max_tokens)
     
     def _add_schedule_details(self, response: str, time_plan: Dict[str, Any]) -> str:
         """Add specific schedule details to the response"""
@@ -554,6 +587,27 @@ Ready to start your first session? I believe in you! 🌟"""
             ]
         }
 
+    
+    def get_state(self) -> Dict[str, Any]:
+        """Per-student state to persist between sessions"""
+        return {
+            "session_history": self.session_history,
+            "productivity_data": self.productivity_data
+        }
+    
+    def load_state(self, state: Dict[str, Any]):
+        """Restore state saved by get_state()"""
+        self.session_history = state.get("session_history", [])
+        self.productivity_data.update(state.get("productivity_data", {}))
+    
+    def trim_history(self, max_items: int):
+        """Keep only the most recent history entries in memory"""
+        if max_items <= 0:
+            # [:-0] would be an empty slice and keep everything
+            self.session_history.clear()
+        else:
+            del self.session_history[:-max_items]
+
 
 # Backward compatibility
 class SessionAgent(EnhancedSessionAgent):
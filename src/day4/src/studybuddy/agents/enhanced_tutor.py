@@ -4,30 +4,52 @@ Enhanced TutorAgent - Educational specialist with empathy and comprehensive tool
 
 import sys
 import os
-from typing import Dict, List, Any, Optional
+import re
+from typing import Dict, List, Any, Optional, Iterator, Callable
 import logging
 
+from .streaming import stream_llm_response, stream_tail
+from .prompts import fit_prompt
+from .length_policy import shared_length_policy
+from .context_gathering import context_gatherer
+from ..core.context_budget import PromptSection
+from ..core.keyword_matcher import shared_matcher, top_category
+
 logger = logging.getLogger(__name__)
 
+# Fenced code, or lines that read like Python source, mark a question as carrying code
+_FENCED_CODE_RE = re.compile(r"```[\w+-]*\n(.*?)```", re.S)
+_CODE_LINE_RE = re.compile(r"^\s*(def |class |import |from \S+ import |return\b|print\(|for .+:|while .+:|if .+:)", re.M)
+
 
 class EnhancedTutorAgent:
     """
     An empathetic, intelligent tutor that adapts to student needs and emotions
     """
     
-    def __init__(self, llm_client, student_id: str = "default_student"):
+    def __init__(self, llm_client, student_id: str = "default_student", tool_llm_client=None,
+                 gather_context: bool = False, context_budget_seconds: float = 1.5):
         self.llm_client = llm_client
+        # Tool prompts are cheap and can go to a smaller model
+        self.tool_llm_client = tool_llm_client or llm_client
         self.student_id = student_id
         self.agent_type = "tutor"
+        # Answer length budget per question, up to 400 tokens
+        self.length_policy = shared_length_policy("tutor", max_tokens=400)
+        # Orchestration mode: enrich the prompt with memory, search results and
+        # code analysis gathered in parallel, waiting at most the budget
+        self.gather_context = gather_context
+        self.context_budget_seconds = context_budget_seconds
+        self.last_context_timings: Dict[str, Dict[str, Any]] = {}
         
         # Initialize tools with LLM client
         try:
             from ..tools.learning_tools import WebSearchTool, CodeAnalysisTool, LearningResourceTool
             from ..core.enhanced_memory import ConversationMemory, EmotionalIntelligence
             
-            self.web_search = WebSearchTool(llm_client=llm_client)
-            self.code_analyzer = CodeAnalysisTool(llm_client=llm_client)
-            self.resource_tool = LearningResourceTool(llm_client=llm_client)
+            self.web_search = WebSearchTool(llm_client=self.tool_llm_client)
+            self.code_analyzer = CodeAnalysisTool(llm_client=self.tool_llm_client)
+            self.resource_tool = LearningResourceTool(llm_client=self.tool_llm_client)
             self.memory = ConversationMemory(student_id)
             self.emotion_analyzer = EmotionalIntelligence()
         except ImportError as e:
@@ -100,7 +122,8 @@ class EnhancedTutorAgent:
             topic=topic,
             emotion_data=emotion_data,
             strategy=strategy,
-            understanding_level=understanding_level
+            understanding_level=understanding_level,
+            context_sections=self._gather_context(student_question, topic, understanding_level)
         )
         
         # Store conversation
@@ -114,28 +137,57 @@ class EnhancedTutorAgent:
         
         return response
     
-    def _analyze_emotion(self, text: str) -> Dict[str, Any]:
-        """Simple emotion analysis from student text"""
-        text_lower = text.lower()
-        
-        emotion_keywords = {
-            "frustrated": ["frustrated", "stuck", "confused", "don't understand", "hate this", "annoying"],
-            "confident": ["got it", "understand", "easy", "makes sense", "clear", "awesome"],
-            "anxious": ["worried", "nervous", "scared", "overwhelmed", "pressure", "stressed"],
-            "excited": ["excited", "love", "amazing", "awesome", "cool", "interesting"],
-            "discouraged": ["give up", "too hard", "impossible", "can't do", "failing", "hopeless"],
-            "motivated": ["ready", "determined", "let's do this", "motivated", "focused"]
-        }
+    def teach_stream(self, student_question: str, topic: str = "programming",
+                     understanding_level: float = 5.0) -> Iterator[str]:
+        """
+        Streaming variant of teach() that yields the response while it is generated
+        """
+        logger.info(f"TutorAgent streaming: {student_question[:50]}...")
+        
+        emotion_data = self._analyze_emotion(student_question)
+        strategy = self._select_teaching_strategy(emotion_data)
+        system_prompt = self._build_tutor_system_prompt(emotion_data, strategy, understanding_level)
+        max_tokens = self.length_policy.predict(student_question)
+        context_sections = self._gather_context(student_question, topic, understanding_level)
+        user_prompt = self._build_contextual_prompt(student_question, topic, emotion_data, system_prompt,
+                                                    max_tokens, context_sections)
         
-        emotions_detected = {}
-        for emotion, keywords in emotion_keywords.items():
-            score = sum(1 for keyword in keywords if keyword in text_lower)
-            if score > 0:
-                emotions_detected[emotion] = score
+        streamed = ""
+        try:
+            # Openers are sent up front since they can't be prepended after streaming
+            opening = self._personality_opening(emotion_data)
+            if opening:
+                streamed += opening
+                yield opening
+            
+            for chunk in stream_llm_response(self.llm_client, user_prompt, system_prompt,
+                                             max_tokens=max_tokens, temperature=0.7,
+                                             use_cache=False):
+                streamed += chunk
+                yield chunk
+            
+            response = self._enhance_response_with_personality(streamed, emotion_data)
+            tail = stream_tail(streamed, response)
+            if tail:
+                yield tail
+            
+        except Exception as e:
+            logger.error(f"Error streaming tutor response: {e}")
+            response = self._generate_fallback_response(student_question, emotion_data)
+            yield response
         
-        primary_emotion = "neutral"
-        if emotions_detected:
-            primary_emotion = max(emotions_detected.keys(), key=lambda x: emotions_detected[x])
+        self.conversation_history.append({
+            "question": student_question,
+            "response": response,
+            "emotion": emotion_data["primary_emotion"],
+            "topic": topic,
+            "understanding_level": understanding_level
+        })
+    
+    def _analyze_emotion(self, text: str) -> Dict[str, Any]:
+        """Simple emotion analysis from student text"""
+        emotions_detected = shared_matcher.score(text)["emotion"]
+        primary_emotion = top_category(emotions_detected)
         
         return {
             "primary_emotion": primary_emotion,
@@ -159,22 +211,26 @@ class EnhancedTutorAgent:
             }
     
     def _generate_empathetic_response(self, question: str, topic: str, emotion_data: Dict[str, Any],
-                                     strategy: Dict[str, Any], understanding_level: float) -> str:
+                                     strategy: Dict[str, Any], understanding_level: float,
+                                     context_sections: Optional[List[PromptSection]] = None) -> str:
         """Generate a personalized, empathetic response using the LLM"""
         
         # Build comprehensive system prompt
         system_prompt = self._build_tutor_system_prompt(emotion_data, strategy, understanding_level)
         
-        # Build context-rich user prompt
-        user_prompt = self._build_contextual_prompt(question, topic, emotion_data)
+        # Build context-rich user prompt, sized for the answer this question needs
+        max_tokens = self.length_policy.predict(question)
+        user_prompt = self._build_contextual_prompt(question, topic, emotion_data, system_prompt,
+                                                    max_tokens, context_sections)
         
         try:
             # Generate response using the LLM
             response = self.llm_client.generate_response(
                 prompt=user_prompt,
                 system_message=system_prompt,
-                max_tokens=400,
-                temperature=0.7
+                max_tokens=max_tokens,
+                temperature=0.7,
+                use_cache=False  # Sampled answers should vary between turns
             )
             
             # Add personality touches
@@ -225,23 +281,96 @@ Remember: You're not just teaching code, you're building confidence and fosterin
         
         return system_prompt
     
-    def _build_contextual_prompt(self, question: str, topic: str, emotion_data: Dict[str, Any]) -> str:
-        """Build a context-rich prompt for the LLM"""
+    def _build_contextual_prompt(self, question: str, topic: str, emotion_data: Dict[str, Any],
+                                 system_prompt: Optional[str] = None, max_tokens: int = 400,
+                                 context_sections: Optional[List[PromptSection]] = None) -> str:
+        """Build a context-rich prompt for the LLM, trimming history before the question"""
         
-        prompt_parts = [f"Student Question: {question}"]
-        prompt_parts.append(f"Topic: {topic}")
+        prompt_parts = [PromptSection(f"Student Question: {question}", name="question", required=True)]
+        prompt_parts.append(PromptSection(f"Topic: {topic}", name="topic", priority=2))
         
         # Add emotional context
         if emotion_data["primary_emotion"] != "neutral":
-            prompt_parts.append(f"Student seems {emotion_data['primary_emotion']} - please respond accordingly")
+            prompt_parts.append(PromptSection(
+                f"Student seems {emotion_data['primary_emotion']} - please respond accordingly",
+                name="emotion", priority=1
+            ))
         
         # Add conversation history context
         if len(self.conversation_history) > 0:
             recent_topics = [conv["topic"] for conv in self.conversation_history[-2:]]
             if recent_topics:
-                prompt_parts.append(f"Recent topics discussed: {', '.join(recent_topics)}")
+                prompt_parts.append(PromptSection(
+                    f"Recent topics discussed: {', '.join(recent_topics)}", name="history", keep="end"
+                ))
+        
+        # Add gathered memory, resources and code analysis
+        prompt_parts.extend(context_sections or [])
         
-        return "\n\n".join(prompt_parts)
+        return fit_prompt(self.llm_client, prompt_parts, system_prompt, max_tokens)
+    
+    def _gather_context(self, question: str, topic: str, understanding_level: float) -> List[PromptSection]:
+        """
+        Collect memory, web search and code analysis context concurrently.
+        Sources that miss the latency budget or fail are left out; per-source
+        timings are kept in `last_context_timings`.
+        """
+        if not self.gather_context:
+            return []
+        
+        difficulty = "beginner" if understanding_level < 4 else "intermediate" if understanding_level < 7 else "advanced"
+        sources: Dict[str, Callable[[], Any]] = {}
+        if self.memory is not None:
+            sources["memory"] = lambda: self.memory.get_conversation_context(
+                topic, agent_type=self.agent_type, limit=3, query=question
+            )
+        if self.web_search is not None:
+            sources["web_search"] = lambda: self.web_search.search_educational_content(question, topic, difficulty)
+        code = self._extract_code(question)
+        if code and self.code_analyzer is not None:
+            sources["code_analysis"] = lambda: self.code_analyzer.analyze_code_snippet(code)
+        if not sources:
+            return []
+        
+        gathered = context_gatherer.gather(sources, self.context_budget_seconds)
+        self.last_context_timings = gathered.timings
+        summary = ", ".join(f"{name} {timing['status']} in {timing['seconds']}s" for name, timing in gathered.timings.items())
+        logger.info(f"TutorAgent context: {summary}")
+        
+        sections = []
+        memory_context = gathered.results.get("memory")
+        if memory_context and memory_context.get("relevant_conversations"):
+            lines = [f"- {conv['topic']}: {conv['user_message'][:150]}" for conv in memory_context["relevant_conversations"]]
+            sections.append(PromptSection("Related earlier questions:\n" + "\n".join(lines), name="memory"))
+        
+        search_results = gathered.results.get("web_search")
+        if search_results:
+            lines = [f"- {result.title}: {result.snippet[:150]} ({result.url})" for result in search_results[:3]]
+            sections.append(PromptSection("Helpful resources:\n" + "\n".join(lines), name="resources"))
+        
+        analysis = gathered.results.get("code_analysis")
+        if analysis:
+            lines = [f"- Difficulty: {analysis.get('estimated_difficulty', 'unknown')}"]
+            if analysis.get("concepts_used"):
+                lines.append(f"- Concepts: {', '.join(analysis['concepts_used'])}")
+            if analysis.get("potential_issues"):
+                lines.append(f"- Possible issues: {'; '.join(analysis['potential_issues'])}")
+            if analysis.get("suggestions"):
+                lines.append(f"- Suggestions: {'; '.join(analysis['suggestions'])}")
+            # Closest to the question, so trimmed after memory and resources
+            sections.append(PromptSection("Analysis of the student's code:\n" + "\n".join(lines),
+                                          name="code_analysis", priority=1))
+        return sections
+    
+    @staticmethod
+    def _extract_code(text: str) -> Optional[str]:
+        """Code in a question: fenced blocks, or the whole text if several lines look like code"""
+        blocks = _FENCED_CODE_RE.findall(text)
+        if blocks:
+            return "\n".join(block.strip() for block in blocks)
+        if len(_CODE_LINE_RE.findall(text)) >= 2:
+            return text
+        return None
     
     def _enhance_response_with_personality(self, response: str, emotion_data: Dict[str, Any]) -> str:
         """Add personality touches to the LLM response"""
@@ -251,11 +380,11 @@ Remember: You're not just teaching code, you're building confidence and fosterin
         # Add emotional support if needed
         if primary_emotion == "frustrated":
             if not any(phrase in response.lower() for phrase in ["i understand", "frustrating", "no worries"]):
-                response = "I totally understand that this can be frustrating! " + response
+                response = self._personality_opening(emotion_data) + response
         
         elif primary_emotion == "excited":
             if not any(phrase in response.lower() for phrase in ["awesome", "exciting", "love your enthusiasm"]):
-                response = "I love your enthusiasm! " + response
+                response = self._personality_opening(emotion_data) + response
         
         elif primary_emotion == "discouraged":
             if not any(phrase in response.lower() for phrase in ["you've got this", "believe", "capable"]):
@@ -267,6 +396,17 @@ Remember: You're not just teaching code, you're building confidence and fosterin
         
         return response
     
+    def _personality_opening(self, emotion_data: Dict[str, Any]) -> str:
+        """Opening line used to acknowledge strong emotions"""
+        
+        primary_emotion = emotion_data.get("primary_emotion", "neutral")
+        
+        if primary_emotion == "frustrated":
+            return "I totally understand that this can be frustrating! "
+        elif primary_emotion == "excited":
+            return "I love your enthusiasm! "
+        return ""
+    
     def _generate_fallback_response(self, question: str, emotion_data: Dict[str, Any]) -> str:
         """Generate a fallback response when LLM fails"""
         
@@ -349,6 +489,28 @@ Focus on:
         
         return self.teach(prompt, topic=f"{language} code review")
 
+    
+    def get_state(self) -> Dict[str, Any]:
+        """Per-student state to persist between sessions"""
+        return {"conversation_history": self.conversation_history}
+    
+    def load_state(self, state: Dict[str, Any]):
+        """Restore state saved by get_state()"""
+        self.conversation_history = state.get("conversation_history", [])
+    
+    def trim_history(self, max_items: int):
+        """Keep only the most recent history entries in memory"""
+        if max_items <= 0:
+            # [:-0] would be an empty slice and keep everything
+            self.conversation_history.clear()
+        else:
+            del self.conversation_history[:-max_items]
+    
+    def close(self):
+        """Flush the conversation memory log"""
+        if self.memory is not None:
+            self.memory.close()
+
 
 # Backward compatibility
 class TutorAgent(EnhancedTutorAgent):
@@ -0,0 +1,107 @@
+"""
+Response length policy shared by the StudyBuddy agents
+Sizes max_tokens to what a request asks for instead of a fixed cap per agent
+"""
+
+import threading
+from typing import Dict, Any
+
+from ..core.keyword_matcher import shared_matcher
+from ..core.metrics import LatencyMetrics
+
+# Share of the agent's cap each request intent gets; the largest match wins
+INTENT_BUDGET_SHARES = {
+    "quick": 0.4,
+    "compare": 0.75,
+    "explain": 0.85,
+    "example": 1.0,
+    "plan": 1.0,
+}
+# Requests that match no intent
+DEFAULT_BUDGET_SHARE = 0.7
+# Long or code-carrying requests usually need room for a full answer
+LONG_REQUEST_WORDS = 40
+LONG_REQUEST_SHARE = 0.85
+# Histogram buckets for predicted budgets, in tokens
+TOKEN_BUCKETS = (64, 96, 128, 160, 192, 256, 320, 400, 512)
+
+# Predicted budgets per agent type and intent, exported on /metrics
+length_metrics = LatencyMetrics(namespace="studybuddy_length")
+
+
+class ResponseLengthPolicy:
+    """
+    Predicts `max_tokens` for one agent from the request's intent and size.
+
+    "What is a list?" gets a short budget, "Create a study plan" the agent's
+    full cap. Decode time grows with the tokens generated, so shorter caps
+    for short questions cut latency; answers still end at EOS well before
+    the cap when the model is done.
+    """
+
+    def __init__(self, max_tokens: int, min_tokens: int = 96, agent_type: str = "agent"):
+        self.max_tokens = max_tokens
+        self.min_tokens = min_tokens
+        self.agent_type = agent_type
+        self._lock = threading.Lock()
+
+        # Policy metrics
+        self.predictions = 0
+        self.tokens_budgeted = 0
+        # intent -> [requests, tokens budgeted]
+        self._by_intent: Dict[str, list] = {}
+
+    def predict(self, message: str) -> int:
+        """Token budget for answering `message`"""
+        intents = shared_matcher.score(message)["request_intent"]
+        intent, share = max(((name, INTENT_BUDGET_SHARES[name]) for name in intents),
+                            key=lambda item: item[1], default=("default", DEFAULT_BUDGET_SHARE))
+
+        if (len(message.split()) > LONG_REQUEST_WORDS or "```" in message) and share < LONG_REQUEST_SHARE:
+            intent, share = "long", LONG_REQUEST_SHARE
+
+        max_tokens = max(self.min_tokens, min(self.max_tokens, round(self.max_tokens * share)))
+        with self._lock:
+            self.predictions += 1
+            self.tokens_budgeted += max_tokens
+            totals = self._by_intent.setdefault(intent, [0, 0])
+            totals[0] += 1
+            totals[1] += max_tokens
+        length_metrics.observe("max_tokens", max_tokens, buckets=TOKEN_BUCKETS,
+                               agent_type=self.agent_type, intent=intent)
+        return max_tokens
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Budgets handed out, and tokens of the fixed cap they saved, per intent"""
+        with self._lock:
+            return {
+                "max_tokens": self.max_tokens,
+                "predictions": self.predictions,
+                "average_budget": round(self.tokens_budgeted / max(self.predictions, 1), 1),
+                "tokens_saved": self.predictions * self.max_tokens - self.tokens_budgeted,
+                "by_intent": {
+                    intent: {"requests": requests, "average_budget": round(budgeted / requests, 1)}
+                    for intent, (requests, budgeted) in self._by_intent.items()
+                },
+            }
+
+
+# One policy per agent type, shared by every student's agent so its stats cover them all
+_policies: Dict[str, ResponseLengthPolicy] = {}
+_policies_lock = threading.Lock()
+
+
+def shared_length_policy(agent_type: str, max_tokens: int) -> ResponseLengthPolicy:
+    """The policy for `agent_type`, created with `max_tokens` on first use"""
+    with _policies_lock:
+        policy = _policies.get(agent_type)
+        if policy is None:
+            policy = _policies[agent_type] = ResponseLengthPolicy(max_tokens=max_tokens, agent_type=agent_type)
+        return policy
+
+
+def length_policy_stats() -> Dict[str, Dict[str, Any]]:
+    """get_stats() of every agent type's policy, for /stats"""
+    with _policies_lock:
+        policies = dict(_policies)
+    return {agent_type: policy.get_stats() for agent_type, policy in policies.items()}
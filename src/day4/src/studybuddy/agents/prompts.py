@@ -0,0 +1,15 @@
+"""
+Prompt helpers shared by the StudyBuddy agents
+"""
+
+from typing import List, Optional
+
+from ..core.context_budget import PromptSection, render_sections
+
+
+def fit_prompt(llm_client, sections: List[PromptSection], system_message: Optional[str] = None,
+               max_tokens: int = 150) -> str:
+    """Join prompt sections within the client's context budget, or in full for clients without one"""
+    if hasattr(llm_client, "fit_prompt"):
+        return llm_client.fit_prompt(sections, system_message=system_message, max_tokens=max_tokens)
+    return render_sections(sections)
@@ -0,0 +1,34 @@
+"""
+Streaming helpers shared by the StudyBuddy agents
+"""
+
+from typing import Iterator, Optional
+
+
+def stream_llm_response(llm_client, prompt: str, system_message: Optional[str] = None,
+                        max_tokens: int = 150, temperature: float = 0.7,
+                        use_cache: bool = True) -> Iterator[str]:
+    """Yield LLM output incrementally, or as one chunk for clients without streaming"""
+    if hasattr(llm_client, "generate_stream"):
+        yield from llm_client.generate_stream(
+            prompt=prompt,
+            system_message=system_message,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            use_cache=use_cache
+        )
+    else:
+        yield llm_client.generate_response(
+            prompt=prompt,
+            system_message=system_message,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            use_cache=use_cache
+        )
+
+
+def stream_tail(streamed: str, final_response: str) -> str:
+    """Text still to send so that what was streamed ends up equal to the final response"""
+    if final_response.startswith(streamed):
+        return final_response[len(streamed):]
+    return ""
@@ -0,0 +1,197 @@
+"""
+Context window budgeting for the StudyBuddy LLM client
+Fits prompts into the model's context by trimming low-priority sections first
+"""
+
+import logging
+import threading
+from dataclasses import dataclass, replace
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Context used when neither the config nor the caller sets one
+DEFAULT_MAX_CONTEXT_TOKENS = 2048
+
+
+@dataclass
+class PromptSection:
+    """
+    One part of a prompt, e.g. the question, retrieved memory or history.
+
+    Sections with a lower `priority` are trimmed first. `required` sections,
+    such as the student's question, are only cut as a last resort when they
+    alone do not fit. `keep` says which part survives trimming: "start",
+    "end" (e.g. the most recent history) or "both" (cut from the middle).
+    """
+    text: str
+    name: str = ""
+    priority: int = 0
+    required: bool = False
+    keep: str = "start"
+
+
+def render_sections(sections: Sequence[PromptSection]) -> str:
+    """Join non-empty sections the way the agents separate prompt parts"""
+    return "\n\n".join(section.text for section in sections if section.text)
+
+
+class ContextBudget:
+    """
+    Token budget for one model's context window.
+
+    Sections are measured with the model's tokenizer. When they exceed the
+    budget, the lowest-priority sections are trimmed line by line, falling
+    back to token slices for a single long line, and dropped entirely once
+    nothing useful is left.
+    """
+
+    TRUNCATION_MARKER = "…"
+    # Trimmed sections shorter than this are dropped instead
+    MIN_SECTION_TOKENS = 8
+
+    def __init__(self, tokenizer, max_context_tokens: int = DEFAULT_MAX_CONTEXT_TOKENS):
+        self.tokenizer = tokenizer
+        self.max_context_tokens = max_context_tokens
+        self._template_tokens: Optional[int] = None
+        self._lock = threading.Lock()
+
+        # Budget metrics
+        self.trimmed_prompts = 0
+        self.trimmed_tokens = 0
+        self.dropped_sections = 0
+
+    @classmethod
+    def from_config(cls, tokenizer, model, settings: Optional[Dict[str, Any]] = None,
+                    max_context_tokens: Optional[int] = None) -> "ContextBudget":
+        """
+        Budget from the `context` section of model_config.yaml, capped at the
+        model's real context length (`max_position_embeddings`).
+        """
+        settings = settings or {}
+        requested = max_context_tokens or settings.get("max_context_tokens") or DEFAULT_MAX_CONTEXT_TOKENS
+        model_limit = getattr(getattr(model, "config", None), "max_position_embeddings", None)
+        if model_limit and requested > model_limit:
+            logger.warning(f"⚠️ Context of {requested} tokens exceeds the model's {model_limit}; using {model_limit}")
+            requested = model_limit
+        return cls(tokenizer, max_context_tokens=requested)
+
+    def count_tokens(self, text: str) -> int:
+        return len(self._encode(text))
+
+    def _encode(self, text: str) -> List[int]:
+        return self.tokenizer(text, add_special_tokens=False).input_ids if text else []
+
+    def template_tokens(self) -> int:
+        """Tokens the chat template adds around an empty system and user message"""
+        if self._template_tokens is None:
+            messages = [{"role": "system", "content": ""}, {"role": "user", "content": ""}]
+            try:
+                self._template_tokens = self.count_tokens(self.tokenizer.apply_chat_template(
+                    messages, tokenize=False, add_generation_prompt=True
+                ))
+            except Exception:
+                # No chat template; plain prompts carry no overhead
+                self._template_tokens = 0
+        return self._template_tokens
+
+    def prompt_budget(self, max_new_tokens: int, system_message: str = "") -> int:
+        """Tokens left for the user prompt once the system message, template and answer are reserved"""
+        return (self.max_context_tokens - max_new_tokens - self.template_tokens()
+                - self.count_tokens(system_message))
+
+    def fit(self, sections: Sequence[PromptSection], budget: int,
+            separator_tokens: int = 1) -> List[PromptSection]:
+        """
+        Trim sections to `budget` tokens in total, keeping their order and
+        leaving out sections that had to be dropped.
+
+        Optional sections are trimmed lowest priority first; required ones
+        only once every optional section is gone.
+        """
+        sizes = [self.count_tokens(section.text) for section in sections]
+        excess = sum(sizes) + separator_tokens * max(len(sections) - 1, 0) - budget
+        if excess <= 0:
+            return list(sections)
+
+        fitted = list(sections)
+        trimmed = dropped = 0
+        order = sorted(range(len(sections)), key=lambda i: (sections[i].required, sections[i].priority))
+        for index in order:
+            if excess <= 0:
+                break
+            section = fitted[index]
+            if not section.text:
+                continue
+            target = sizes[index] - excess
+            if section.required:
+                # Never drop the question; the tokenizer's hard limit catches the rest
+                target = max(target, self.MIN_SECTION_TOKENS)
+            text = self._trim(section, target) if target >= self.MIN_SECTION_TOKENS else ""
+            new_size = self.count_tokens(text)
+            if not text:
+                dropped += 1
+                logger.debug(f"Dropped prompt section {section.name or index} to fit the context")
+            fitted[index] = replace(section, text=text)
+            excess -= sizes[index] - new_size
+            trimmed += sizes[index] - new_size
+
+        with self._lock:
+            self.trimmed_prompts += 1
+            self.trimmed_tokens += trimmed
+            self.dropped_sections += dropped
+        return [section for section in fitted if section.text]
+
+    def fit_chat(self, system_message: str, prompt: str, max_new_tokens: int) -> Tuple[str, str]:
+        """
+        Make a chat prompt fit the context: the system message is trimmed
+        before the user prompt, which is only cut from the middle when it
+        alone is too long.
+        """
+        budget = self.max_context_tokens - max_new_tokens - self.template_tokens()
+        fitted = {section.name: section.text for section in self.fit([
+            PromptSection(system_message, name="system", keep="start"),
+            PromptSection(prompt, name="prompt", required=True, keep="both"),
+        ], budget, separator_tokens=0)}
+        return fitted.get("system", ""), fitted.get("prompt", "")
+
+    def _trim(self, section: PromptSection, target: int) -> str:
+        """Shorten a section to about `target` tokens, preferring whole lines"""
+        marker_tokens = self.count_tokens(self.TRUNCATION_MARKER)
+        target -= marker_tokens
+        if target <= 0:
+            return ""
+
+        lines = section.text.split("\n")
+        if len(lines) > 1 and section.keep in ("start", "end"):
+            ordered = lines if section.keep == "start" else list(reversed(lines))
+            kept, used = [], 0
+            for line in ordered:
+                cost = self.count_tokens(line) + 1
+                if used + cost > target:
+                    break
+                kept.append(line)
+                used += cost
+            if kept:
+                if section.keep == "start":
+                    return "\n".join(kept + [self.TRUNCATION_MARKER])
+                return "\n".join([self.TRUNCATION_MARKER] + list(reversed(kept)))
+
+        ids = self._encode(section.text)
+        if section.keep == "end":
+            return self.TRUNCATION_MARKER + self.tokenizer.decode(ids[-target:])
+        if section.keep == "both":
+            head = (target + 1) // 2
+            tail = target - head
+            return (self.tokenizer.decode(ids[:head]) + self.TRUNCATION_MARKER
+                    + (self.tokenizer.decode(ids[-tail:]) if tail else ""))
+        return self.tokenizer.decode(ids[:target]) + self.TRUNCATION_MARKER
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Trimming metrics for monitoring"""
+        return {
+            "max_context_tokens": self.max_context_tokens,
+            "trimmed_prompts": self.trimmed_prompts,
+            "trimmed_tokens": self.trimmed_tokens,
+            "dropped_sections": self.dropped_sections,
+        }
@@ -0,0 +1,117 @@
+"""
+CPU inference backend for the StudyBuddy LLM client
+Loads the model in reduced precision and tunes torch for machines without a GPU
+"""
+
+import os
+import logging
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+
+import torch
+from transformers import AutoModelForCausalLM
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+# dtype setting -> weight dtype the checkpoint is loaded in
+_LOAD_DTYPES = {
+    "float32": torch.float32,
+    "bfloat16": torch.bfloat16,
+    # Dynamic int8 quantization starts from float32 weights
+    "int8": torch.float32,
+}
+
+
+@dataclass
+class CPUBackendConfig:
+    """
+    Settings for running the model on CPU, read from the `cpu` section of
+    model_config.yaml.
+
+    `dtype` is float32, bfloat16 or int8 (dynamic int8 Linear weights via
+    torch.ao). `model_name` swaps in a smaller checkpoint than the GPU model;
+    4-bit bitsandbytes checkpoints do not load on CPU at all.
+    """
+    model_name: Optional[str] = None
+    dtype: str = "bfloat16"
+    compile: bool = False
+    num_threads: Optional[int] = None
+    num_interop_threads: Optional[int] = 1
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "CPUBackendConfig":
+        data = data or {}
+        config = cls(**{key: data[key] for key in cls.__dataclass_fields__ if data.get(key) is not None})
+        if config.dtype not in _LOAD_DTYPES:
+            raise ValueError(f"Unsupported CPU dtype: {config.dtype} (expected one of {sorted(_LOAD_DTYPES)})")
+        return config
+
+    @property
+    def backend_name(self) -> str:
+        return f"cpu-{self.dtype}" + ("-compiled" if self.compile else "")
+
+
+def configure_threads(config: CPUBackendConfig):
+    """Pin torch's thread pools before the first forward pass"""
+    num_threads = config.num_threads
+    if num_threads is None:
+        # Hyperthreads share matmul units, so physical cores is the better default
+        num_threads = (psutil.cpu_count(logical=False) if psutil is not None else None) or os.cpu_count() or 1
+    torch.set_num_threads(num_threads)
+
+    if config.num_interop_threads is not None:
+        try:
+            torch.set_num_interop_threads(config.num_interop_threads)
+        except RuntimeError:
+            # Only allowed before any parallel work has run in this process
+            logger.warning("⚠️ Inter-op threads already initialized; keeping current setting")
+
+    logger.info(f"🧵 CPU threads: intra-op {torch.get_num_threads()}, inter-op {torch.get_num_interop_threads()}")
+
+
+def load_cpu_model(model_name: str, config: CPUBackendConfig, **load_kwargs):
+    """
+    Load a causal LM for CPU inference with the configured precision and compilation.
+    `load_kwargs` go to from_pretrained, e.g. low_cpu_mem_usage.
+    """
+    configure_threads(config)
+
+    model = AutoModelForCausalLM.from_pretrained(
+        model_name,
+        torch_dtype=_LOAD_DTYPES[config.dtype],
+        device_map=None,
+        trust_remote_code=True,
+        **load_kwargs
+    )
+    model.eval()
+
+    if config.dtype == "int8":
+        # Linear layers hold nearly all the weights; activations stay float32
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        logger.info("🗜️ Applied dynamic int8 quantization to Linear layers")
+
+    if config.compile:
+        # Fall back to eager for graphs dynamo cannot handle instead of failing requests
+        torch._dynamo.config.suppress_errors = True
+        # Decode steps differ only in sequence length, so compile with dynamic shapes
+        model.forward = torch.compile(model.forward, dynamic=True)
+        logger.info("⚙️ Compiled model forward with torch.compile")
+
+    return model
+
+
+def resident_memory_mb() -> Optional[float]:
+    """Resident set size of this process in MB, or None if it cannot be measured"""
+    if psutil is not None:
+        return round(psutil.Process().memory_info().rss / (1024 * 1024), 1)
+    try:
+        import resource
+        # Peak rather than current RSS, reported in KB on Linux
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    except (ImportError, OSError):
+        return None
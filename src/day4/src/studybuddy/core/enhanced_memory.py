@@ -5,15 +5,60 @@ Provides comprehensive memory, learning analytics, and emotional intelligence
 
 import json
 import os
+import time
+import threading
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional, Tuple
 import logging
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 import re
 
+from .keyword_matcher import (
+    EMOTION_KEYWORDS, LEARNING_INDICATORS, shared_matcher, first_category, top_category
+)
+
 # Set up logging
 logger = logging.getLogger(__name__)
 
+try:
+    import numpy as np
+    import faiss
+    from sentence_transformers import SentenceTransformer
+    SEMANTIC_SEARCH_AVAILABLE = True
+except ImportError:
+    SEMANTIC_SEARCH_AVAILABLE = False
+
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Embedding models are shared by every student's index. A model that failed
+# to load is remembered, so an air-gapped deployment tries the download once
+# per process rather than once per student.
+_embedding_models: Dict[str, Any] = {}
+_failed_embedding_models: Dict[str, str] = {}
+_embedding_models_lock = threading.Lock()
+_missing_semantic_search_logged = False
+
+
+class EmbeddingModelUnavailable(RuntimeError):
+    """The embedding model could not be loaded earlier in this process"""
+    pass
+
+
+def _get_embedding_model(model_name: str):
+    with _embedding_models_lock:
+        if model_name in _failed_embedding_models:
+            raise EmbeddingModelUnavailable(_failed_embedding_models[model_name])
+        if model_name not in _embedding_models:
+            logger.info(f"Loading embedding model: {model_name}")
+            try:
+                _embedding_models[model_name] = SentenceTransformer(model_name)
+            except Exception as e:
+                _failed_embedding_models[model_name] = f"{model_name} failed to load: {e}"
+                logger.warning(f"⚠️ Could not load embedding model {model_name}; "
+                               f"semantic search is off until restart: {e}")
+                raise EmbeddingModelUnavailable(_failed_embedding_models[model_name]) from e
+        return _embedding_models[model_name]
+
 
 class EmotionalIntelligence:
     """
@@ -21,44 +66,26 @@ class EmotionalIntelligence:
     """
     
     def __init__(self):
-        # Emotion keywords mapping
-        self.emotion_keywords = {
-            "frustrated": ["frustrated", "stuck", "confused", "don't understand", "hate this", "annoying"],
-            "confident": ["got it", "understand", "easy", "makes sense", "clear", "awesome"],
-            "anxious": ["worried", "nervous", "scared", "overwhelmed", "pressure", "stressed"],
-            "excited": ["excited", "love", "amazing", "awesome", "cool", "interesting"],
-            "discouraged": ["give up", "too hard", "impossible", "can't do", "failing", "hopeless"],
-            "motivated": ["ready", "determined", "let's do this", "motivated", "focused"]
-        }
-        
-        # Learning indicators
-        self.learning_indicators = {
-            "struggling": ["don't get", "still confused", "not working", "error", "wrong"],
-            "progressing": ["better now", "starting to", "almost", "getting closer"],
-            "mastering": ["perfectly", "easily", "no problem", "understand completely"]
-        }
+        # Emotion keywords mapping and learning indicators (matched by the shared matcher)
+        self.emotion_keywords = EMOTION_KEYWORDS
+        self.learning_indicators = LEARNING_INDICATORS
     
     def analyze_emotion(self, text: str) -> Dict[str, Any]:
         """Analyze emotional state from student text"""
-        text_lower = text.lower()
-        
-        emotions_detected = {}
-        for emotion, keywords in self.emotion_keywords.items():
-            score = sum(1 for keyword in keywords if keyword in text_lower)
-            if score > 0:
-                emotions_detected[emotion] = score
+        return self._build_analysis(shared_matcher.score(text))
+    
+    def analyze_emotion_batch(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """Analyze many texts at once, e.g. when backfilling analytics"""
+        return [self._build_analysis(scores) for scores in shared_matcher.score_batch(texts)]
+    
+    def _build_analysis(self, scores: Dict[str, Dict[str, int]]) -> Dict[str, Any]:
+        emotions_detected = scores["emotion"]
         
         # Determine primary emotion
-        primary_emotion = "neutral"
-        if emotions_detected:
-            primary_emotion = max(emotions_detected.keys(), key=lambda x: emotions_detected[x])
+        primary_emotion = top_category(emotions_detected)
         
         # Learning state analysis
-        learning_state = "unknown"
-        for state, indicators in self.learning_indicators.items():
-            if any(indicator in text_lower for indicator in indicators):
-                learning_state = state
-                break
+        learning_state = first_category(scores["learning_state"])
         
         return {
             "primary_emotion": primary_emotion,
@@ -161,38 +188,430 @@ class LearningAnalytics:
         return recommendations
 
 
+class SemanticConversationIndex:
+    """
+    Vector index over one student's conversations for similarity retrieval.
+    
+    Positions in the index match positions in ConversationMemory.conversations.
+    Embeddings are appended to a raw float32 file next to the conversation log
+    so they are computed once per turn, not on every start.
+    """
+    
+    def __init__(self, embeddings_file: str, model_name: str = DEFAULT_EMBEDDING_MODEL,
+                 hnsw_neighbors: int = 32, ef_search: int = 64, query_cache_size: int = 256):
+        self.embeddings_file = embeddings_file
+        self.model = _get_embedding_model(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.hnsw_neighbors = hnsw_neighbors
+        self.ef_search = ef_search
+        self.query_cache_size = query_cache_size
+        self._query_cache: "OrderedDict[str, Any]" = OrderedDict()
+        self.index = self._new_index()
+    
+    def _new_index(self):
+        # HNSW keeps top-k search in the low milliseconds at 100k+ vectors
+        index = faiss.IndexHNSWFlat(self.dim, self.hnsw_neighbors, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efSearch = self.ef_search
+        return index
+    
+    @staticmethod
+    def conversation_text(conversation: Dict) -> str:
+        return f"{conversation.get('topic', 'general')}: {conversation.get('user_message', '')}"
+    
+    def _embed(self, texts: List[str]):
+        return self.model.encode(
+            texts, batch_size=64, convert_to_numpy=True, normalize_embeddings=True
+        ).astype(np.float32).reshape(-1, self.dim)
+    
+    def __len__(self) -> int:
+        return self.index.ntotal
+    
+    def load(self, conversations: List[Dict]):
+        """Load stored embeddings and embed any conversations that are missing them"""
+        vectors = np.zeros((0, self.dim), dtype=np.float32)
+        if os.path.exists(self.embeddings_file):
+            raw = np.fromfile(self.embeddings_file, dtype=np.float32)
+            # Drop a partially written trailing row
+            rows = raw.size // self.dim
+            vectors = raw[:rows * self.dim].reshape(rows, self.dim)
+        
+        if len(vectors) > len(conversations):
+            # Log and embeddings disagree about history; start over
+            logger.warning(f"Rebuilding {self.embeddings_file}: embeddings do not match the log")
+            vectors = vectors[:0]
+        
+        missing = conversations[len(vectors):]
+        if missing:
+            vectors = np.vstack([vectors, self._embed([self.conversation_text(c) for c in missing])])
+        
+        self._write(vectors)
+        self.index = self._new_index()
+        if len(vectors):
+            self.index.add(vectors)
+    
+    def _write(self, vectors):
+        tmp_file = self.embeddings_file + ".tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.embeddings_file)
+    
+    def add(self, conversation: Dict):
+        """Embed one new conversation and append it to the index and the embeddings file"""
+        vector = self._embed([self.conversation_text(conversation)])
+        self.index.add(vector)
+        with open(self.embeddings_file, 'ab') as f:
+            f.write(vector.tobytes())
+    
+    def drop_oldest(self, count: int):
+        """Forget the first `count` entries, mirroring compaction of the log"""
+        if count <= 0:
+            return
+        remaining = self.index.ntotal - count
+        vectors = self.index.reconstruct_n(count, remaining) if remaining > 0 else \
+            np.zeros((0, self.dim), dtype=np.float32)
+        self._write(vectors)
+        self.index = self._new_index()
+        if remaining > 0:
+            self.index.add(vectors)
+    
+    def search(self, text: str, k: int) -> List[Tuple[int, float]]:
+        """Return (position, cosine similarity) pairs for the k nearest conversations"""
+        if self.index.ntotal == 0:
+            return []
+        
+        query = self._query_cache.get(text)
+        if query is None:
+            query = self._embed([text])
+            self._query_cache[text] = query
+            if len(self._query_cache) > self.query_cache_size:
+                self._query_cache.popitem(last=False)
+        else:
+            self._query_cache.move_to_end(text)
+        
+        scores, positions = self.index.search(query, min(k, self.index.ntotal))
+        return [(int(pos), float(score)) for pos, score in zip(positions[0], scores[0]) if pos >= 0]
+
+
+class ProfileAggregates:
+    """
+    Running totals over a student's conversations, updated on every write
+    so profile reads do not rescan the history.
+    """
+    
+    # Learning-style hints counted in user messages
+    STYLE_KEYWORDS = ("explain", "example", "practice")
+    
+    def __init__(self):
+        self.record_count = 0
+        self.understanding_total = 0.0
+        self.topic_counts: Dict[str, int] = {}
+        self.emotion_counts: Dict[str, int] = {}
+        self.hour_counts: Dict[int, int] = {}
+        self.style_counts = {keyword: 0 for keyword in self.STYLE_KEYWORDS}
+        self.study_days = set()
+        self.first_timestamp = None
+        self.last_timestamp = None
+    
+    def add(self, conversation: Dict):
+        """Fold one conversation into the totals"""
+        conv_time = datetime.fromisoformat(conversation["timestamp"])
+        
+        self.record_count += 1
+        self.understanding_total += conversation["understanding_level"]
+        topic = conversation["topic"]
+        self.topic_counts[topic] = self.topic_counts.get(topic, 0) + 1
+        
+        if conversation["emotion_analysis"]:
+            emotion = conversation["emotion_analysis"]["primary_emotion"]
+            self.emotion_counts[emotion] = self.emotion_counts.get(emotion, 0) + 1
+        
+        self.hour_counts[conv_time.hour] = self.hour_counts.get(conv_time.hour, 0) + 1
+        message = conversation["user_message"].lower()
+        for keyword in self.STYLE_KEYWORDS:
+            if keyword in message:
+                self.style_counts[keyword] += 1
+        
+        self.study_days.add(conv_time.date().isoformat())
+        timestamp = conv_time.timestamp()
+        if self.first_timestamp is None:
+            self.first_timestamp = timestamp
+        self.last_timestamp = timestamp
+    
+    @property
+    def average_understanding(self) -> float:
+        return self.understanding_total / max(self.record_count, 1)
+    
+    @property
+    def average_gap_hours(self) -> float:
+        # The mean of consecutive gaps telescopes to (last - first) / (n - 1)
+        if self.record_count < 2:
+            return 0
+        return (self.last_timestamp - self.first_timestamp) / 3600 / (self.record_count - 1)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "record_count": self.record_count,
+            "understanding_total": self.understanding_total,
+            "topic_counts": self.topic_counts,
+            "emotion_counts": self.emotion_counts,
+            "hour_counts": self.hour_counts,
+            "style_counts": self.style_counts,
+            "study_days": sorted(self.study_days),
+            "first_timestamp": self.first_timestamp,
+            "last_timestamp": self.last_timestamp
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ProfileAggregates":
+        aggregates = cls()
+        aggregates.record_count = data["record_count"]
+        aggregates.understanding_total = data["understanding_total"]
+        aggregates.topic_counts = dict(data["topic_counts"])
+        aggregates.emotion_counts = dict(data["emotion_counts"])
+        # JSON object keys are strings
+        aggregates.hour_counts = {int(hour): count for hour, count in data["hour_counts"].items()}
+        aggregates.style_counts.update(data["style_counts"])
+        aggregates.study_days = set(data["study_days"])
+        aggregates.first_timestamp = data["first_timestamp"]
+        aggregates.last_timestamp = data["last_timestamp"]
+        return aggregates
+
+
 class ConversationMemory:
     """
     Manages conversation history with semantic search and context retrieval
+    
+    History is stored as an append-only JSON-lines log, one conversation per
+    line, so storing a turn costs one small write regardless of history size.
     """
     
-    def __init__(self, student_id: str, memory_dir: str = "memory"):
+    def __init__(self, student_id: str, memory_dir: str = "memory",
+                 fsync_every: int = 16, fsync_interval_seconds: float = 5.0,
+                 max_records: Optional[int] = None, semantic_search: bool = True):
+        """
+        Args:
+            student_id: Student whose history is stored
+            memory_dir: Directory holding the conversation logs
+            fsync_every: Appends buffered before the log is fsynced
+            fsync_interval_seconds: Maximum age of unsynced appends
+            max_records: Keep only this many recent conversations when compacting (None keeps all)
+            semantic_search: Retrieve context with an embedding index when
+                sentence-transformers and faiss are installed
+        """
         self.student_id = student_id
         self.memory_dir = memory_dir
         os.makedirs(memory_dir, exist_ok=True)
         
+        self.fsync_every = fsync_every
+        self.fsync_interval_seconds = fsync_interval_seconds
+        self.max_records = max_records
+        self._log_lock = threading.Lock()
+        self._log_handle = None
+        self._unsynced_appends = 0
+        self._last_fsync = time.time()
+        self._dead_lines = 0
+        
         # Initialize conversation storage
-        self.conversation_file = os.path.join(memory_dir, f"{student_id}_conversations.json")
+        self.conversation_file = os.path.join(memory_dir, f"{student_id}_conversations.jsonl")
+        self.legacy_conversation_file = os.path.join(memory_dir, f"{student_id}_conversations.json")
+        self._migrate_legacy_file()
         self.conversations = self._load_conversations()
+        self._conversation_times = [self._parse_time(conv) for conv in self.conversations]
+        
+        # Profile totals, persisted next to the log
+        self.profile_file = os.path.join(memory_dir, f"{student_id}_profile.json")
+        self.aggregates = self._load_aggregates()
+        self._aggregates_dirty = True
+        
+        self.semantic_index = None
+        if semantic_search and SEMANTIC_SEARCH_AVAILABLE:
+            try:
+                self.semantic_index = SemanticConversationIndex(
+                    os.path.join(memory_dir, f"{student_id}_embeddings.f32")
+                )
+                self.semantic_index.load(self.conversations)
+            except EmbeddingModelUnavailable as e:
+                # Already logged when the model first failed to load
+                logger.debug(f"Semantic search disabled for {student_id}: {e}")
+            except Exception as e:
+                self.semantic_index = None
+                logger.warning(f"Semantic search disabled for {student_id}: {e}")
+        elif semantic_search:
+            global _missing_semantic_search_logged
+            if not _missing_semantic_search_logged:
+                _missing_semantic_search_logged = True
+                logger.warning("sentence-transformers/faiss not installed, using recent-history context only")
+        
+        # Rewrite the log if loading found torn or corrupt lines
+        if self._dead_lines:
+            self.compact()
         
         # Initialize analytics
         self.emotion_analyzer = EmotionalIntelligence()
         self.learning_analytics = LearningAnalytics()
     
+    def _migrate_legacy_file(self):
+        """One-time conversion of the old single-document JSON history to the log format"""
+        if os.path.exists(self.conversation_file) or not os.path.exists(self.legacy_conversation_file):
+            return
+        
+        try:
+            with open(self.legacy_conversation_file, 'r') as f:
+                conversations = json.load(f)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Skipping migration of unreadable {self.legacy_conversation_file}: {e}")
+            return
+        
+        self._write_log(conversations)
+        os.replace(self.legacy_conversation_file, self.legacy_conversation_file + ".migrated")
+        logger.info(f"Migrated {len(conversations)} conversations to {self.conversation_file}")
+    
     def _load_conversations(self) -> List[Dict]:
-        """Load conversation history from disk"""
-        if os.path.exists(self.conversation_file):
+        """Stream conversation history from the log, one record per line"""
+        conversations = []
+        if not os.path.exists(self.conversation_file):
+            return conversations
+        
+        with open(self.conversation_file, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    conversations.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Typically a write torn by a crash; compaction drops it
+                    self._dead_lines += 1
+        
+        if self._dead_lines:
+            logger.warning(f"Ignored {self._dead_lines} unreadable lines in {self.conversation_file}")
+        return conversations
+    
+    def _load_aggregates(self) -> ProfileAggregates:
+        """Load saved profile totals and fold in any turns logged after they were saved"""
+        aggregates = None
+        if os.path.exists(self.profile_file):
             try:
-                with open(self.conversation_file, 'r') as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, FileNotFoundError):
-                return []
-        return []
+                with open(self.profile_file, 'r') as f:
+                    aggregates = ProfileAggregates.from_dict(json.load(f))
+            except (json.JSONDecodeError, KeyError, TypeError) as e:
+                logger.warning(f"Rebuilding unreadable {self.profile_file}: {e}")
+        
+        if aggregates is not None and aggregates.record_count:
+            # The totals must end exactly at a turn that is still in the log
+            count = aggregates.record_count
+            if (count > len(self.conversations) or
+                    self._parse_time(self.conversations[count - 1]) != aggregates.last_timestamp):
+                aggregates = None
+        
+        if aggregates is None:
+            aggregates = ProfileAggregates()
+        
+        for conversation in self.conversations[aggregates.record_count:]:
+            aggregates.add(conversation)
+        return aggregates
+    
+    def _save_aggregates_locked(self):
+        if not self._aggregates_dirty:
+            return
+        tmp_file = self.profile_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(self.aggregates.to_dict(), f)
+        os.replace(tmp_file, self.profile_file)
+        self._aggregates_dirty = False
     
-    def _save_conversations(self):
-        """Save conversations to disk"""
-        with open(self.conversation_file, 'w') as f:
-            json.dump(self.conversations, f, indent=2)
+    def _write_log(self, conversations: List[Dict]):
+        """Atomically replace the log with the given records"""
+        tmp_file = self.conversation_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            for conversation in conversations:
+                f.write(json.dumps(conversation) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.conversation_file)
+    
+    def _append_conversation(self, conversation: Dict):
+        """Add one record to the history and the log, fsyncing in batches"""
+        with self._log_lock:
+            self.conversations.append(conversation)
+            self._conversation_times.append(self._parse_time(conversation))
+            self.aggregates.add(conversation)
+            self._aggregates_dirty = True
+            if self._log_handle is None:
+                self._log_handle = open(self.conversation_file, 'a')
+            self._log_handle.write(json.dumps(conversation) + "\n")
+            self._log_handle.flush()
+            self._unsynced_appends += 1
+            
+            if (self._unsynced_appends >= self.fsync_every or
+                    time.time() - self._last_fsync >= self.fsync_interval_seconds):
+                self._fsync_locked()
+            
+            if self.semantic_index is not None:
+                self.semantic_index.add(conversation)
+    
+    @staticmethod
+    def _parse_time(conversation: Dict) -> float:
+        return datetime.fromisoformat(conversation["timestamp"]).timestamp()
+    
+    def _fsync_locked(self):
+        if self._log_handle is not None and self._unsynced_appends:
+            os.fsync(self._log_handle.fileno())
+        self._unsynced_appends = 0
+        self._last_fsync = time.time()
+        # Saved after the log so the totals never count turns that were not synced
+        self._save_aggregates_locked()
+    
+    def flush(self):
+        """Force buffered appends to disk"""
+        with self._log_lock:
+            self._fsync_locked()
+    
+    def compact(self):
+        """
+        Rewrite the log from the in-memory history, dropping unreadable lines
+        and anything beyond `max_records`.
+        """
+        with self._log_lock:
+            if self._log_handle is not None:
+                self._fsync_locked()
+                self._log_handle.close()
+                self._log_handle = None
+            
+            dropped = 0
+            if self.max_records is not None and len(self.conversations) > self.max_records:
+                dropped = len(self.conversations) - self.max_records
+                del self.conversations[:dropped]
+                del self._conversation_times[:dropped]
+                if self.semantic_index is not None:
+                    self.semantic_index.drop_oldest(dropped)
+            
+            self._write_log(self.conversations)
+            self._dead_lines = 0
+            
+            if dropped:
+                # Totals describe the retained history, so rebuild them
+                self.aggregates = ProfileAggregates()
+                for conversation in self.conversations:
+                    self.aggregates.add(conversation)
+                self._aggregates_dirty = True
+                self._save_aggregates_locked()
+    
+    def _needs_compaction(self) -> bool:
+        # Let the history overshoot by 10% so compaction stays occasional
+        if self.max_records is None:
+            return False
+        return len(self.conversations) > self.max_records + max(self.max_records // 10, 1)
+    
+    def close(self):
+        """Flush and release the log file"""
+        with self._log_lock:
+            self._fsync_locked()
+            if self._log_handle is not None:
+                self._log_handle.close()
+                self._log_handle = None
     
     def store_conversation(self, agent_type: str, user_message: str, agent_response: str,
                           topic: str = "general", emotion_data : str = "neutral", understanding_level: float = 5.0):
@@ -210,8 +629,9 @@ class ConversationMemory:
             "session_length": 1  # Will be updated for longer conversations
         }
         
-        self.conversations.append(conversation)
-        self._save_conversations()
+        self._append_conversation(conversation)
+        if self._needs_compaction():
+            self.compact()
         
         # Track in learning analytics
         self.learning_analytics.track_topic_interaction(
@@ -222,14 +642,33 @@ class ConversationMemory:
             emotion_data=emotion_data
         )
     
-    def get_conversation_context(self, current_topic: str, agent_type: str = None, limit: int = 5) -> Dict[str, Any]:
-        """Get relevant conversation context for personalized responses"""
+    def get_conversation_context(self, current_topic: str, agent_type: str = None, limit: int = 5,
+                                 query: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get relevant conversation context for personalized responses
+        
+        Candidates are the recent conversations plus the nearest matches for
+        `query` (default: the topic) from the semantic index, re-ranked by
+        similarity, topic, agent and recency.
+        """
+        
+        # Recent conversations, plus semantic matches from the whole history
+        total = len(self.conversations)
+        candidates = {position: 0.0 for position in range(max(total - 20, 0), total)}
+        if self.semantic_index is not None:
+            with self._log_lock:
+                matches = self.semantic_index.search(query or current_topic, k=max(limit * 4, 20))
+            for position, similarity in matches:
+                if position < total:
+                    candidates[position] = max(similarity, 0.0)
         
         # Filter conversations by relevance
         relevant_conversations = []
+        now = time.time()
         
-        for conv in self.conversations[-20:]:  # Look at recent conversations
-            relevance_score = 0
+        for position in sorted(candidates):
+            conv = self.conversations[position]
+            relevance_score = 3 * candidates[position]
             
             # Topic similarity
             if current_topic.lower() in conv["topic"].lower() or conv["topic"].lower() in current_topic.lower():
@@ -240,8 +679,7 @@ class ConversationMemory:
                 relevance_score += 2
             
             # Recent conversations get higher scores
-            conv_time = datetime.fromisoformat(conv["timestamp"])
-            hours_ago = (datetime.now() - conv_time).total_seconds() / 3600
+            hours_ago = (now - self._conversation_times[position]) / 3600
             if hours_ago < 24:
                 relevance_score += 2
             elif hours_ago < 168:  # 1 week
@@ -266,7 +704,7 @@ class ConversationMemory:
             "recent_emotional_trend": recent_emotions,
             "learning_insights": learning_insights,
             "total_conversations": len(self.conversations),
-            "topics_discussed": list(set(conv["topic"] for conv in self.conversations)),
+            "topics_discussed": list(self.aggregates.topic_counts),
             "needs_encouragement": any(emotion in ["frustrated", "discouraged", "anxious"] 
                                      for emotion in recent_emotions[-3:])
         }
@@ -280,29 +718,18 @@ class ConversationMemory:
                 "total_conversations": 0
             }
         
-        # Calculate session statistics
-        total_conversations = len(self.conversations)
-        unique_topics = list(set(conv["topic"] for conv in self.conversations))
-        
-        # Emotional analysis
-        all_emotions = [conv["emotion_analysis"]["primary_emotion"] 
-                       for conv in self.conversations if conv["emotion_analysis"]]
-        emotion_distribution = {}
-        for emotion in all_emotions:
-            emotion_distribution[emotion] = emotion_distribution.get(emotion, 0) + 1
-        
-        # Learning patterns
-        avg_understanding = sum(conv["understanding_level"] for conv in self.conversations) / total_conversations
+        # Session statistics come from the running totals
+        aggregates = self.aggregates
         
         # Recent activity
         recent_activity = self.conversations[-5:] if len(self.conversations) >= 5 else self.conversations
         
         return {
             "student_id": self.student_id,
-            "total_conversations": total_conversations,
-            "topics_studied": unique_topics,
-            "average_understanding": round(avg_understanding, 1),
-            "emotion_distribution": emotion_distribution,
+            "total_conversations": aggregates.record_count,
+            "topics_studied": list(aggregates.topic_counts),
+            "average_understanding": round(aggregates.average_understanding, 1),
+            "emotion_distribution": dict(aggregates.emotion_counts),
             "learning_insights": self.learning_analytics.get_learning_insights(),
             "recent_activity": recent_activity,
             "preferred_learning_style": self._detect_learning_style(),
@@ -311,13 +738,13 @@ class ConversationMemory:
     
     def _detect_learning_style(self) -> str:
         """Detect student's preferred learning style from conversation patterns"""
-        if len(self.conversations) < 3:
+        if self.aggregates.record_count < 3:
             return "unknown"
         
-        # Analyze conversation content for learning style indicators
-        text_requests = sum(1 for conv in self.conversations if "explain" in conv["user_message"].lower())
-        example_requests = sum(1 for conv in self.conversations if "example" in conv["user_message"].lower())
-        practice_requests = sum(1 for conv in self.conversations if "practice" in conv["user_message"].lower())
+        # Learning style indicators counted as conversations were stored
+        text_requests = self.aggregates.style_counts["explain"]
+        example_requests = self.aggregates.style_counts["example"]
+        practice_requests = self.aggregates.style_counts["practice"]
         
         if example_requests > text_requests and example_requests > practice_requests:
             return "visual_learner"
@@ -328,31 +755,20 @@ class ConversationMemory:
     
     def _analyze_study_patterns(self) -> Dict[str, Any]:
         """Analyze student's study patterns and habits"""
-        if len(self.conversations) < 5:
+        aggregates = self.aggregates
+        if aggregates.record_count < 5:
             return {"pattern": "insufficient_data"}
         
-        # Analyze timing patterns
-        conversation_times = [datetime.fromisoformat(conv["timestamp"]) for conv in self.conversations]
-        hours = [t.hour for t in conversation_times]
-        
         # Find peak study hours
-        hour_counts = {}
-        for hour in hours:
-            hour_counts[hour] = hour_counts.get(hour, 0) + 1
-        
+        hour_counts = aggregates.hour_counts
         peak_hour = max(hour_counts.keys(), key=lambda x: hour_counts[x]) if hour_counts else 12
         
         # Analyze session frequency
-        if len(conversation_times) > 1:
-            time_diffs = [(conversation_times[i] - conversation_times[i-1]).total_seconds() / 3600 
-                         for i in range(1, len(conversation_times))]
-            avg_gap_hours = sum(time_diffs) / len(time_diffs)
-        else:
-            avg_gap_hours = 0
+        avg_gap_hours = aggregates.average_gap_hours
         
         return {
             "preferred_study_time": f"{peak_hour}:00",
             "average_session_gap_hours": round(avg_gap_hours, 1),
             "study_frequency": "high" if avg_gap_hours < 24 else "medium" if avg_gap_hours < 72 else "low",
-            "total_study_days": len(set(t.date() for t in conversation_times))
+            "total_study_days": len(aggregates.study_days)
         }
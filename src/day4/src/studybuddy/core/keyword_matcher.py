@@ -0,0 +1,220 @@
+"""
+Shared keyword matcher for StudyBuddy emotion and state detection
+Scores every agent lexicon in a single pass over the text
+"""
+
+import re
+from bisect import bisect_right
+from typing import Any, Dict, List, Iterable, Iterator, Set, Tuple
+
+
+# Lexicons: name -> category -> keywords (matched as lowercase substrings)
+EMOTION_KEYWORDS = {
+    "frustrated": ["frustrated", "stuck", "confused", "don't understand", "hate this", "annoying"],
+    "confident": ["got it", "understand", "easy", "makes sense", "clear", "awesome"],
+    "anxious": ["worried", "nervous", "scared", "overwhelmed", "pressure", "stressed"],
+    "excited": ["excited", "love", "amazing", "awesome", "cool", "interesting"],
+    "discouraged": ["give up", "too hard", "impossible", "can't do", "failing", "hopeless"],
+    "motivated": ["ready", "determined", "let's do this", "motivated", "focused"]
+}
+
+LEARNING_INDICATORS = {
+    "struggling": ["don't get", "still confused", "not working", "error", "wrong"],
+    "progressing": ["better now", "starting to", "almost", "getting closer"],
+    "mastering": ["perfectly", "easily", "no problem", "understand completely"]
+}
+
+PRODUCTIVITY_STATE_KEYWORDS = {
+    "overwhelmed": ["overwhelmed", "too much", "stressed", "can't handle", "drowning"],
+    "tired": ["tired", "exhausted", "sleepy", "worn out", "drained", "low energy"],
+    "distracted": ["distracted", "can't focus", "keep getting distracted", "mind wandering"],
+    "motivated": ["motivated", "ready", "energized", "excited to learn", "let's do this"],
+    "anxious": ["anxious", "worried", "nervous", "stressed about", "pressure"],
+    "procrastinating": ["procrastinating", "putting off", "avoiding", "don't want to start"],
+    "frustrated": ["frustrated", "stuck", "not working", "annoying"]
+}
+
+TIME_PRESSURE_KEYWORDS = {
+    "time_pressure": ["deadline", "due", "urgent", "quickly", "rush"]
+}
+
+MOTIVATION_STATE_KEYWORDS = {
+    "discouraged": ["discouraged", "giving up", "can't do", "too hard", "failing", "hopeless"],
+    "overwhelmed": ["overwhelmed", "too much", "stressed", "pressure", "can't handle"],
+    "stuck": ["stuck", "not progressing", "plateau", "same place", "not moving forward"],
+    "motivated": ["motivated", "excited", "ready", "determined", "energized", "pumped"],
+    "anxious": ["anxious", "worried", "nervous", "scared", "uncertain", "doubt"],
+    "celebrating": ["achieved", "completed", "finished", "success", "did it", "accomplished"],
+    "procrastinating": ["procrastinating", "avoiding", "putting off", "don't want to"],
+    "confused": ["confused", "don't understand", "unclear", "lost", "don't know how"]
+}
+
+PROGRESS_INDICATORS = {
+    "making_progress": ["making progress", "getting better", "improving", "learning"],
+    "struggling": ["struggling", "difficult", "hard time", "challenges"],
+    "breakthrough": ["breakthrough", "finally got it", "clicked", "understand now"]
+}
+
+GOAL_ACTION_KEYWORDS = {
+    "set_goal": ["set a goal", "want to achieve", "goal is", "want to learn", "my goal"],
+    "update_progress": ["made progress", "completed", "finished", "done with", "update"],
+    "complete_goal": ["achieved", "finished my goal", "completed my goal", "goal accomplished"],
+    "need_help": ["stuck on", "struggling with", "need help", "don't know how"],
+    "change_goal": ["change my goal", "different goal", "new goal", "modify goal"]
+}
+
+# What kind of answer a request asks for, used to size the response
+REQUEST_INTENT_KEYWORDS = {
+    "quick": ["what is", "what's", "define", "definition", "meaning of", "briefly", "quick question",
+              "short answer", "yes or no", "tl;dr"],
+    "explain": ["explain", "how does", "how do", "why", "understand", "walk me through", "step by step"],
+    "compare": ["difference between", "compare", " vs ", "versus", "pros and cons"],
+    "example": ["example", "show me", "code", "implement", "write a", "debug", "error", "fix"],
+    "plan": ["plan", "schedule", "study guide", "roadmap", "outline", "create a", "week"]
+}
+
+# Scores are {lexicon: {category: number of distinct keywords found}}
+Scores = Dict[str, Dict[str, int]]
+
+
+class KeywordMatcher:
+    """
+    Finds keywords from many lexicons with one compiled regex.
+
+    A score counts the distinct keywords of a category that appear anywhere
+    in the text, exactly like `sum(1 for k in keywords if k in text)`.
+    Categories keep their lexicon order, so ties resolve as they did with
+    per-keyword scans.
+    """
+
+    # Separates texts joined for batch scoring; never part of a keyword
+    _SEPARATOR = "\x00"
+
+    def __init__(self, lexicons: Dict[str, Dict[str, List[str]]]):
+        self.lexicons = lexicons
+
+        # keyword -> every (lexicon, category) it scores for
+        self._targets: Dict[str, List[Tuple[str, str]]] = {}
+        for lexicon, categories in lexicons.items():
+            for category, keywords in categories.items():
+                for keyword in keywords:
+                    targets = self._targets.setdefault(keyword.lower(), [])
+                    if (lexicon, category) not in targets:
+                        targets.append((lexicon, category))
+
+        # Position of each category, to report scores in lexicon order
+        self._category_order: Dict[Tuple[str, str], int] = {}
+        for lexicon, categories in lexicons.items():
+            for category in categories:
+                self._category_order[(lexicon, category)] = len(self._category_order)
+
+        keywords = sorted(self._targets, key=len, reverse=True)
+
+        # Each search reports the longest keyword starting at an offset, so
+        # shorter keywords contained in a match are added back from here
+        self._contained: Dict[str, Set[str]] = {
+            keyword: {other for other in keywords if other in keyword}
+            for keyword in keywords
+        }
+        self._pattern = re.compile(self._trie_pattern(keywords))
+
+    @staticmethod
+    def _trie_pattern(keywords: List[str]) -> str:
+        """
+        Alternation factored by common prefixes, so the regex engine follows a
+        single branch per character instead of trying every keyword in turn.
+        Greedy optional groups make it match the longest keyword at an offset.
+        """
+        trie: Dict[str, Any] = {}
+        for keyword in keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[""] = {}
+
+        def build(node: Dict[str, Any]) -> str:
+            branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+            if not branches:
+                return ""
+            body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+            if "" in node:
+                # A keyword also ends here; a longer one is tried first
+                return "(?:" + body + ")?"
+            return body
+
+        return build(trie)
+
+    def find_keywords(self, text: str) -> Set[str]:
+        """Every keyword that occurs in the text"""
+        found = set()
+        for _, keyword in self._scan(text.lower()):
+            found |= self._contained[keyword]
+        return found
+
+    def _scan(self, text: str) -> Iterator[Tuple[int, str]]:
+        """Yield (offset, longest keyword) for every offset where a keyword starts"""
+        # Resuming one character after each match start (rather than after its
+        # end) also finds keywords that overlap the previous match
+        search = self._pattern.search
+        match = search(text)
+        while match:
+            yield match.start(), match.group()
+            match = search(text, match.start() + 1)
+
+    def score(self, text: str) -> Scores:
+        """Score every lexicon for one text"""
+        return self._score_keywords(self.find_keywords(text))
+
+    def score_batch(self, texts: Iterable[str]) -> List[Scores]:
+        """Score many texts with a single regex pass over their concatenation"""
+        texts = [text.lower().replace(self._SEPARATOR, " ") for text in texts]
+        if not texts:
+            return []
+
+        starts = []
+        offset = 0
+        for text in texts:
+            starts.append(offset)
+            offset += len(text) + 1
+
+        found: List[Set[str]] = [set() for _ in texts]
+        for offset, keyword in self._scan(self._SEPARATOR.join(texts)):
+            found[bisect_right(starts, offset) - 1] |= self._contained[keyword]
+
+        return [self._score_keywords(keywords) for keywords in found]
+
+    def _score_keywords(self, keywords: Set[str]) -> Scores:
+        counts: Dict[Tuple[str, str], int] = {}
+        for keyword in keywords:
+            for target in self._targets[keyword]:
+                counts[target] = counts.get(target, 0) + 1
+
+        scores: Scores = {lexicon: {} for lexicon in self.lexicons}
+        for lexicon, category in sorted(counts, key=self._category_order.__getitem__):
+            scores[lexicon][category] = counts[(lexicon, category)]
+        return scores
+
+
+def first_category(scores: Dict[str, int], default: str = "unknown") -> str:
+    """First category in lexicon order with any match"""
+    return next(iter(scores), default)
+
+
+def top_category(scores: Dict[str, int], default: str = "neutral") -> str:
+    """Highest scoring category; ties go to the earliest in lexicon order"""
+    if not scores:
+        return default
+    return max(scores.keys(), key=lambda x: scores[x])
+
+
+# Built once at import and shared by all agents
+shared_matcher = KeywordMatcher({
+    "emotion": EMOTION_KEYWORDS,
+    "learning_state": LEARNING_INDICATORS,
+    "productivity_state": PRODUCTIVITY_STATE_KEYWORDS,
+    "time_pressure": TIME_PRESSURE_KEYWORDS,
+    "motivation_state": MOTIVATION_STATE_KEYWORDS,
+    "progress": PROGRESS_INDICATORS,
+    "goal_action": GOAL_ACTION_KEYWORDS,
+    "request_intent": REQUEST_INTENT_KEYWORDS,
+})
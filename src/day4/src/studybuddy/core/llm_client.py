@@ -4,12 +4,24 @@ Extracted from Notebook 2 for reusability across applications
 """
 
 import os
+import re
 import sys
+import time
+import queue
+import asyncio
 import logging
+import threading
 import warnings
-from typing import Dict, List, Any, Optional, Mapping
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, InvalidStateError
+from dataclasses import dataclass, field
+from typing import Dict, List, Any, Optional, Mapping, Tuple, Iterator
 from datetime import datetime
 
+import yaml
+
 # Suppress warnings for cleaner output
 warnings.filterwarnings('ignore')
 
@@ -17,13 +29,725 @@ warnings.filterwarnings('ignore')
 logger = logging.getLogger(__name__)
 
 try:
-    from transformers import AutoTokenizer, AutoModelForCausalLM
+    from transformers import AutoTokenizer, AutoModelForCausalLM, BatchEncoding
+    from transformers import (
+        LogitsProcessorList,
+        RepetitionPenaltyLogitsProcessor,
+        TemperatureLogitsWarper,
+        TopKLogitsWarper,
+        TopPLogitsWarper,
+        TextIteratorStreamer,
+        StoppingCriteria,
+        StoppingCriteriaList,
+    )
     import torch
     from langchain.llms.base import LLM
+    from langchain.schema import Generation, LLMResult
 except ImportError as e:
     logger.error(f"Required dependencies not installed: {e}")
     raise
 
+from .response_cache import ResponseCache
+from .cpu_backend import CPUBackendConfig, load_cpu_model, resident_memory_mb
+from .metrics import LatencyMetrics, THROUGHPUT_BUCKETS
+from .context_budget import ContextBudget, PromptSection, render_sections
+from .request_scheduler import (
+    Priority, RequestContext, RequestExpiredError, FairRequestQueue, PriorityGate, current_request_context,
+    request_context
+)
+
+try:
+    from transformers import DynamicCache
+except ImportError:
+    # Older transformers releases only understand legacy tuple caches
+    DynamicCache = None
+
+
+def _cache_layers(past_key_values) -> List[Tuple[Any, Any]]:
+    """Return the (key, value) tensors of every layer, whatever the cache flavour"""
+    if isinstance(past_key_values, (tuple, list)):
+        return [(layer[0], layer[1]) for layer in past_key_values]
+    if hasattr(past_key_values, "layers"):
+        return [(layer.keys, layer.values) for layer in past_key_values.layers]
+    return list(zip(past_key_values.key_cache, past_key_values.value_cache))
+
+
+def _build_cache(layers: List[Tuple[Any, Any]]):
+    """Build a model-ready cache object from per-layer (key, value) tensors"""
+    if DynamicCache is None:
+        return tuple(layers)
+    cache = DynamicCache()
+    for layer_idx, (key, value) in enumerate(layers):
+        cache.update(key, value, layer_idx)
+    return cache
+
+
+class PrefixKVCache:
+    """
+    LRU store of prompt KV caches keyed by token prefix.
+
+    Agent system prompts share long, mostly constant persona blocks. After a
+    prompt is prefilled its past_key_values are kept here; a later prompt
+    resumes prefill from the longest common token prefix with any stored
+    entry instead of re-encoding the whole preamble.
+    """
+
+    def __init__(self, max_memory_mb: int = 1024, min_prefix_tokens: int = 32):
+        self.max_memory_bytes = max_memory_mb * 1024 * 1024
+        self.min_prefix_tokens = min_prefix_tokens
+        self._entries: "OrderedDict[Tuple[int, ...], Dict[str, Any]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+        # Cache metrics
+        self.hits = 0
+        self.misses = 0
+        self.tokens_reused = 0
+        self.evictions = 0
+
+    def lookup(self, input_ids) -> Tuple[int, Optional[List[Tuple[Any, Any]]]]:
+        """
+        Find the longest cached prefix of a 1-D prompt.
+
+        Returns the number of reusable tokens and the matching per-layer KV
+        tensors cropped to that length, or (0, None) on a miss. At least one
+        prompt token is always left uncached so the caller gets fresh logits.
+        """
+        ids = input_ids.detach().cpu()
+        best_length, best_key = 0, None
+        with self._lock:
+            for key, entry in self._entries.items():
+                length = _common_prefix_length(entry["ids"], ids)
+                if length > best_length:
+                    best_length, best_key = length, key
+
+            best_length = min(best_length, len(ids) - 1)
+            if best_key is None or best_length < self.min_prefix_tokens:
+                self.misses += 1
+                return 0, None
+
+            self._entries.move_to_end(best_key)
+            layers = self._entries[best_key]["layers"]
+            self.hits += 1
+            self.tokens_reused += best_length
+
+        return best_length, [(k[:, :, :best_length, :], v[:, :, :best_length, :]) for k, v in layers]
+
+    def store(self, input_ids, layers: List[Tuple[Any, Any]]):
+        """Remember the KV cache of a freshly prefilled prompt"""
+        ids = input_ids.detach().cpu()
+        if len(ids) < self.min_prefix_tokens:
+            return
+        size = sum(k.numel() * k.element_size() + v.numel() * v.element_size() for k, v in layers)
+        if size > self.max_memory_bytes:
+            return
+
+        key = tuple(ids.tolist())
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = {"ids": ids, "layers": layers, "size": size}
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_memory_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._memory_bytes -= evicted["size"]
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._memory_bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Prefix cache metrics for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "memory_mb": round(self._memory_bytes / (1024 * 1024), 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / max(lookups, 1), 3),
+            "prefill_tokens_reused": self.tokens_reused,
+            "evictions": self.evictions,
+        }
+
+
+def _common_prefix_length(a, b) -> int:
+    """Number of leading tokens two 1-D id tensors share"""
+    length = min(len(a), len(b))
+    if length == 0:
+        return 0
+    mismatches = (a[:length] != b[:length]).nonzero()
+    return int(mismatches[0]) if len(mismatches) else length
+
+
+def _prefill(model, input_ids, prefix_cache: Optional[PrefixKVCache] = None):
+    """
+    Run the prompt forward pass for a [1, seq] batch, resuming from the
+    longest cached prefix when a prefix cache is available.
+    """
+    prompt_length = input_ids.shape[1]
+    attention_mask = torch.ones_like(input_ids)
+    reused, layers = prefix_cache.lookup(input_ids[0]) if prefix_cache is not None else (0, None)
+
+    if reused:
+        position_ids = torch.arange(reused, prompt_length, device=input_ids.device).unsqueeze(0)
+        outputs = model(
+            input_ids=input_ids[:, reused:],
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            past_key_values=_build_cache(layers),
+            use_cache=True,
+        )
+    else:
+        outputs = model(input_ids=input_ids, attention_mask=attention_mask, use_cache=True)
+
+    if prefix_cache is not None:
+        prefix_cache.store(input_ids[0], _cache_layers(outputs.past_key_values))
+    return outputs
+
+
+class PromptTokenCache:
+    """
+    LRU cache of chat-template token ids per system message.
+
+    The template is rendered once per system message around a placeholder
+    user turn, and the text on either side is tokenized once, cut at added
+    tokens such as <|im_start|>. Tokenizers split on added tokens before
+    merging anything, so the cached ids join exactly with freshly tokenized
+    user content. Templates that cannot be split this way, or whose split
+    ids differ from a full tokenization, fall back to the full path.
+    """
+
+    _PLACEHOLDER = "\x00studybuddy-user-content\x00"
+
+    def __init__(self, tokenizer, max_entries: int = 256, max_length: int = 2048):
+        self.tokenizer = tokenizer
+        self.max_entries = max_entries
+        self.max_length = max_length
+        # system message -> cached segments, or None when it must use the full path
+        self._entries: "OrderedDict[str, Optional[Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        added_tokens = sorted(tokenizer.get_added_vocab(), key=len, reverse=True)
+        self._added_token_pattern = re.compile("|".join(map(re.escape, added_tokens))) if added_tokens else None
+
+        # Cache metrics
+        self.hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+        self.evictions = 0
+
+    def encode(self, system_message: str, prompt: str) -> List[int]:
+        """Token ids of the chat-formatted prompt, truncated like the tokenizer would"""
+        with self._lock:
+            cached = system_message in self._entries
+            if cached:
+                self._entries.move_to_end(system_message)
+                entry = self._entries[system_message]
+                self.hits += 1
+                if entry is None:
+                    self.fallbacks += 1
+            else:
+                self.misses += 1
+
+        if not cached:
+            entry = self._build(system_message)
+            full_ids = self._encode_full(system_message, prompt)
+            if entry is not None and self._encode_segments(entry, prompt) != full_ids:
+                logger.debug("Chat template does not split on added tokens; tokenizing prompts in full")
+                entry = None
+            self._store(system_message, entry)
+            return full_ids
+
+        if entry is None:
+            return self._encode_full(system_message, prompt)
+        return self._encode_segments(entry, prompt)
+
+    def _render(self, system_message: str, prompt: str) -> str:
+        messages = [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": prompt}
+        ]
+        return self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+
+    def _tokenize(self, text: str) -> List[int]:
+        return self.tokenizer(text, add_special_tokens=False).input_ids if text else []
+
+    def _encode_full(self, system_message: str, prompt: str) -> List[int]:
+        return self.tokenizer(
+            self._render(system_message, prompt),
+            truncation=True,
+            max_length=self.max_length
+        ).input_ids
+
+    def _encode_segments(self, entry: Dict[str, Any], prompt: str) -> List[int]:
+        ids = entry["prefix_ids"] + self._tokenize(entry["head"] + prompt + entry["tail"]) + entry["suffix_ids"]
+        if len(ids) <= self.max_length:
+            return ids
+        if self.tokenizer.truncation_side == "left":
+            return ids[-self.max_length:]
+        return ids[:self.max_length]
+
+    def _build(self, system_message: str) -> Optional[Dict[str, Any]]:
+        """Split the rendered template into cached ids and text re-tokenized with each prompt"""
+        if self._added_token_pattern is None:
+            return None
+        parts = self._render(system_message, self._PLACEHOLDER).split(self._PLACEHOLDER)
+        if len(parts) != 2:
+            return None
+        before, after = parts
+
+        # Cut after the last added token before the user content and before
+        # the first one after it
+        matches = list(self._added_token_pattern.finditer(before))
+        cut = matches[-1].end() if matches else 0
+        match = self._added_token_pattern.search(after)
+        resume = match.start() if match else len(after)
+
+        return {
+            "prefix_ids": self._tokenize(before[:cut]),
+            "head": before[cut:],
+            "tail": after[:resume],
+            "suffix_ids": self._tokenize(after[resume:]),
+        }
+
+    def _store(self, system_message: str, entry: Optional[Dict[str, Any]]):
+        with self._lock:
+            self._entries[system_message] = entry
+            self._entries.move_to_end(system_message)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Tokenization cache metrics for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / max(lookups, 1), 3),
+            "full_tokenizations": self.fallbacks + self.misses,
+            "evictions": self.evictions,
+        }
+
+
+@dataclass
+class GenerationTiming:
+    """perf_counter timestamps of one generation's phases"""
+    submitted_at: float = field(default_factory=time.perf_counter)
+    # The model starts on the request: prefill begins
+    started_at: Optional[float] = None
+    first_token_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def mark_token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+
+
+class _FirstTokenTimer(StoppingCriteria):
+    """Never stops generation; stamps the first token's arrival for generate()"""
+
+    def __init__(self, timing: GenerationTiming):
+        self.timing = timing
+
+    def __call__(self, input_ids, scores, **kwargs):
+        self.timing.mark_token()
+        return torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+
+
+class _CancelledStop(StoppingCriteria):
+    """Ends generate() once the caller cancelled its future, e.g. by closing a stream"""
+
+    def __init__(self, future: Future):
+        self.future = future
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.future.cancelled(), dtype=torch.bool, device=input_ids.device)
+
+
+@dataclass(frozen=True)
+class SectionStop:
+    """
+    End generation once `count` separators have been generated, e.g. the
+    `---` closing the last of three sections a tool prompt asks for.
+    """
+    separator: str = "---"
+    count: int = 1
+
+
+class SectionStoppingCriteria(StoppingCriteria):
+    """
+    Counts separators in the generated text token by token. Works both as a
+    generate() stopping criterion and, via feed(), for the batch scheduler.
+    """
+
+    def __init__(self, tokenizer, stop: SectionStop, prompt_length: int = 0):
+        self.tokenizer = tokenizer
+        self.stop = stop
+        self.found = 0
+        self._position = prompt_length
+        # Undecided text that may still be the start of a separator
+        self._tail = ""
+
+    def feed(self, token: int) -> bool:
+        """Add one generated token; True once enough separators were seen"""
+        separator = self.stop.separator
+        self._tail += self.tokenizer.decode([token], skip_special_tokens=True)
+        index = self._tail.find(separator)
+        while index >= 0:
+            self.found += 1
+            self._tail = self._tail[index + len(separator):]
+            index = self._tail.find(separator)
+        self._tail = self._tail[-(len(separator) - 1):] if len(separator) > 1 else ""
+        return self.found >= self.stop.count
+
+    def __call__(self, input_ids, scores, **kwargs):
+        # Assisted generation can add several tokens per call
+        done = False
+        for token in input_ids[0, self._position:].tolist():
+            done = self.feed(token) or done
+        self._position = input_ids.shape[1]
+        return torch.full((input_ids.shape[0],), done, dtype=torch.bool, device=input_ids.device)
+
+
+@dataclass
+class GenerationRequest:
+    """A single prompt waiting for, or taking part in, batched decoding"""
+    input_ids: Any
+    max_new_tokens: int
+    temperature: float
+    top_p: float = 0.9
+    top_k: int = 50
+    repetition_penalty: float = 1.1
+    future: Future = field(default_factory=Future)
+    generated: List[int] = field(default_factory=list)
+    timing: GenerationTiming = field(default_factory=GenerationTiming)
+    streamer: Any = None
+    stopping: Optional[SectionStoppingCriteria] = None
+    # Priority, student and deadline of whoever asked, taken from the calling thread
+    context: RequestContext = field(default_factory=current_request_context)
+
+    def emit(self, token: int):
+        """Record a generated token and forward it to the streamer, if any"""
+        self.timing.mark_token()
+        self.generated.append(token)
+        if self.streamer is not None:
+            self.streamer.put(torch.tensor([token]))
+
+    def finish(self, error: Optional[Exception] = None):
+        """Resolve the future and close the stream"""
+        self.timing.finished_at = time.perf_counter()
+        if not self.future.done():
+            if error is None:
+                self.future.set_result(list(self.generated))
+            else:
+                self.future.set_exception(error)
+        if self.streamer is not None:
+            self.streamer.end()
+
+    def build_logits_processors(self) -> LogitsProcessorList:
+        """Same sampling pipeline `model.generate` applies for our parameters"""
+        processors = LogitsProcessorList()
+        if self.repetition_penalty and self.repetition_penalty != 1.0:
+            processors.append(RepetitionPenaltyLogitsProcessor(penalty=self.repetition_penalty))
+        if self.temperature > 0:
+            processors.append(TemperatureLogitsWarper(self.temperature))
+            if self.top_k:
+                processors.append(TopKLogitsWarper(top_k=self.top_k))
+            if self.top_p < 1.0:
+                processors.append(TopPLogitsWarper(top_p=self.top_p))
+        return processors
+
+
+class ContinuousBatchingScheduler:
+    """
+    Iteration-level request scheduler for a causal LM.
+
+    Incoming prompts are queued and prefilled individually, then merged into a
+    shared decode batch. Every decode step runs one forward pass for all active
+    sequences; new requests join at step boundaries and finished ones leave, so
+    concurrent callers share the model instead of waiting for each other.
+
+    Waiting requests are admitted by priority class and round-robin across
+    students. `interactive_slots` batch slots are kept for interactive
+    requests, so long tool and study plan generations can never fill the
+    whole batch, and requests whose deadline passes are dropped, whether
+    still queued or mid-generation.
+    """
+
+    def __init__(self, model, tokenizer, max_batch_size: int = 8, max_queue_size: int = 256,
+                 prefix_cache: Optional[PrefixKVCache] = None, interactive_slots: int = 1):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.prefix_cache = prefix_cache
+        # A batch of one has nothing to reserve
+        self.interactive_slots = max(min(interactive_slots, max_batch_size - 1), 0)
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+
+        self._waiting = FairRequestQueue(max_size=max_queue_size, on_expired=self._drop_expired)
+        self._stop_event = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+        # Decode batch state, owned by the worker thread
+        self._active: List[GenerationRequest] = []
+        self._processors: List[LogitsProcessorList] = []
+        self._cache = None
+        self._attention_mask = None
+        self._next_tokens = None
+
+        # Scheduler metrics
+        self.steps_run = 0
+        self.peak_batch_size = 0
+        self._batch_size_total = 0
+        self.expired_while_running = 0
+
+    def submit(self, request: GenerationRequest, block: bool = True) -> Future:
+        """
+        Queue a request for generation and return a future for its token ids.
+        With block=False a full queue raises queue.Full instead of waiting.
+        """
+        self._ensure_started()
+        self._waiting.put(request, block=block)
+        return request.future
+
+    def shutdown(self, timeout: float = 5.0):
+        """Stop the worker thread and fail anything still queued"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        for request in self._waiting.drain():
+            request.finish(RuntimeError("Scheduler shut down"))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Batching metrics for monitoring"""
+        queue_stats = self._waiting.get_stats()
+        return {
+            "queued_requests": self._waiting.qsize(),
+            "active_sequences": len(self._active),
+            "decode_steps": self.steps_run,
+            "peak_batch_size": self.peak_batch_size,
+            "average_batch_size": round(self._batch_size_total / max(self.steps_run, 1), 2),
+            "queued_by_priority": queue_stats["queued"],
+            "admitted_by_priority": queue_stats["dequeued"],
+            "expired_while_queued": queue_stats["expired"],
+            "expired_while_running": self.expired_while_running,
+        }
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop_event.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name="studybuddy-batch-scheduler", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        """Worker loop: admit waiting requests, then advance the batch by one token"""
+        while not self._stop_event.is_set():
+            if not self._active:
+                try:
+                    request = self._waiting.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                self._admit(request)
+
+            while len(self._active) < self.max_batch_size:
+                try:
+                    request = self._waiting.get_nowait(max_priority=self._admissible_priority())
+                except queue.Empty:
+                    break
+                self._admit(request)
+
+            if self._active:
+                try:
+                    self._decode_step()
+                except Exception as e:
+                    self.logger.error(f"Batched decode step failed: {e}")
+                    self._fail_active(e)
+
+        self._fail_active(RuntimeError("Scheduler shut down"))
+
+    def _admissible_priority(self) -> Priority:
+        """Lowest priority class that may take the next free batch slot"""
+        shared_slots = self.max_batch_size - self.interactive_slots
+        non_interactive = sum(request.context.priority > Priority.INTERACTIVE for request in self._active)
+        return Priority.BACKGROUND if non_interactive < shared_slots else Priority.INTERACTIVE
+
+    @staticmethod
+    def _drop_expired(request: GenerationRequest):
+        request.finish(RequestExpiredError("Deadline passed while queued for generation"))
+
+    @torch.inference_mode()
+    def _admit(self, request: GenerationRequest):
+        """Prefill a new request on its own and merge it into the decode batch"""
+        if request.future.cancelled():
+            return
+        request.timing.started_at = time.perf_counter()
+        try:
+            input_ids = request.input_ids.to(self.model.device).unsqueeze(0)
+            outputs = _prefill(self.model, input_ids, self.prefix_cache)
+            processors = request.build_logits_processors()
+            first_token = self._sample(outputs.logits[:, -1, :], input_ids, processors, request)
+            request.emit(first_token)
+            if self._is_finished(request, first_token):
+                request.finish()
+                return
+            self._merge(request, processors, _cache_layers(outputs.past_key_values), input_ids.shape[1])
+        except Exception as e:
+            self.logger.error(f"Prefill failed: {e}")
+            request.finish(e)
+
+    def _merge(self, request: GenerationRequest, processors: LogitsProcessorList,
+               layers: List[Tuple[Any, Any]], prompt_length: int):
+        """Left-pad the batch and the new sequence to a common length and stack them"""
+        device = self.model.device
+        new_mask = torch.ones((1, prompt_length), dtype=torch.long, device=device)
+        new_token = torch.tensor([request.generated[-1]], dtype=torch.long, device=device)
+
+        if not self._active:
+            merged_layers = layers
+            self._attention_mask = new_mask
+            self._next_tokens = new_token
+        else:
+            batch_layers = _cache_layers(self._cache)
+            target_length = max(self._attention_mask.shape[1], prompt_length)
+            merged_layers = [
+                (
+                    torch.cat([_left_pad(bk, target_length), _left_pad(k, target_length)], dim=0),
+                    torch.cat([_left_pad(bv, target_length), _left_pad(v, target_length)], dim=0),
+                )
+                for (bk, bv), (k, v) in zip(batch_layers, layers)
+            ]
+            self._attention_mask = torch.cat([
+                _left_pad_mask(self._attention_mask, target_length),
+                _left_pad_mask(new_mask, target_length),
+            ], dim=0)
+            self._next_tokens = torch.cat([self._next_tokens, new_token])
+
+        self._cache = _build_cache(merged_layers)
+        self._active.append(request)
+        self._processors.append(processors)
+
+    @torch.inference_mode()
+    def _decode_step(self):
+        """Run one forward pass for every active sequence and retire finished ones"""
+        batch_size = len(self._active)
+        self.steps_run += 1
+        self._batch_size_total += batch_size
+        self.peak_batch_size = max(self.peak_batch_size, batch_size)
+
+        step_mask = torch.ones((batch_size, 1), dtype=torch.long, device=self._attention_mask.device)
+        self._attention_mask = torch.cat([self._attention_mask, step_mask], dim=1)
+        position_ids = self._attention_mask.sum(dim=-1, keepdim=True) - 1
+
+        outputs = self.model(
+            input_ids=self._next_tokens.unsqueeze(-1),
+            attention_mask=self._attention_mask,
+            position_ids=position_ids,
+            past_key_values=self._cache,
+            use_cache=True,
+        )
+        self._cache = outputs.past_key_values
+        logits = outputs.logits[:, -1, :]
+
+        keep = []
+        next_tokens = []
+        for row, (request, processors) in enumerate(zip(self._active, self._processors)):
+            history = torch.cat([
+                request.input_ids.to(logits.device),
+                torch.tensor(request.generated, dtype=torch.long, device=logits.device),
+            ]).unsqueeze(0)
+            token = self._sample(logits[row:row + 1], history, processors, request)
+            request.emit(token)
+            if request.context.expired():
+                # Nobody is waiting for the rest; free the slot
+                self.expired_while_running += 1
+                request.finish(RequestExpiredError("Deadline passed during generation"))
+            elif self._is_finished(request, token):
+                request.finish()
+            else:
+                keep.append(row)
+                next_tokens.append(token)
+
+        if len(keep) == batch_size:
+            self._next_tokens = torch.tensor(next_tokens, dtype=torch.long, device=logits.device)
+        elif keep:
+            self._evict(keep, next_tokens)
+        else:
+            self._reset_batch()
+
+    def _evict(self, keep: List[int], next_tokens: List[int]):
+        """Drop finished rows and trim padding columns no remaining row needs"""
+        device = self._attention_mask.device
+        index = torch.tensor(keep, dtype=torch.long, device=device)
+        mask = self._attention_mask.index_select(0, index)
+        first_used = int((mask.sum(dim=0) > 0).nonzero()[0])
+        layers = [
+            (k.index_select(0, index)[:, :, first_used:, :], v.index_select(0, index)[:, :, first_used:, :])
+            for k, v in _cache_layers(self._cache)
+        ]
+        self._cache = _build_cache(layers)
+        self._attention_mask = mask[:, first_used:]
+        self._active = [self._active[row] for row in keep]
+        self._processors = [self._processors[row] for row in keep]
+        self._next_tokens = torch.tensor(next_tokens, dtype=torch.long, device=device)
+
+    def _sample(self, logits, history, processors: LogitsProcessorList, request: GenerationRequest) -> int:
+        scores = processors(history, logits.float())
+        if request.temperature > 0:
+            probs = torch.softmax(scores, dim=-1)
+            return int(torch.multinomial(probs, num_samples=1)[0, 0])
+        return int(torch.argmax(scores, dim=-1)[0])
+
+    def _is_finished(self, request: GenerationRequest, token: int) -> bool:
+        # A cancelled future means the caller went away; free its batch slot
+        return (request.future.cancelled() or token == self.tokenizer.eos_token_id or
+                len(request.generated) >= request.max_new_tokens or
+                (request.stopping is not None and request.stopping.feed(token)))
+
+    def _fail_active(self, error: Exception):
+        for request in self._active:
+            request.finish(error)
+        self._reset_batch()
+
+    def _reset_batch(self):
+        self._active = []
+        self._processors = []
+        self._cache = None
+        self._attention_mask = None
+        self._next_tokens = None
+
+
+def _left_pad(tensor, target_length: int):
+    """Left-pad a [batch, heads, seq, dim] cache tensor with zeros along seq"""
+    missing = target_length - tensor.shape[-2]
+    if missing <= 0:
+        return tensor
+    padding = tensor.new_zeros(tensor.shape[:-2] + (missing, tensor.shape[-1]))
+    return torch.cat([padding, tensor], dim=-2)
+
+
+def _left_pad_mask(mask, target_length: int):
+    """Left-pad a [batch, seq] attention mask with zeros"""
+    missing = target_length - mask.shape[1]
+    if missing <= 0:
+        return mask
+    return torch.cat([mask.new_zeros((mask.shape[0], missing)), mask], dim=1)
+
 
 class ProductionLLMClient:
     """
@@ -33,7 +757,23 @@ class ProductionLLMClient:
     This is the exact same implementation from Notebook 2, extracted for reusability.
     """
     
-    def __init__(self, model=None, tokenizer=None, model_name=None):
+    DEFAULT_SYSTEM_MESSAGE = "You are a helpful AI assistant for learning and productivity."
+    
+    # Async callers wait this long for room in a full inference queue before failing
+    ASYNC_QUEUE_TIMEOUT_SECONDS = 30.0
+    # Bound on async requests waiting for the unbatched model
+    MAX_DIRECT_ASYNC_PENDING = 256
+    # Sent instead of answers too short to be useful
+    FALLBACK_RESPONSE = "I'd be happy to help you with that! Could you provide more specific details?"
+    # Checkpoint used when model_config.yaml does not name one
+    DEFAULT_MODEL_NAME = "unsloth/Qwen2.5-14B-Instruct-bnb-4bit"
+    
+    def __init__(self, model=None, tokenizer=None, model_name=None,
+                 enable_batching: bool = True, max_batch_size: int = 8,
+                 prefix_cache_mb: int = 1024, response_cache: Optional[ResponseCache] = None,
+                 model_config: Optional[Dict[str, Any]] = None, draft_model=None,
+                 draft_model_name: Optional[str] = None, prompt_cache_entries: int = 256,
+                 max_context_tokens: Optional[int] = None, coalesce_requests: bool = True):
         """
         Initialize production LLM client.
         Can be initialized with pre-loaded components or load fresh.
@@ -42,44 +782,147 @@ class ProductionLLMClient:
             model: Pre-loaded Hugging Face model (optional)
             tokenizer: Pre-loaded tokenizer (optional)
             model_name: Model identifier for logging (optional)
+            enable_batching: Merge concurrent requests into one decode batch
+            max_batch_size: Maximum sequences decoded together per step
+            prefix_cache_mb: Memory budget for reusable prompt KV caches (0 disables)
+            response_cache: Optional ResponseCache for repeated prompts (off by default)
+            model_config: Parsed model_config.yaml; picks the checkpoint and CPU
+                backend when loading fresh (defaults to load_model_config())
+            draft_model: Pre-loaded small model sharing the tokenizer, used for
+                assisted (speculative) generation (optional)
+            draft_model_name: Draft model identifier for logging (optional)
+            prompt_cache_entries: System messages whose chat-template tokens are
+                kept for reuse (0 disables)
+            max_context_tokens: Prompt plus answer token budget (defaults to the
+                `context` section of model_config, capped at the model's context length)
+            coalesce_requests: Let concurrent identical cacheable requests share
+                one generation
         """
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.draft_model = draft_model
+        self.draft_model_name = draft_model_name
+        # Seconds spent in each startup phase, reported by get_stats
+        self.load_timings: Dict[str, float] = {}
         if model is not None and tokenizer is not None:
             # Use pre-loaded components
             self.model = model
             self.tokenizer = tokenizer
             self.model_name = model_name or "qwen2.5-14b-instruct"
+            self.backend = "preloaded"
             self.logger.info(f"🤖 Using pre-loaded model: {self.model_name}")
         else:
             # Load fresh components
-            self.model_name = "unsloth/Qwen2.5-14B-Instruct-bnb-4bit"
-            self._load_model()
+            model_config = model_config if model_config is not None else load_model_config()
+            self._load_model(model_config)
         
         # Production metrics
         self.request_count = 0
         self.total_tokens_generated = 0
+        # Wall time spent generating, summed over requests, for tokens/second
+        self.generation_seconds = 0.0
+        self._stats_lock = threading.Lock()
+        # Per-phase latency histograms and requests currently being served
+        self.metrics = LatencyMetrics(namespace="studybuddy_llm")
+        self.in_flight = 0
+        
+        # Single-flight coalescing: flight key -> [future for the leader's
+        # response, number of followers waiting on it, leader's deadline]
+        self.coalesce_requests = coalesce_requests
+        self._flights: Dict[str, List[Any]] = {}
+        self._flight_lock = threading.Lock()
+        self.coalesced_requests = 0
+        self.shared_generations = 0
+        
+        # Speculative decoding: forward passes are counted per thread while a
+        # request runs assisted generation
+        self.assisted_requests = 0
+        self.assisted_tokens = 0
+        self.target_steps = 0
+        self.drafted_tokens = 0
+        self._assist_counts = threading.local()
+        self._assist_hooks = []
+        if self.draft_model is not None:
+            self.draft_model_name = self.draft_model_name or "draft"
+            self._assist_hooks = [
+                self.model.register_forward_hook(self._count_forward("target_steps")),
+                self.draft_model.register_forward_hook(self._count_forward("drafted_tokens")),
+            ]
+            if enable_batching:
+                # Assisted generation verifies one sequence at a time
+                self.logger.info("🎯 Draft model loaded; serving requests unbatched with assisted generation")
+                enable_batching = False
+        
+        # KV cache reuse for the long, mostly constant agent system prompts
+        self.prefix_cache = PrefixKVCache(max_memory_mb=prefix_cache_mb) if prefix_cache_mb > 0 else None
+        
+        # Prompts over the context budget are trimmed by section instead of cut off
+        self.context_budget = ContextBudget.from_config(
+            self.tokenizer, self.model, (model_config or {}).get("context"), max_context_tokens
+        )
+        
+        # Token ids of the chat template around each system message
+        self.prompt_cache = PromptTokenCache(
+            self.tokenizer, max_entries=prompt_cache_entries,
+            max_length=self.context_budget.max_context_tokens
+        ) if prompt_cache_entries > 0 else None
+        
+        # Opt-in cache of finished responses, keyed on prompt and sampling params
+        self.response_cache = response_cache
+        
+        # Continuous batching scheduler shared by all callers of this client
+        self.scheduler = None
+        if enable_batching:
+            self.scheduler = ContinuousBatchingScheduler(
+                self.model, self.tokenizer, max_batch_size=max_batch_size,
+                prefix_cache=self.prefix_cache
+            )
+        
+        # Without the scheduler, async calls share one worker thread for the model
+        # and every unbatched generation waits its turn at the priority gate
+        self._direct_executor = None
+        self._direct_pending = 0
+        self._direct_gate = PriorityGate(capacity=1)
         
         self.logger.info(f"🤖 Production LLM Client initialized")
         self.logger.info(f"📝 Model: {self.model_name}")
         self.logger.info(f"🎯 Ready for agent integration")
     
-    def _load_model(self):
-        """Load model and tokenizer fresh"""
-        self.logger.info(f"🔄 Loading model: {self.model_name}")
+    def _load_model(self, model_config: Dict[str, Any]):
+        """Load model and tokenizer fresh, on GPU if available, else with the configured CPU backend"""
+        model_settings = model_config.get("model") or {}
+        self.model_name = model_settings.get("name") or self.DEFAULT_MODEL_NAME
         
         try:
             # Check hardware capabilities
-            if torch.cuda.is_available():
+            if torch.cuda.is_available() and model_settings.get("device", "auto") != "cpu":
                 device = "cuda"
+                cpu_config = None
+                self.backend = "cuda-float16"
                 self.logger.info(f"🔧 Using GPU: {torch.cuda.get_device_name(0)}")
             else:
                 device = "cpu"
-                self.logger.warning("⚠️ No GPU detected, using CPU")
+                cpu_config = CPUBackendConfig.from_dict(model_config.get("cpu"))
+                self.model_name = cpu_config.model_name or self.model_name
+                self.backend = cpu_config.backend_name
+                self.logger.warning(f"⚠️ No GPU in use, running on CPU backend: {self.backend}")
+            
+            self.device = device
+            self.logger.info(f"🔄 Loading model: {self.model_name}")
+            
+            load_kwargs = {}
+            if (model_config.get("startup") or {}).get("low_memory_load", False):
+                # Skip random initialization and load the checkpoint shard by shard,
+                # keeping peak memory near one copy of the weights. Every tensor is
+                # still materialized at load. .safetensors shards are preferred and
+                # .bin checkpoints still load
+                load_kwargs = {"low_cpu_mem_usage": True}
             
             # Load tokenizer
             self.logger.info("📝 Loading tokenizer...")
+            started_at = time.perf_counter()
             self.tokenizer = AutoTokenizer.from_pretrained(self.model_name, trust_remote_code=True)
+            self.load_timings["tokenizer_seconds"] = round(time.perf_counter() - started_at, 3)
             
             # Ensure we have a pad token
             if self.tokenizer.pad_token is None:
@@ -87,30 +930,80 @@ class ProductionLLMClient:
             
             # Load model
             self.logger.info("🤖 Loading model...")
-            if device == "cuda":
-                self.model = AutoModelForCausalLM.from_pretrained(
-                    self.model_name,
-                    device_map="auto",
-                    trust_remote_code=True,
-                    torch_dtype=torch.float16,
-                )
-            else:
-                self.model = AutoModelForCausalLM.from_pretrained(
-                    self.model_name,
-                    torch_dtype=torch.float32,
-                    device_map=None,
-                    trust_remote_code=True
-                ).to(device)
+            started_at = time.perf_counter()
+            self.model = self._load_causal_lm(self.model_name, cpu_config, **load_kwargs)
+            self.load_timings["model_seconds"] = round(time.perf_counter() - started_at, 3)
+            self.logger.info(f"✅ Model loaded successfully in {self.load_timings['model_seconds']}s!")
             
-            self.model.eval()
-            self.logger.info("✅ Model loaded successfully!")
+            # Optional draft model for assisted generation; must share the tokenizer
+            draft_settings = model_config.get("draft") or {}
+            if draft_settings.get("model_name"):
+                self.draft_model_name = draft_settings["model_name"]
+                self.logger.info(f"🤖 Loading draft model: {self.draft_model_name}")
+                started_at = time.perf_counter()
+                self.draft_model = self._load_causal_lm(self.draft_model_name, cpu_config, **load_kwargs)
+                self.draft_model.generation_config.num_assistant_tokens = draft_settings.get("num_assistant_tokens", 5)
+                self.load_timings["draft_model_seconds"] = round(time.perf_counter() - started_at, 3)
             
         except Exception as e:
             self.logger.error(f"❌ Failed to load model: {e}")
             raise
     
+    @staticmethod
+    def _load_causal_lm(model_name: str, cpu_config: Optional[CPUBackendConfig], **load_kwargs):
+        """Load a model in float16 across GPUs, or with the CPU backend when cpu_config is given"""
+        if cpu_config is None:
+            model = AutoModelForCausalLM.from_pretrained(
+                model_name,
+                device_map="auto",
+                trust_remote_code=True,
+                torch_dtype=torch.float16,
+                **load_kwargs
+            )
+        else:
+            model = load_cpu_model(model_name, cpu_config, **load_kwargs)
+        model.eval()
+        return model
+    
+    def warm_up(self, prompt: str = "Hello!", max_tokens: int = 8,
+                system_message: Optional[str] = None) -> float:
+        """
+        Run one short greedy generation before serving traffic.
+        
+        This faults in memory-mapped weights, grows the allocator, triggers
+        torch.compile and fills the prompt caches, so the first real request
+        does not pay for them. It is not counted in request metrics.
+        Returns the seconds taken.
+        """
+        started_at = time.perf_counter()
+        inputs = self._prepare_inputs(prompt, system_message, max_tokens)
+        self._start_generation(inputs, max_tokens, 0.0).result()
+        elapsed = time.perf_counter() - started_at
+        self.load_timings["warmup_seconds"] = round(elapsed, 3)
+        self.logger.info(f"🔥 Warm-up generation took {elapsed:.2f}s")
+        return elapsed
+    
+    def _count_forward(self, counter: str):
+        """Forward hook counting passes for the assisted request running on this thread"""
+        def hook(module, args, output):
+            counts = getattr(self._assist_counts, "value", None)
+            if counts is not None:
+                counts[counter] += 1
+        return hook
+    
+    def _use_draft(self, temperature: float) -> bool:
+        """Whether a direct request can use assisted generation"""
+        if self.draft_model is None:
+            return False
+        if temperature <= 0:
+            return True
+        # Speculative sampling compares both models' distributions token by token,
+        # which needs output layers of the same width
+        return self.draft_model.config.vocab_size == self.model.config.vocab_size
+    
     def generate_response(self, prompt: str, max_tokens: int = 150, temperature: float = 0.7, 
-                         system_message: Optional[str] = None) -> str:
+                         system_message: Optional[str] = None, use_cache: bool = True,
+                         stop: Optional[SectionStop] = None) -> str:
         """
         Generate high-quality response for agent use.
         
@@ -119,25 +1012,504 @@ class ProductionLLMClient:
             max_tokens: Maximum tokens to generate
             temperature: Sampling temperature (0.0 = deterministic, 1.0 = creative)
             system_message: Optional system message to set context/personality
+            use_cache: Serve/store this call through the response cache, if one is
+                attached. Pass False for sampled answers that should vary per call.
+            stop: End early after this many section separators, for structured
+                formats such as the `---`-terminated tool sections
             
         Returns:
             Generated response from Qwen2.5-14B
         """
-        self.request_count += 1
+        with self._stats_lock:
+            self.request_count += 1
+        
+        cache_key = self._response_cache_key(prompt, max_tokens, temperature, system_message, use_cache, stop)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
         
+        flight_key, flight = self._join_flight(prompt, max_tokens, temperature, system_message, use_cache, stop)
+        if flight is not None:
+            shared = flight.result()
+            if shared is not None:
+                return shared
+        
+        response = None
         try:
-            return self._generate_qwen_response(prompt, max_tokens, temperature, system_message)
+            with self._track_in_flight():
+                response = self._generate_qwen_response(prompt, max_tokens, temperature, system_message, cache_key, stop)
         except Exception as e:
             self.logger.error(f"Generation failed: {e}")
-            return "I apologize, but I'm experiencing technical difficulties. Please try again."
+            # Followers must not inherit the failure; they generate on their own
+            self._land_flight(flight_key, None)
+            flight_key = None
+            response = "I apologize, but I'm experiencing technical difficulties. Please try again."
+        finally:
+            self._land_flight(flight_key, response)
+        return response
+    
+    def generate_stream(self, prompt: str, max_tokens: int = 150, temperature: float = 0.7,
+                        system_message: Optional[str] = None, use_cache: bool = True,
+                        stop: Optional[SectionStop] = None) -> Iterator[str]:
+        """
+        Stream a response as text chunks while it is being decoded.
+        
+        Same arguments as generate_response; chunks come from a transformers
+        TextIteratorStreamer, so callers see text at time-to-first-token
+        instead of waiting for the whole answer. The first few characters
+        are held back until the answer passes generate_response's quality
+        check; a stream that fails it yields the same fallback message.
+        """
+        with self._stats_lock:
+            self.request_count += 1
+        
+        cache_key = self._response_cache_key(prompt, max_tokens, temperature, system_message, use_cache, stop)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        flight_key, flight = self._join_flight(prompt, max_tokens, temperature, system_message, use_cache, stop)
+        if flight is not None:
+            # Another caller is generating the same answer; send it whole once done
+            shared = flight.result()
+            if shared is not None:
+                yield shared
+                return
+        
+        response = None
+        future = None
+        try:
+            with self._track_in_flight():
+                inputs = self._prepare_inputs(prompt, system_message, max_tokens)
+                started_at = time.perf_counter()
+                timing = GenerationTiming()
+                streamer = TextIteratorStreamer(
+                    self.tokenizer,
+                    # The scheduler only emits new tokens; generate() echoes the prompt first
+                    skip_prompt=self.scheduler is None,
+                    skip_special_tokens=True,
+                )
+                future = self._start_generation(inputs, max_tokens, temperature, streamer, timing, stop)
+                
+                started = False
+                chunks = []
+                held = ""
+                for text in streamer:
+                    if not started:
+                        # Match generate_response, which strips leading whitespace
+                        text = text.lstrip()
+                        started = bool(text)
+                    if not text:
+                        continue
+                    chunks.append(text)
+                    if held is None:
+                        yield text
+                        continue
+                    held += text
+                    if len(held.rstrip()) >= 5:
+                        # Long enough to pass the quality check whatever follows
+                        yield held
+                        held = None
+                
+                new_tokens = future.result()
+                self._record_generation(len(new_tokens), time.perf_counter() - started_at, timing)
+                
+                response = "".join(chunks).strip()
+                if len(response) < 5:
+                    # Nothing useful came out, e.g. only whitespace or special tokens
+                    response = self.FALLBACK_RESPONSE
+                    yield response
+                elif cache_key is not None:
+                    self.response_cache.set(cache_key, response)
+        except Exception as e:
+            self.logger.error(f"Streaming generation failed: {e}")
+            # Followers must not inherit the failure; they generate on their own
+            self._land_flight(flight_key, None)
+            flight_key = None
+            yield "I apologize, but I'm experiencing technical difficulties. Please try again."
+        finally:
+            if future is not None and not future.done():
+                # Closed early: stop decoding tokens nobody will read
+                future.cancel()
+            # A stream closed early lands without a response; its followers generate their own
+            self._land_flight(flight_key, response)
+    
+    async def agenerate_response(self, prompt: str, max_tokens: int = 150, temperature: float = 0.7,
+                                 system_message: Optional[str] = None, use_cache: bool = True,
+                                 stop: Optional[SectionStop] = None) -> str:
+        """
+        Async generate_response.
+        
+        The request joins the shared inference queue and the coroutine awaits its
+        future, so concurrent callers neither hold a thread each nor
+        oversubscribe the model.
+        """
+        with self._stats_lock:
+            self.request_count += 1
+        
+        cache_key = self._response_cache_key(prompt, max_tokens, temperature, system_message, use_cache, stop)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        flight_key, flight = self._join_flight(prompt, max_tokens, temperature, system_message, use_cache, stop)
+        if flight is not None:
+            shared = await asyncio.wrap_future(flight)
+            if shared is not None:
+                return shared
+        
+        response = None
+        try:
+            with self._track_in_flight():
+                inputs = self._prepare_inputs(prompt, system_message, max_tokens)
+                started_at = time.perf_counter()
+                timing = GenerationTiming()
+                future = await self._submit_async(inputs, max_tokens, temperature, timing, stop)
+                new_tokens = await asyncio.wrap_future(future)
+                response = self._finish_response(new_tokens, cache_key, time.perf_counter() - started_at, timing)
+        except Exception as e:
+            self.logger.error(f"Async generation failed: {e}")
+            # Followers must not inherit the failure; they generate on their own
+            self._land_flight(flight_key, None)
+            flight_key = None
+            response = "I apologize, but I'm experiencing technical difficulties. Please try again."
+        finally:
+            self._land_flight(flight_key, response)
+        return response
+    
+    def _join_flight(self, prompt: str, max_tokens: int, temperature: float,
+                     system_message: Optional[str], use_cache: bool,
+                     stop: Optional[SectionStop] = None) -> Tuple[Optional[str], Optional[Future]]:
+        """
+        Single-flight coalescing for identical concurrent requests.
+        
+        Returns (key, None) when the caller leads and must pass its response
+        to _land_flight(key, ...), or (None, future) when it should wait for
+        the leader's response. A future resolving to None means the leader
+        failed or gave up and the follower generates on its own. Requests that
+        opt out of caching are never shared, since their answers should vary.
+        
+        Only callers of the same priority share a flight, and a caller never
+        waits on a leader whose deadline is earlier than its own: that leader
+        could be dropped while the follower still has time to be served.
+        """
+        if not self.coalesce_requests or not use_cache:
+            return None, None
+        context = current_request_context()
+        # Requests differing only in surrounding or repeated whitespace share an answer
+        key = self._request_key(" ".join(prompt.split()), max_tokens, temperature, system_message, stop)
+        key = f"{key}:{context.priority.name.lower()}"
+        with self._flight_lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                self._flights[key] = [Future(), 0, context.deadline]
+                return key, None
+            leader_deadline = flight[2]
+            if leader_deadline is not None and (context.deadline is None or context.deadline > leader_deadline):
+                return None, None
+            flight[1] += 1
+            if flight[1] == 1:
+                self.shared_generations += 1
+            self.coalesced_requests += 1
+            return None, flight[0]
+    
+    def _land_flight(self, key: Optional[str], response: Optional[str]):
+        """Hand a leader's response to every follower and close the flight"""
+        if key is None:
+            return
+        with self._flight_lock:
+            future = self._flights.pop(key)[0]
+        future.set_result(response)
+    
+    async def _submit_async(self, inputs, max_tokens: int, temperature: float,
+                            timing: Optional[GenerationTiming] = None,
+                            stop: Optional[SectionStop] = None) -> Future:
+        """Queue generation without blocking the event loop, waiting for room if the queue is full"""
+        deadline = time.monotonic() + self.ASYNC_QUEUE_TIMEOUT_SECONDS
+        delay = 0.005
+        while True:
+            try:
+                return self._try_submit(inputs, max_tokens, temperature, timing, stop)
+            except queue.Full:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError("Inference queue stayed full")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.25)
+    
+    def _try_submit(self, inputs, max_tokens: int, temperature: float,
+                    timing: Optional[GenerationTiming] = None,
+                    stop: Optional[SectionStop] = None) -> Future:
+        """Queue generation or raise queue.Full right away"""
+        timing = timing or GenerationTiming()
+        if self.scheduler is not None:
+            request = GenerationRequest(
+                input_ids=inputs.input_ids[0],
+                max_new_tokens=min(max_tokens, 400),
+                temperature=temperature,
+                timing=timing,
+                stopping=SectionStoppingCriteria(self.tokenizer, stop) if stop else None,
+            )
+            return self.scheduler.submit(request, block=False)
+        
+        with self._stats_lock:
+            if self._direct_pending >= self.MAX_DIRECT_ASYNC_PENDING:
+                raise queue.Full
+            self._direct_pending += 1
+            if self._direct_executor is None:
+                self._direct_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="studybuddy-llm")
+        
+        def run():
+            try:
+                return self._direct_generate(inputs, max_tokens, temperature, timing=timing, stop=stop)
+            finally:
+                with self._stats_lock:
+                    self._direct_pending -= 1
+        
+        # Carry the caller's priority, student and deadline to the worker thread
+        return self._direct_executor.submit(contextvars.copy_context().run, run)
     
     def _generate_qwen_response(self, prompt: str, max_tokens: int, temperature: float, 
-                               system_message: Optional[str] = None) -> str:
+                               system_message: Optional[str] = None,
+                               cache_key: Optional[str] = None,
+                               stop: Optional[SectionStop] = None) -> str:
         """Generate response using Qwen2.5-14B-Instruct"""
         
+        inputs = self._prepare_inputs(prompt, system_message, max_tokens)
+        started_at = time.perf_counter()
+        timing = GenerationTiming()
+        new_tokens = self._start_generation(inputs, max_tokens, temperature, timing=timing, stop=stop).result()
+        return self._finish_response(new_tokens, cache_key, time.perf_counter() - started_at, timing)
+    
+    def _finish_response(self, new_tokens, cache_key: Optional[str] = None,
+                         generation_seconds: float = 0.0,
+                         timing: Optional[GenerationTiming] = None) -> str:
+        """Decode generated tokens, record metrics and apply the quality check"""
+        with self.metrics.time("postprocess_seconds"):
+            response = self.tokenizer.decode(new_tokens, skip_special_tokens=True)
+            
+            # Clean up response
+            response = response.strip()
+            
+            # Quality validation
+            if len(response) < 5:
+                response = self.FALLBACK_RESPONSE
+            elif cache_key is not None:
+                self.response_cache.set(cache_key, response)
+        
+        # Update metrics
+        self._record_generation(len(new_tokens), generation_seconds, timing)
+        
+        return response
+    
+    def _record_generation(self, num_tokens: int, seconds: float,
+                           timing: Optional[GenerationTiming] = None):
+        with self._stats_lock:
+            self.total_tokens_generated += num_tokens
+            self.generation_seconds += seconds
+        self.metrics.observe("generation_seconds", seconds)
+        if timing is None or timing.started_at is None or timing.first_token_at is None:
+            return
+        
+        # Queue wait, then prefill up to the first token, then one step per remaining token
+        finished_at = timing.finished_at or time.perf_counter()
+        decode_seconds = finished_at - timing.first_token_at
+        self.metrics.observe("queue_wait_seconds", timing.started_at - timing.submitted_at)
+        self.metrics.observe("prefill_seconds", timing.first_token_at - timing.started_at)
+        self.metrics.observe("time_to_first_token_seconds", timing.first_token_at - timing.submitted_at)
+        self.metrics.observe("decode_seconds", decode_seconds)
+        if num_tokens > 1 and decode_seconds > 0:
+            self.metrics.observe("decode_tokens_per_second", (num_tokens - 1) / decode_seconds,
+                                 buckets=THROUGHPUT_BUCKETS)
+    
+    @contextmanager
+    def _track_in_flight(self, count: int = 1):
+        with self._stats_lock:
+            self.in_flight += count
+        try:
+            yield
+        finally:
+            with self._stats_lock:
+                self.in_flight -= count
+    
+    def generate_batch(self, prompts: List[str], max_tokens: int = 150, temperature: float = 0.7,
+                       system_message: Optional[str] = None, batch_size: int = 8,
+                       use_cache: bool = True) -> List[str]:
+        """
+        Generate responses for many prompts, e.g. offline pre-generation jobs.
+        
+        Prompts are sorted by token length and grouped into micro-batches of
+        `batch_size`, so each padded generate() call wastes little on padding.
+        Micro-batches run at background priority, one at a time, so
+        interactive requests get the model in between. Responses come back
+        in the order of `prompts`.
+        """
+        with self._stats_lock:
+            self.request_count += len(prompts)
+        
+        responses: List[Optional[str]] = [None] * len(prompts)
+        cache_keys = [
+            self._response_cache_key(prompt, max_tokens, temperature, system_message, use_cache)
+            for prompt in prompts
+        ]
+        
+        pending = []
+        for i, cache_key in enumerate(cache_keys):
+            if cache_key is not None:
+                responses[i] = self.response_cache.get(cache_key)
+            if responses[i] is None:
+                pending.append(i)
+        
+        # Length bucketing: neighbours in sorted order have similar lengths
+        encoded = {i: self._prepare_inputs(prompts[i], system_message, max_tokens).input_ids[0] for i in pending}
+        pending.sort(key=lambda i: len(encoded[i]))
+        
+        for start in range(0, len(pending), batch_size):
+            bucket = pending[start:start + batch_size]
+            started_at = time.perf_counter()
+            try:
+                with self._track_in_flight(len(bucket)):
+                    outputs = self._run_micro_batch([encoded[i] for i in bucket], max_tokens, temperature)
+            except Exception as e:
+                self.logger.error(f"Batch generation failed: {e}")
+                for i in bucket:
+                    responses[i] = "I apologize, but I'm experiencing technical difficulties. Please try again."
+                continue
+            
+            # Rows share the call's wall time, so tokens/second reflects batch throughput
+            row_seconds = (time.perf_counter() - started_at) / len(bucket)
+            for i, new_tokens in zip(bucket, outputs):
+                responses[i] = self._finish_response(new_tokens, cache_keys[i], row_seconds)
+        
+        return responses
+    
+    def _run_micro_batch(self, input_ids: List[torch.Tensor], max_tokens: int,
+                         temperature: float) -> List[torch.Tensor]:
+        """Generate one micro-batch at background priority through the scheduler or the priority gate"""
+        with request_context(priority=Priority.BACKGROUND):
+            if self.scheduler is not None:
+                # The scheduler already decodes concurrent requests together; a second
+                # padded generate() beside it would compete with interactive decoding
+                futures = [
+                    self.scheduler.submit(GenerationRequest(
+                        input_ids=ids, max_new_tokens=min(max_tokens, 400), temperature=temperature
+                    ))
+                    for ids in input_ids
+                ]
+                return [future.result() for future in futures]
+            
+            with self._direct_gate.slot():
+                return self._generate_micro_batch(input_ids, max_tokens, temperature)
+    
+    def _generate_micro_batch(self, input_ids: List[torch.Tensor], max_tokens: int,
+                              temperature: float) -> List[torch.Tensor]:
+        """Run one left-padded generate() over several prompts and return each one's new tokens"""
+        eos_token_id = self.tokenizer.eos_token_id
+        
+        max_length = max(len(ids) for ids in input_ids)
+        batch = torch.zeros((len(input_ids), max_length), dtype=torch.long)
+        attention_mask = torch.zeros((len(input_ids), max_length), dtype=torch.long)
+        for row, ids in enumerate(input_ids):
+            # Pad with the row's own first token: the mask hides it from attention,
+            # and the repetition penalty sees no token the prompt didn't already have
+            batch[row, :max_length - len(ids)] = ids[0]
+            batch[row, max_length - len(ids):] = ids
+            attention_mask[row, max_length - len(ids):] = 1
+        
+        with torch.inference_mode():
+            outputs = self.model.generate(
+                input_ids=batch.to(self.model.device),
+                attention_mask=attention_mask.to(self.model.device),
+                max_new_tokens=min(max_tokens, 400),
+                repetition_penalty=1.1,
+                pad_token_id=eos_token_id,
+                use_cache=True,
+                **self._sampling_kwargs(temperature)
+            )
+        
+        new_tokens = []
+        for row in outputs[:, max_length:]:
+            # Finished rows are padded with EOS up to the longest row
+            finished = (row == eos_token_id).nonzero()
+            new_tokens.append(row[:finished[0, 0] + 1] if len(finished) else row)
+        return new_tokens
+    
+    @staticmethod
+    def _sampling_kwargs(temperature: float) -> Dict[str, Any]:
+        """generate() sampling arguments; a temperature of 0 or less means greedy, as in the scheduler"""
+        if temperature <= 0:
+            return {"do_sample": False}
+        return {"do_sample": True, "temperature": temperature, "top_p": 0.9, "top_k": 50}
+    
+    def _response_cache_key(self, prompt: str, max_tokens: int, temperature: float,
+                            system_message: Optional[str], use_cache: bool,
+                            stop: Optional[SectionStop] = None) -> Optional[str]:
+        """Cache key for a call, or None when the response cache does not apply"""
+        if self.response_cache is None or not use_cache:
+            return None
+        return self._request_key(prompt, max_tokens, temperature, system_message, stop)
+    
+    def _request_key(self, prompt: str, max_tokens: int, temperature: float,
+                     system_message: Optional[str], stop: Optional[SectionStop] = None) -> str:
+        """Hash of everything that determines a response"""
+        # Only stopped calls carry the extra field, so existing keys stay valid
+        extra = {"stop": [stop.separator, stop.count]} if stop else {}
+        return ResponseCache.make_key(
+            self.model_name,
+            system_message or self.DEFAULT_SYSTEM_MESSAGE,
+            prompt,
+            # Everything that reaches the sampler
+            max_new_tokens=min(max_tokens, 400),
+            temperature=temperature,
+            top_p=0.9,
+            top_k=50,
+            repetition_penalty=1.1,
+            **extra
+        )
+    
+    def fit_prompt(self, sections: List[PromptSection], system_message: Optional[str] = None,
+                   max_tokens: int = 150) -> str:
+        """
+        Join prompt sections into a user prompt that fits the context window
+        next to the system message and the answer.
+        
+        Lower-priority sections (history, retrieved memory) are trimmed or
+        dropped first; required ones such as the question stay intact.
+        """
+        budget = self.context_budget.prompt_budget(
+            min(max_tokens, 400), system_message or self.DEFAULT_SYSTEM_MESSAGE
+        )
+        return render_sections(self.context_budget.fit(sections, budget))
+    
+    def _prepare_inputs(self, prompt: str, system_message: Optional[str] = None, max_tokens: int = 0):
+        """Apply the chat template and tokenize a prompt, fitting it and the answer into the context"""
         # Qwen uses standard chat format
-        default_system = "You are a helpful AI assistant for learning and productivity."
-        system_content = system_message if system_message else default_system
+        system_content = system_message if system_message else self.DEFAULT_SYSTEM_MESSAGE
+        
+        with self.metrics.time("tokenize_seconds"):
+            inputs = self._tokenize_prompt(prompt, system_content)
+            max_new_tokens = min(max_tokens, 400)
+            if inputs.input_ids.shape[1] + max_new_tokens > self.context_budget.max_context_tokens:
+                # Trim the system message before the prompt rather than cutting off its end
+                system_content, prompt = self.context_budget.fit_chat(system_content, prompt, max_new_tokens)
+                self.logger.warning(f"⚠️ Prompt of {inputs.input_ids.shape[1]} tokens trimmed to fit "
+                                    f"the {self.context_budget.max_context_tokens}-token context")
+                inputs = self._tokenize_prompt(prompt, system_content)
+            return inputs
+    
+    def _tokenize_prompt(self, prompt: str, system_content: str):
+        """Chat-template token ids for a prompt, as a BatchEncoding on the model's device"""
+        
+        if self.prompt_cache is not None:
+            # Reuse the tokenized template around this system message
+            input_ids = torch.tensor([self.prompt_cache.encode(system_content, prompt)])
+            return BatchEncoding({
+                "input_ids": input_ids,
+                "attention_mask": torch.ones_like(input_ids)
+            }).to(self.model.device)
         
         messages = [
             {"role": "system", "content": system_content},
@@ -152,52 +1524,207 @@ class ProductionLLMClient:
         )
         
         # Tokenize
-        inputs = self.tokenizer(
+        return self.tokenizer(
             formatted_prompt,
             return_tensors="pt",
+            # Hard limit only; _prepare_inputs already fitted the prompt
             truncation=True,
-            max_length=2048
+            max_length=self.context_budget.max_context_tokens
         ).to(self.model.device)
-        
-        # Generate with production-optimized parameters
-        with torch.inference_mode():
-            outputs = self.model.generate(
-                **inputs,
+    
+    def _start_generation(self, inputs, max_tokens: int, temperature: float,
+                          streamer: Optional[TextIteratorStreamer] = None,
+                          timing: Optional[GenerationTiming] = None,
+                          stop: Optional[SectionStop] = None) -> Future:
+        """
+        Start generating for tokenized inputs and return a future for the new token ids.
+        Tokens are also pushed to the streamer as they are produced, if one is given,
+        phase timestamps are recorded in `timing`, and `stop` can end generation early.
+        """
+        timing = timing or GenerationTiming()
+        if self.scheduler is not None:
+            # Join the shared decode batch
+            request = GenerationRequest(
+                input_ids=inputs.input_ids[0],
                 max_new_tokens=min(max_tokens, 400),
                 temperature=temperature,
-                do_sample=True,
-                top_p=0.9,
-                top_k=50,
-                repetition_penalty=1.1,
-                pad_token_id=self.tokenizer.eos_token_id,
-                use_cache=True
+                streamer=streamer,
+                timing=timing,
+                stopping=SectionStoppingCriteria(self.tokenizer, stop) if stop else None,
             )
+            return self.scheduler.submit(request)
         
-        # Decode only the new tokens
-        input_length = inputs.input_ids.shape[1]
-        new_tokens = outputs[0][input_length:]
-        response = self.tokenizer.decode(new_tokens, skip_special_tokens=True)
+        future: Future = Future()
+        if streamer is None:
+            future.set_result(self._direct_generate(inputs, max_tokens, temperature, timing=timing, stop=stop))
+            return future
         
-        # Clean up response
-        response = response.strip()
+        def run():
+            try:
+                new_tokens = self._direct_generate(inputs, max_tokens, temperature, streamer, timing, stop, future)
+            except Exception as e:
+                streamer.end()
+                new_tokens, error = None, e
+            else:
+                error = None
+            try:
+                if error is None:
+                    future.set_result(new_tokens)
+                else:
+                    future.set_exception(error)
+            except InvalidStateError:
+                # Cancelled by a stream closed early
+                pass
         
-        # Update metrics
-        self.total_tokens_generated += len(new_tokens)
+        threading.Thread(target=contextvars.copy_context().run, args=(run,),
+                         name="studybuddy-stream", daemon=True).start()
+        return future
+    
+    def _direct_generate(self, inputs, max_tokens: int, temperature: float,
+                         streamer: Optional[TextIteratorStreamer] = None,
+                         timing: Optional[GenerationTiming] = None,
+                         stop: Optional[SectionStop] = None,
+                         future: Optional[Future] = None):
+        """Run model.generate for a single prompt once the priority gate lets it in"""
+        with self._direct_gate.slot():
+            return self._generate_unbatched(inputs, max_tokens, temperature, streamer, timing, stop, future)
+    
+    def _generate_unbatched(self, inputs, max_tokens: int, temperature: float,
+                            streamer: Optional[TextIteratorStreamer] = None,
+                            timing: Optional[GenerationTiming] = None,
+                            stop: Optional[SectionStop] = None,
+                            future: Optional[Future] = None):
+        """Run model.generate for a single prompt and return only the new tokens; cancelling `future` ends it early"""
+        timing = timing or GenerationTiming()
+        timing.started_at = time.perf_counter()
         
-        # Quality validation
-        if len(response) < 5:
-            return "I'd be happy to help you with that! Could you provide more specific details?"
+        # Generate with production-optimized parameters
+        with torch.inference_mode():
+            stopping_criteria = StoppingCriteriaList([_FirstTokenTimer(timing)])
+            if future is not None:
+                stopping_criteria.append(_CancelledStop(future))
+            if stop is not None:
+                stopping_criteria.append(
+                    SectionStoppingCriteria(self.tokenizer, stop, prompt_length=inputs.input_ids.shape[1])
+                )
+            extra_kwargs = {"stopping_criteria": stopping_criteria}
+            assisted = self._use_draft(temperature)
+            # Assisted generation crops and rebuilds the cache itself, so it
+            # cannot start from a prefilled one
+            if self.prefix_cache is not None and not assisted:
+                # Prefill once (reusing any cached prefix) and hand all but the
+                # last prompt token to generate() as an already-computed cache
+                prefill = _prefill(self.model, inputs.input_ids, self.prefix_cache)
+                extra_kwargs["past_key_values"] = _build_cache([
+                    (k[:, :, :-1, :], v[:, :, :-1, :])
+                    for k, v in _cache_layers(prefill.past_key_values)
+                ])
+            if streamer is not None:
+                extra_kwargs["streamer"] = streamer
+            
+            if assisted:
+                # The draft proposes a few tokens, the model verifies them in one pass
+                extra_kwargs["assistant_model"] = self.draft_model
+                if self.draft_model.config.vocab_size != self.model.config.vocab_size:
+                    # Output layers padded to different widths: generate() only
+                    # accepts the draft once told both sides share the tokenizer
+                    extra_kwargs["tokenizer"] = self.tokenizer
+                    extra_kwargs["assistant_tokenizer"] = self.tokenizer
+                self._assist_counts.value = {"target_steps": 0, "drafted_tokens": 0}
+            try:
+                outputs = self.model.generate(
+                    **inputs,
+                    **extra_kwargs,
+                    **self._sampling_kwargs(temperature),
+                    max_new_tokens=min(max_tokens, 400),
+                    repetition_penalty=1.1,
+                    pad_token_id=self.tokenizer.eos_token_id,
+                    use_cache=True
+                )
+            finally:
+                counts = getattr(self._assist_counts, "value", None)
+                self._assist_counts.value = None
+                timing.finished_at = time.perf_counter()
         
-        return response
+        # Keep only the new tokens
+        input_length = inputs.input_ids.shape[1]
+        new_tokens = outputs[0][input_length:]
+        if assisted:
+            self._record_assisted(len(new_tokens), counts)
+        return new_tokens
+    
+    def _record_assisted(self, num_tokens: int, counts: Dict[str, int]):
+        with self._stats_lock:
+            self.assisted_requests += 1
+            self.assisted_tokens += num_tokens
+            self.target_steps += counts["target_steps"]
+            self.drafted_tokens += counts["drafted_tokens"]
+    
+    def _speculative_stats(self) -> Dict[str, Any]:
+        """Draft acceptance metrics for assisted generation"""
+        with self._stats_lock:
+            # Each verification pass keeps the accepted draft tokens plus one of its own
+            accepted = max(self.assisted_tokens - self.target_steps, 0)
+            return {
+                "draft_model": self.draft_model_name,
+                "assisted_requests": self.assisted_requests,
+                "drafted_tokens": self.drafted_tokens,
+                "accepted_tokens": accepted,
+                "acceptance_rate": round(accepted / max(self.drafted_tokens, 1), 3),
+                "tokens_per_target_step": round(self.assisted_tokens / max(self.target_steps, 1), 2)
+            }
     
     def get_stats(self) -> Dict[str, Any]:
         """Get production metrics for monitoring"""
-        return {
+        stats = {
             "model": self.model_name,
             "requests_processed": self.request_count,
             "total_tokens_generated": self.total_tokens_generated,
-            "average_tokens_per_request": self.total_tokens_generated / max(self.request_count, 1)
+            "average_tokens_per_request": self.total_tokens_generated / max(self.request_count, 1),
+            "in_flight_requests": self.in_flight,
+            "latency": self.metrics.to_dict(),
+            "load_timings": dict(self.load_timings),
+            "backend": {
+                "name": self.backend,
+                "device": self.device,
+                "tokens_per_second": round(self.total_tokens_generated / self.generation_seconds, 2)
+                if self.generation_seconds else 0.0,
+                "resident_memory_mb": resident_memory_mb()
+            }
         }
+        if self.scheduler is not None:
+            stats["batching"] = self.scheduler.get_stats()
+        else:
+            stats["scheduling"] = self._direct_gate.get_stats()
+        if self.prefix_cache is not None:
+            stats["prefix_cache"] = self.prefix_cache.get_stats()
+        if self.prompt_cache is not None:
+            stats["prompt_cache"] = self.prompt_cache.get_stats()
+        stats["context"] = self.context_budget.get_stats()
+        if self.response_cache is not None:
+            stats["response_cache"] = self.response_cache.get_stats()
+        if self.draft_model is not None:
+            stats["speculative"] = self._speculative_stats()
+        if self.coalesce_requests:
+            with self._flight_lock:
+                stats["coalescing"] = {
+                    "coalesced_requests": self.coalesced_requests,
+                    "shared_generations": self.shared_generations,
+                    "in_flight_prompts": len(self._flights),
+                }
+        return stats
+    
+    def close(self):
+        """Release background workers and cache handles owned by this client"""
+        if self.scheduler is not None:
+            self.scheduler.shutdown()
+        if self._direct_executor is not None:
+            self._direct_executor.shutdown(wait=False)
+        if self.response_cache is not None:
+            self.response_cache.close()
+        for hook in self._assist_hooks:
+            hook.remove()
+        self._assist_hooks = []
 
 
 class QwenLangChainLLM(LLM):
@@ -208,9 +1735,12 @@ class QwenLangChainLLM(LLM):
     Extracted from Notebook 3 for reusability.
     """
     
+    # Declared as fields; LangChain LLMs are pydantic models and reject unknown attributes
+    client: Any = None
+    logger: Any = None
+    
     def __init__(self, production_llm_client: ProductionLLMClient):
-        super().__init__()
-        self.client = production_llm_client
+        super().__init__(client=production_llm_client)
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         
     @property
@@ -251,6 +1781,60 @@ class QwenLangChainLLM(LLM):
             self.logger.error(f"LLM call failed: {e}")
             return "I apologize, but I'm experiencing technical difficulties. Please try again."
     
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any,
+    ) -> str:
+        """Async LLM call that awaits the shared inference queue instead of using a thread"""
+        return await self.client.agenerate_response(
+            prompt=prompt,
+            max_tokens=kwargs.get('max_tokens', 200),
+            temperature=kwargs.get('temperature', 0.7)
+        )
+    
+    async def _agenerate(
+        self,
+        prompts: List[str],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        """Submit all prompts at once; the batching scheduler decodes them together"""
+        responses = await asyncio.gather(*[
+            self.client.agenerate_response(
+                prompt=prompt,
+                max_tokens=kwargs.get('max_tokens', 200),
+                temperature=kwargs.get('temperature', 0.7)
+            )
+            for prompt in prompts
+        ])
+        return LLMResult(generations=[[Generation(text=response)] for response in responses])
+    
+    def _generate(
+        self,
+        prompts: List[str],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        """
+        Generate for a list of prompts in padded micro-batches instead of one
+        _call per prompt.
+        """
+        max_tokens = kwargs.get('max_tokens', 200)
+        temperature = kwargs.get('temperature', 0.7)
+        
+        responses = self.client.generate_batch(
+            prompts,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            batch_size=kwargs.get('batch_size', 8)
+        )
+        return LLMResult(generations=[[Generation(text=response)] for response in responses])
+    
     @property
     def _identifying_params(self) -> Mapping[str, Any]:
         """Get the identifying parameters."""
@@ -260,42 +1844,51 @@ class QwenLangChainLLM(LLM):
         }
 
 
-def ensure_production_llm() -> ProductionLLMClient:
+def ensure_production_llm(name: str = "default") -> ProductionLLMClient:
     """
     Production pattern: Lazy initialization with caching.
     
-    This function ensures a production LLM client is available,
-    either by reusing an existing one or creating a fresh instance.
+    Returns the shared client for a model slot from the process-wide
+    ModelRegistry, which loads it once even under concurrent callers.
+    No reference is taken, so model_registry.unload(name) can still free
+    it; long-lived owners such as the API acquire() and release() instead.
     
-    This is exactly what we need for cross-notebook compatibility!
+    In a notebook that already has `llm`, `model` and `tokenizer` defined,
+    the default slot wraps those instead of loading a second copy.
     """
-    global _cached_llm_client
-    
-    # Check if we already have a cached client
-    if '_cached_llm_client' in globals() and _cached_llm_client is not None:
-        logger.info("✅ Using cached LLM client")
-        return _cached_llm_client
+    from .model_registry import model_registry
     
-    # Check if we can reuse components from notebook environment
-    try:
-        # Try to access notebook-level variables
+    if model_registry.resolve(name) == model_registry.DEFAULT_MODEL and not model_registry.is_loaded(name):
+        # Check if we can reuse components from notebook environment
         import __main__
         if hasattr(__main__, 'llm') and hasattr(__main__, 'model') and hasattr(__main__, 'tokenizer'):
             logger.info("✅ Reusing LLM components from notebook environment")
-            _cached_llm_client = ProductionLLMClient(
-                model=__main__.model,
-                tokenizer=__main__.tokenizer,
-                model_name=getattr(__main__, 'model_name', 'qwen2.5-14b-instruct')
-            )
-            return _cached_llm_client
-    except:
-        pass  # Notebook components not available
+            try:
+                model_registry.register(name, lambda: ProductionLLMClient(
+                    model=__main__.model,
+                    tokenizer=__main__.tokenizer,
+                    model_name=getattr(__main__, 'model_name', 'qwen2.5-14b-instruct')
+                ))
+            except ValueError:
+                pass  # Another caller loaded the slot first
     
-    # Create fresh instance
-    logger.info("🔄 Creating fresh LLM client")
-    _cached_llm_client = ProductionLLMClient()
-    return _cached_llm_client
+    return model_registry.get(name)
 
 
-# Global cache
-_cached_llm_client = None
+def load_model_config(config_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Load model_config.yaml (model name, device and CPU backend settings).
+    
+    The path defaults to $STUDYBUDDY_MODEL_CONFIG, then config/model_config.yaml
+    in the project; a missing file gives an empty config and built-in defaults.
+    """
+    config_path = config_path or os.environ.get("STUDYBUDDY_MODEL_CONFIG") or os.path.join(
+        os.path.dirname(__file__), '..', '..', '..', 'config', 'model_config.yaml'
+    )
+    try:
+        with open(config_path, 'r') as f:
+            return yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        logger.warning(f"Model config not found at {config_path}, using defaults")
+        return {}
+
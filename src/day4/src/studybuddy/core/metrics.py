@@ -0,0 +1,151 @@
+"""
+Latency metrics for the StudyBuddy LLM client and API
+Histograms with percentiles for /stats and Prometheus text for /metrics
+"""
+
+import math
+import time
+import bisect
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Optional, Sequence, Tuple
+
+# Bucket upper bounds in seconds, from tokenization up to a long generation
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+# Bucket upper bounds for decode throughput in tokens per second
+THROUGHPUT_BUCKETS = (1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0, 200.0, 500.0, 1000.0)
+
+
+class Histogram:
+    """
+    Cumulative bucket counts, as Prometheus expects, plus a window of the
+    most recent samples for exact p50/p95/p99.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS, window: int = 2048):
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self._recent: deque = deque(maxlen=window)
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            self.bucket_counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self._recent.append(value)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Nearest-rank percentile (0-100) of the recent window, or None without samples"""
+        if not self._recent:
+            return None
+        ordered = sorted(self._recent)
+        rank = max(math.ceil(q / 100 * len(ordered)) - 1, 0)
+        return ordered[min(rank, len(ordered) - 1)]
+
+    def to_dict(self) -> Dict[str, Any]:
+        def rounded(value):
+            return round(value, 4) if value is not None else None
+
+        return {
+            "count": self.count,
+            "mean": rounded(self.sum / self.count) if self.count else None,
+            "p50": rounded(self.percentile(50)),
+            "p95": rounded(self.percentile(95)),
+            "p99": rounded(self.percentile(99)),
+        }
+
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class LatencyMetrics:
+    """
+    Thread-safe set of labelled histograms.
+
+    `observe("decode_seconds", 1.2)` or `observe("request_seconds", 0.3,
+    agent_type="tutor")` creates histograms on first use. Names are
+    exported with `namespace` as a prefix in Prometheus text.
+    """
+
+    def __init__(self, namespace: str = "studybuddy"):
+        self.namespace = namespace
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._buckets: Dict[str, Sequence[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float, buckets: Optional[Sequence[float]] = None, **labels: str):
+        key = tuple(sorted((label, str(label_value)) for label, label_value in labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                bucket_bounds = self._buckets.setdefault(name, buckets or DEFAULT_LATENCY_BUCKETS)
+                histogram = series[key] = Histogram(bucket_bounds)
+            histogram.observe(value)
+
+    @contextmanager
+    def time(self, name: str, **labels: str) -> Iterator[None]:
+        """Observe the duration of a block in seconds, even if it raises"""
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started_at, **labels)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Percentiles per histogram for JSON; labelled series are keyed like
+        "agent_type=tutor", unlabelled ones are returned directly.
+        """
+        with self._lock:
+            result = {}
+            for name, series in self._histograms.items():
+                if list(series) == [()]:
+                    result[name] = series[()].to_dict()
+                else:
+                    result[name] = {
+                        ",".join(f"{label}={value}" for label, value in key): histogram.to_dict()
+                        for key, histogram in series.items()
+                    }
+            return result
+
+    def to_prometheus(self) -> str:
+        """Histograms in the Prometheus text exposition format"""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in self._histograms.items():
+                metric = f"{self.namespace}_{name}"
+                lines.append(f"# TYPE {metric} histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, bucket_count in zip(histogram.buckets, histogram.bucket_counts):
+                        cumulative += bucket_count
+                        lines.append(f"{metric}_bucket{_format_labels(key + (('le', repr(bound)),))} {cumulative}")
+                    lines.append(f"{metric}_bucket{_format_labels(key + (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{metric}_sum{_format_labels(key)} {histogram.sum}")
+                    lines.append(f"{metric}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + ("\n" if lines else "")
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{label}="{_escape_label(value)}"' for label, value in key) + "}"
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_sample(name: str, value: float, metric_type: str = "gauge", help_text: str = "") -> str:
+    """One gauge or counter in Prometheus text format"""
+    lines = []
+    if help_text:
+        lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {metric_type}")
+    lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
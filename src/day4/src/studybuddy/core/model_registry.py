@@ -0,0 +1,221 @@
+"""
+Model registry for the StudyBuddy LLM clients
+Loads named model slots on demand and shares them across the process
+"""
+
+import gc
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Iterator, List, Optional
+
+import torch
+
+from .llm_client import ProductionLLMClient, load_model_config
+
+logger = logging.getLogger(__name__)
+
+
+def _merge_config(base: Dict[str, Any], overrides: Dict[str, Any]) -> Dict[str, Any]:
+    """Recursively overlay one config mapping on another"""
+    merged = dict(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge_config(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+class ModelRegistry:
+    """
+    Thread-safe registry of named LLM clients, e.g. a large tutor model and
+    a small model for cheap tool prompts.
+
+    Slots come from the `models` section of model_config.yaml. Each slot is
+    either a mapping of overrides for the top-level model/cpu/draft/startup
+    sections or the name of another slot it aliases. A slot's client is
+    loaded on its first acquire(), exactly once even under concurrent
+    callers, and counts references until release(). unload() closes a
+    client nobody holds so its memory can be reclaimed.
+    """
+
+    DEFAULT_MODEL = "default"
+
+    def __init__(self, model_config: Optional[Dict[str, Any]] = None):
+        self._model_config = model_config
+        self._slots: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def model_config(self) -> Dict[str, Any]:
+        if self._model_config is None:
+            self._model_config = load_model_config()
+        return self._model_config
+
+    def _slot_definitions(self) -> Dict[str, Any]:
+        models = dict(self.model_config.get("models") or {})
+        models.setdefault(self.DEFAULT_MODEL, {})
+        return models
+
+    def slot_names(self) -> List[str]:
+        """Every configured slot, including aliases"""
+        return list(self._slot_definitions())
+
+    def resolve(self, name: str) -> str:
+        """Follow aliases to the slot that actually holds a model"""
+        models = self._slot_definitions()
+        seen = []
+        while isinstance(models.get(name), str):
+            if name in seen:
+                raise ValueError(f"Model slot alias loop: {' -> '.join(seen + [name])}")
+            seen.append(name)
+            name = models[name]
+        if name not in models:
+            raise KeyError(f"Unknown model slot: {name}")
+        return name
+
+    def slot_config(self, name: str) -> Dict[str, Any]:
+        """Model config for a slot: the top-level sections with its overrides applied"""
+        name = self.resolve(name)
+        base = {key: value for key, value in self.model_config.items() if key != "models"}
+        return _merge_config(base, self._slot_definitions()[name] or {})
+
+    def _slot(self, name: str) -> Dict[str, Any]:
+        with self._lock:
+            return self._slots.setdefault(name, {
+                "client": None,
+                "loader": None,
+                "references": 0,
+                "load_seconds": None,
+                "lock": threading.Lock(),
+            })
+
+    def register(self, name: str, loader: Callable[[], ProductionLLMClient]):
+        """Use a custom loader for a slot, e.g. to wrap a model that is already in memory"""
+        slot = self._slot(self.resolve(name))
+        with slot["lock"]:
+            if slot["client"] is not None:
+                raise ValueError(f"Model slot {name!r} is already loaded")
+            slot["loader"] = loader
+
+    def acquire(self, name: str = DEFAULT_MODEL) -> ProductionLLMClient:
+        """Return the slot's client, loading it if needed; pair with release()"""
+        return self._get(name, reference=True)
+
+    def get(self, name: str = DEFAULT_MODEL) -> ProductionLLMClient:
+        """
+        Return the slot's client, loading it if needed, without holding a
+        reference. unload() may close it at any time; use acquire() to keep it.
+        """
+        return self._get(name, reference=False)
+
+    def _get(self, name: str, reference: bool) -> ProductionLLMClient:
+        resolved = self.resolve(name)
+        slot = self._slot(resolved)
+        # Loading happens under the slot's own lock, so concurrent first
+        # callers wait for one load and other slots stay available
+        with slot["lock"]:
+            if slot["client"] is None:
+                started_at = time.perf_counter()
+                slot["client"] = slot["loader"]() if slot["loader"] else self._load(resolved)
+                slot["load_seconds"] = round(time.perf_counter() - started_at, 3)
+                logger.info(f"📦 Model slot '{resolved}' loaded in {slot['load_seconds']}s")
+            if reference:
+                slot["references"] += 1
+            return slot["client"]
+
+    def release(self, name: str = DEFAULT_MODEL):
+        """Drop a reference taken by acquire()"""
+        slot = self._slot(self.resolve(name))
+        with slot["lock"]:
+            if slot["references"] <= 0:
+                raise ValueError(f"Model slot {name!r} released more often than acquired")
+            slot["references"] -= 1
+
+    @contextmanager
+    def lease(self, name: str = DEFAULT_MODEL) -> Iterator[ProductionLLMClient]:
+        client = self.acquire(name)
+        try:
+            yield client
+        finally:
+            self.release(name)
+
+    def _load(self, name: str) -> ProductionLLMClient:
+        """Create a client from the slot's config and warm it up"""
+        model_config = self.slot_config(name)
+        logger.info(f"🔄 Loading model slot '{name}'")
+        client = ProductionLLMClient(model_config=model_config)
+
+        startup = model_config.get("startup") or {}
+        if startup.get("warmup", True):
+            try:
+                client.warm_up(
+                    prompt=startup.get("warmup_prompt", "Hello!"),
+                    max_tokens=startup.get("warmup_max_tokens", 8)
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Warm-up generation failed: {e}")
+        return client
+
+    def is_loaded(self, name: str = DEFAULT_MODEL) -> bool:
+        slot = self._slot(self.resolve(name))
+        with slot["lock"]:
+            return slot["client"] is not None
+
+    def unload(self, name: str, force: bool = False) -> bool:
+        """
+        Close a slot's client so its memory can be freed.
+
+        Refuses while references are held unless `force` is set. Returns
+        whether anything was unloaded. Memory is only reclaimed once callers
+        that kept the client object drop it too.
+        """
+        resolved = self.resolve(name)
+        slot = self._slot(resolved)
+        with slot["lock"]:
+            client = slot["client"]
+            if client is None:
+                return False
+            if slot["references"] and not force:
+                raise RuntimeError(f"Model slot {resolved!r} still has {slot['references']} references")
+            slot["client"] = None
+            slot["references"] = 0
+
+        client.close()
+        del client
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        logger.info(f"🗑️ Model slot '{resolved}' unloaded")
+        return True
+
+    def unload_all(self):
+        """Unload every slot regardless of references, e.g. on shutdown"""
+        with self._lock:
+            names = list(self._slots)
+        for name in names:
+            self.unload(name, force=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Load state and references per slot for monitoring"""
+        stats = {}
+        for name, definition in self._slot_definitions().items():
+            if isinstance(definition, str):
+                stats[name] = {"alias_of": definition}
+                continue
+            slot = self._slot(name)
+            with slot["lock"]:
+                client = slot["client"]
+                stats[name] = {
+                    "loaded": client is not None,
+                    "model": client.model_name if client is not None else None,
+                    "references": slot["references"],
+                    "load_seconds": slot["load_seconds"],
+                }
+        return stats
+
+
+# Process-wide registry shared by the API, agents and notebooks
+model_registry = ModelRegistry()
@@ -0,0 +1,272 @@
+"""
+Request scheduling for the StudyBuddy LLM client
+Orders queued generations by priority class, shares capacity fairly between
+students and drops work whose caller has already given up
+"""
+
+import time
+import queue
+import threading
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from enum import IntEnum
+from typing import Dict, Any, Callable, Iterator, List, Optional
+
+DEFAULT_STUDENT_ID = "default_student"
+
+
+class Priority(IntEnum):
+    """Scheduling classes; lower values are served first"""
+    INTERACTIVE = 0  # chat turns a student is waiting on
+    TOOL = 1         # short tool prompts, e.g. LLM search fallbacks and exercises
+    BACKGROUND = 2   # long generations such as study plans
+
+
+class RequestExpiredError(TimeoutError):
+    """Raised for a generation dropped because its deadline passed"""
+    pass
+
+
+@dataclass(frozen=True)
+class RequestContext:
+    """
+    Who a generation is for and how urgent it is.
+
+    `deadline` is a time.monotonic() timestamp after which nobody is waiting
+    for the answer any more, e.g. because the API request timed out.
+    """
+    priority: Priority = Priority.INTERACTIVE
+    student_id: str = DEFAULT_STUDENT_ID
+    deadline: Optional[float] = None
+    created_at: float = field(default_factory=time.monotonic, compare=False)
+
+    def expired(self, now: Optional[float] = None) -> bool:
+        return self.deadline is not None and (now or time.monotonic()) >= self.deadline
+
+
+_current_context: contextvars.ContextVar = contextvars.ContextVar(
+    "studybuddy_request_context", default=RequestContext()
+)
+
+
+def current_request_context() -> RequestContext:
+    """Context of the generation being requested on this thread or task"""
+    return _current_context.get()
+
+
+@contextmanager
+def request_context(priority: Optional[Priority] = None, student_id: Optional[str] = None,
+                    timeout: Optional[float] = None, deadline: Optional[float] = None) -> Iterator[RequestContext]:
+    """
+    Tag the generations started inside the block.
+
+    Unset fields are inherited from the enclosing context, so a tool can
+    lower the priority of its prompts while keeping the student and deadline
+    of the chat turn it runs in. Nested deadlines only ever get tighter.
+    """
+    outer = _current_context.get()
+    if timeout is not None:
+        deadline = min(deadline or float("inf"), time.monotonic() + timeout)
+    if outer.deadline is not None:
+        deadline = min(deadline or float("inf"), outer.deadline)
+    context = replace(
+        outer,
+        priority=outer.priority if priority is None else priority,
+        student_id=student_id or outer.student_id,
+        deadline=deadline,
+        created_at=time.monotonic(),
+    )
+    token = _current_context.set(context)
+    try:
+        yield context
+    finally:
+        _current_context.reset(token)
+
+
+class FairRequestQueue:
+    """
+    Bounded, thread-safe queue of items carrying a `context` RequestContext.
+
+    Items leave strictly by priority class. Within a class, students are
+    served round-robin, so one student's burst of requests cannot hold back
+    everyone else. Items whose deadline has passed are never returned; they
+    are handed to `on_expired` instead.
+    """
+
+    def __init__(self, max_size: int = 256, on_expired: Optional[Callable[[Any], None]] = None):
+        self.max_size = max_size
+        self.on_expired = on_expired
+        # priority -> student id -> that student's waiting items, in service order
+        self._classes: Dict[Priority, "OrderedDict[str, deque]"] = {priority: OrderedDict() for priority in Priority}
+        self._size = 0
+        self._condition = threading.Condition()
+
+        # Queue metrics
+        self.expired = 0
+        self.dequeued = {priority.name.lower(): 0 for priority in Priority}
+
+    def put(self, item, block: bool = True, timeout: Optional[float] = None):
+        """Queue an item; raises queue.Full if there is no room (right away with block=False)"""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._size < self.max_size, timeout if block else 0):
+                raise queue.Full
+            students = self._classes[item.context.priority]
+            students.setdefault(item.context.student_id, deque()).append(item)
+            self._size += 1
+            self._condition.notify_all()
+
+    def get(self, block: bool = True, timeout: Optional[float] = None,
+            max_priority: Priority = Priority.BACKGROUND):
+        """
+        Next item of at most `max_priority`; raises queue.Empty if none
+        arrives in time (right away with block=False).
+        """
+        expired: List[Any] = []
+        try:
+            with self._condition:
+                give_up_at = None if timeout is None else time.monotonic() + timeout
+                while True:
+                    item = self._pop(max_priority, expired)
+                    if item is not None:
+                        self._condition.notify_all()
+                        return item
+                    remaining = None if give_up_at is None else give_up_at - time.monotonic()
+                    if not block or (remaining is not None and remaining <= 0):
+                        raise queue.Empty
+                    self._condition.wait(remaining)
+        finally:
+            # Outside the lock: the callback may resolve futures and wake their callers
+            for item in expired:
+                if self.on_expired is not None:
+                    self.on_expired(item)
+
+    def get_nowait(self, max_priority: Priority = Priority.BACKGROUND):
+        return self.get(block=False, max_priority=max_priority)
+
+    def _pop(self, max_priority: Priority, expired: List[Any]):
+        now = time.monotonic()
+        for priority in Priority:
+            if priority > max_priority:
+                break
+            students = self._classes[priority]
+            while students:
+                student_id, items = next(iter(students.items()))
+                item = items.popleft()
+                self._size -= 1
+                if items:
+                    # Back of the line for this student's next request
+                    students.move_to_end(student_id)
+                else:
+                    del students[student_id]
+                if item.context.expired(now):
+                    self.expired += 1
+                    expired.append(item)
+                    continue
+                self.dequeued[priority.name.lower()] += 1
+                return item
+        return None
+
+    def drain(self) -> List[Any]:
+        """Remove and return everything still queued"""
+        with self._condition:
+            items = [item for students in self._classes.values() for waiting in students.values() for item in waiting]
+            for students in self._classes.values():
+                students.clear()
+            self._size = 0
+            self._condition.notify_all()
+            return items
+
+    def qsize(self) -> int:
+        return self._size
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth per class and totals for monitoring"""
+        with self._condition:
+            queued = {
+                priority.name.lower(): sum(len(items) for items in self._classes[priority].values())
+                for priority in Priority
+            }
+            return {
+                "queued": queued,
+                "dequeued": dict(self.dequeued),
+                "expired": self.expired,
+            }
+
+
+@dataclass
+class _Ticket:
+    """A caller waiting for a PriorityGate slot"""
+    context: RequestContext
+    admitted: threading.Event = field(default_factory=threading.Event)
+    expired: bool = False
+
+
+class PriorityGate:
+    """
+    Semaphore that admits waiters in FairRequestQueue order instead of
+    first come, first served. Used in front of the unbatched model, where
+    only `capacity` generations run at once.
+    """
+
+    def __init__(self, capacity: int = 1, max_waiting: int = 256):
+        self.capacity = capacity
+        self._holders = 0
+        self._lock = threading.Lock()
+        self._waiting = FairRequestQueue(max_size=max_waiting, on_expired=self._expire)
+        # Callers already past their deadline when a slot was free
+        self.expired_on_admission = 0
+
+    @staticmethod
+    def _expire(ticket: _Ticket):
+        ticket.expired = True
+        ticket.admitted.set()
+
+    @contextmanager
+    def slot(self, context: Optional[RequestContext] = None) -> Iterator[None]:
+        """
+        Hold one slot for the block. Raises RequestExpiredError if the
+        deadline passed before the caller got a slot, even one that was
+        free right away, or queue.Full when too many callers are already
+        waiting.
+        """
+        context = context or current_request_context()
+        ticket = None
+        with self._lock:
+            if self._holders < self.capacity and not self._waiting.qsize():
+                self._holders += 1
+            else:
+                ticket = _Ticket(context)
+                self._waiting.put(ticket, block=False)
+        if ticket is not None:
+            ticket.admitted.wait()
+            if ticket.expired:
+                raise RequestExpiredError("Deadline passed while waiting for the model")
+        if context.expired():
+            # Nobody is waiting for the answer; hand the slot on without generating
+            with self._lock:
+                self.expired_on_admission += 1
+            self._release()
+            raise RequestExpiredError("Deadline passed before generation started")
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self):
+        with self._lock:
+            try:
+                ticket = self._waiting.get_nowait()
+            except queue.Empty:
+                self._holders -= 1
+                return
+        # The slot passes straight to the next waiter
+        ticket.admitted.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self._waiting.get_stats()
+        stats["expired"] += self.expired_on_admission
+        stats["capacity"] = self.capacity
+        stats["running"] = self._holders
+        return stats
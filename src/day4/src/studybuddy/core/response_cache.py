@@ -0,0 +1,156 @@
+"""
+Response cache for the StudyBuddy LLM client
+Serves byte-identical prompts from memory or disk instead of regenerating them
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Two-tier cache of generated responses.
+
+    Entries are keyed on the model, system message, prompt and sampling
+    parameters. Recent entries live in an in-memory LRU; every entry is also
+    written to an optional sqlite file so the cache survives restarts.
+    Entries expire after `ttl_seconds`.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600,
+                 disk_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = disk_path
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+        if disk_path:
+            os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+        # Cache metrics
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.stores = 0
+
+    @staticmethod
+    def make_key(model: str, system_message: str, prompt: str, **sampling_params) -> str:
+        """Stable hash of everything that determines a response"""
+        payload = json.dumps(
+            [model, system_message, prompt, sorted(sampling_params.items())],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return a cached response, or None if missing or expired"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry["expires_at"] > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry["response"]
+                del self._memory[key]
+                self.expirations += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT response, expires_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    response, expires_at = row
+                    if expires_at > now:
+                        self._remember(key, response, expires_at)
+                        self.disk_hits += 1
+                        return response
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+                    self.expirations += 1
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, response: str, ttl_seconds: Optional[float] = None):
+        """Store a response in both tiers"""
+        expires_at = time.time() + (ttl_seconds if ttl_seconds is not None else self.ttl_seconds)
+        with self._lock:
+            self._remember(key, response, expires_at)
+            self.stores += 1
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO responses (key, response, expires_at) VALUES (?, ?, ?)",
+                        (key, response, expires_at)
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Failed to persist cached response: {e}")
+
+    def _remember(self, key: str, response: str, expires_at: float):
+        self._memory[key] = {"response": response, "expires_at": expires_at}
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def purge_expired(self) -> int:
+        """Drop expired entries from both tiers and return how many were removed"""
+        now = time.time()
+        with self._lock:
+            expired = [key for key, entry in self._memory.items() if entry["expires_at"] <= now]
+            for key in expired:
+                del self._memory[key]
+            removed = len(expired)
+            if self._db is not None:
+                # Every memory entry is also on disk, so the disk count covers both tiers
+                cursor = self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+                self._db.commit()
+                removed = cursor.rowcount
+            self.expirations += removed
+            return removed
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for monitoring"""
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "memory_entries": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / max(hits + self.misses, 1), 3),
+            "stores": self.stores,
+            "expirations": self.expirations,
+            "disk_enabled": self._db is not None
+        }
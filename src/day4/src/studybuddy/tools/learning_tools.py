@@ -8,9 +8,14 @@ import requests
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 import logging
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 import re
 
+from ..core.llm_client import SectionStop
+from ..core.request_scheduler import Priority, request_context
+from .search_index import SearchIndex, search_index as shared_search_index
+from .search_cache import CircuitBreaker, SearchResultCache, search_result_cache, web_search_breaker
+
 logger = logging.getLogger(__name__)
 
 
@@ -26,11 +31,26 @@ class SearchResult:
 class WebSearchTool:
     """
     Web search tool for finding educational resources
+    
+    Tries DuckDuckGo first, then the local search index, and only then
+    asks the LLM to suggest resources. With `offline` (or the
+    STUDYBUDDY_OFFLINE environment variable) set, the network is never tried.
+    
+    Web results are cached per query, and once DuckDuckGo keeps failing the
+    circuit breaker sends calls straight to the fallbacks for a while.
     """
     
-    def __init__(self, llm_client=None, api_key: Optional[str] = None):
+    def __init__(self, llm_client=None, api_key: Optional[str] = None,
+                 search_index: Optional[SearchIndex] = None, offline: Optional[bool] = None,
+                 result_cache: Optional[SearchResultCache] = None, breaker: Optional[CircuitBreaker] = None):
         self.llm_client = llm_client
         self.api_key = api_key or os.getenv("SEARCH_API_KEY")
+        self.search_index = search_index if search_index is not None else shared_search_index
+        self.result_cache = result_cache if result_cache is not None else search_result_cache
+        self.breaker = breaker if breaker is not None else web_search_breaker
+        if offline is None:
+            offline = os.getenv("STUDYBUDDY_OFFLINE", "").lower() in ("1", "true", "yes")
+        self.offline = offline
         
     def search_educational_content(self, query: str, topic: str = "", 
                                   difficulty_level: str = "beginner") -> List[SearchResult]:
@@ -39,24 +59,15 @@ class WebSearchTool:
         # Enhanced query for better educational results
         enhanced_query = f"{query} {topic} tutorial {difficulty_level} learn programming"
         
-        try:
-            # Try to use real search if DuckDuckGo is available
-            from duckduckgo_search import DDGS
-            with DDGS() as ddgs:
-                results = list(ddgs.text(enhanced_query, max_results=5))
-                search_results = []
-                for i, result in enumerate(results):
-                    search_results.append(SearchResult(
-                        title=result.get('title', 'Educational Resource'),
-                        url=result.get('href', '#'),
-                        snippet=result.get('body', 'Educational content found'),
-                        relevance_score=1.0 - (i * 0.1)  # Decreasing relevance
-                    ))
+        if not self.offline:
+            search_results = self._search_web(enhanced_query)
+            if search_results:
                 return search_results
-        except ImportError:
-            logger.warning("DuckDuckGo search not available, using LLM-generated results")
-        except Exception as e:
-            logger.warning(f"Search failed: {e}, using LLM-generated results")
+        
+        # Offline: BM25 over the bundled corpus, no generation needed
+        local_results = self._search_local_index(query, topic)
+        if local_results:
+            return local_results
         
         # Fallback: Use LLM to generate realistic search results
         if self.llm_client:
@@ -65,6 +76,44 @@ class WebSearchTool:
         # Last resort: Basic structured results
         return self._generate_basic_search_results(query, topic, difficulty_level)
     
+    def _search_web(self, enhanced_query: str, max_results: int = 5) -> List[SearchResult]:
+        """DuckDuckGo results through the result cache; empty when unavailable or nothing was found"""
+        cache_key = SearchResultCache.make_key("duckduckgo", enhanced_query, max_results=max_results)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            # An empty list is a cached "no results": go straight to the fallbacks
+            return [SearchResult(**result) for result in cached]
+        
+        if not self.breaker.allow():
+            logger.debug("Web search circuit open, using the local search index")
+            return []
+        
+        try:
+            # Try to use real search if DuckDuckGo is available
+            from duckduckgo_search import DDGS
+            with DDGS() as ddgs:
+                results = list(ddgs.text(enhanced_query, max_results=max_results))
+        except ImportError as e:
+            # Installing the package needs a restart anyway, so stop trying
+            self.breaker.record_failure(f"DuckDuckGo search not available ({e})", permanent=True)
+            return []
+        except Exception as e:
+            self.breaker.record_failure(e)
+            logger.warning(f"Search failed: {e}, using the local search index")
+            return []
+        
+        self.breaker.record_success()
+        search_results = []
+        for i, result in enumerate(results):
+            search_results.append(SearchResult(
+                title=result.get('title', 'Educational Resource'),
+                url=result.get('href', '#'),
+                snippet=result.get('body', 'Educational content found'),
+                relevance_score=1.0 - (i * 0.1)  # Decreasing relevance
+            ))
+        self.result_cache.set(cache_key, [asdict(result) for result in search_results])
+        return search_results
+    
     def _generate_search_results_with_llm(self, query: str, topic: str, difficulty_level: str) -> List[SearchResult]:
         """Generate realistic search results using LLM"""
         if not self.llm_client:
@@ -88,12 +137,37 @@ SNIPPET: [description]
 ---"""
 
         try:
-            response = self.llm_client.generate_response(prompt, max_tokens=300)
+            # Stop at the `---` closing the third result instead of running on to max_tokens
+            with request_context(priority=Priority.TOOL):
+                response = self.llm_client.generate_response(prompt, max_tokens=300, stop=SectionStop("---", 3))
             return self._parse_llm_search_results(response)
         except Exception as e:
             logger.error(f"LLM search result generation failed: {e}")
             return self._generate_basic_search_results(query, topic, difficulty_level)
     
+    def _search_local_index(self, query: str, topic: str, limit: int = 5) -> List[SearchResult]:
+        """Search the local index; scores are scaled so the best match is 1.0"""
+        if self.search_index is None:
+            return []
+        try:
+            matches = self.search_index.search(f"{query} {topic}", limit=limit)
+        except Exception as e:
+            logger.warning(f"Local search index failed: {e}")
+            return []
+        if not matches:
+            return []
+        
+        top_score = matches[0][1]
+        return [
+            SearchResult(
+                title=document.title,
+                url=document.url,
+                snippet=document.text[:300],
+                relevance_score=round(score / top_score, 3)
+            )
+            for document, score in matches
+        ]
+    
     def _parse_llm_search_results(self, llm_response: str) -> List[SearchResult]:
         """Parse LLM response into SearchResult objects"""
         results = []
@@ -203,7 +277,8 @@ EXPLANATION: [brief explanation of what the code does]
 Focus on being educational and helpful for learning."""
 
         try:
-            response = self.llm_client.generate_response(prompt, max_tokens=400)
+            with request_context(priority=Priority.TOOL):
+                response = self.llm_client.generate_response(prompt, max_tokens=400)
             return self._parse_llm_analysis(response, code)
         except Exception as e:
             logger.error(f"LLM code analysis failed: {e}")
@@ -393,7 +468,8 @@ SOLUTION: [solution code]
 Make exercises progressively challenging but achievable at the {difficulty} level."""
 
         try:
-            response = self.llm_client.generate_response(prompt, max_tokens=600)
+            with request_context(priority=Priority.TOOL):
+                response = self.llm_client.generate_response(prompt, max_tokens=600, stop=SectionStop("---", 3))
             return self._parse_exercise_response(response)
         except Exception as e:
             logger.error(f"LLM exercise generation failed: {e}")
@@ -484,7 +560,9 @@ DAILY_ACTIVITIES: [activity1, activity2, activity3]
 Make it realistic and achievable for a {current_level} level learner."""
 
         try:
-            response = self.llm_client.generate_response(prompt, max_tokens=500)
+            # At most 4 phases are asked for; long plans yield to chat replies
+            with request_context(priority=Priority.BACKGROUND):
+                response = self.llm_client.generate_response(prompt, max_tokens=500, stop=SectionStop("---", 4))
             return self._parse_study_plan_response(response, topic, timeline_days, current_level)
         except Exception as e:
             logger.error(f"LLM study plan generation failed: {e}")
@@ -0,0 +1,193 @@
+"""
+Web search result cache and circuit breaker for the StudyBuddy tools
+Repeated queries are answered from the cache, and a failing backend is
+skipped for a while instead of being waited on by every request
+"""
+
+import json
+import time
+import logging
+import threading
+from typing import Dict, Any, List, Optional
+
+from ..core.response_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Remembers failures of a backend so callers can skip it.
+
+    Closed: calls go through. After `failure_threshold` consecutive
+    failures the breaker opens and allow() returns False for
+    `cooldown_seconds`. It then half-opens and lets one probe call through;
+    the probe's success closes the breaker, its failure opens it again.
+    A permanent failure (e.g. the client library is not installed) keeps it
+    open until reset().
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 3, cooldown_seconds: float = 60):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._permanent = False
+        self._probe_in_flight = False
+        self.last_error: Optional[str] = None
+
+        # Breaker metrics
+        self.failures = 0
+        self.short_circuits = 0
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now: float) -> str:
+        if (self._state == self.OPEN and not self._permanent
+                and now - self._opened_at >= self.cooldown_seconds):
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow(self) -> bool:
+        """Whether the caller may try the backend now"""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                # Only one probe at a time; everyone else keeps using the fallback
+                self._probe_in_flight = True
+                return True
+            self.short_circuits += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"✅ {self.name} recovered, circuit closed")
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self, error: Any = None, permanent: bool = False):
+        with self._lock:
+            self.failures += 1
+            self._consecutive_failures += 1
+            self.last_error = str(error) if error is not None else None
+            self._permanent = self._permanent or permanent
+            self._probe_in_flight = False
+            if (self._state == self.HALF_OPEN or permanent
+                    or self._consecutive_failures >= self.failure_threshold):
+                if self._state != self.OPEN:
+                    self.trips += 1
+                    retry = "until restart" if self._permanent else f"for {self.cooldown_seconds}s"
+                    logger.warning(f"⚠️ {self.name} unavailable, skipping it {retry}: {error}")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def reset(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._permanent = False
+            self._probe_in_flight = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._current_state(time.monotonic()),
+                "consecutive_failures": self._consecutive_failures,
+                "failures": self.failures,
+                "short_circuits": self.short_circuits,
+                "trips": self.trips,
+                "last_error": self.last_error,
+            }
+
+
+class SearchResultCache:
+    """
+    TTL cache of web search results keyed on the query sent to the backend.
+
+    Built on ResponseCache, so it has the same size-bounded in-memory LRU
+    and optional sqlite file. Queries that found nothing are cached too,
+    with the shorter `negative_ttl_seconds`, so they are not re-sent on
+    every request but are retried reasonably soon.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 6 * 3600,
+                 negative_ttl_seconds: float = 300, disk_path: Optional[str] = None):
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._cache = ResponseCache(max_entries=max_entries, ttl_seconds=ttl_seconds, disk_path=disk_path)
+
+        # Negative caching metrics
+        self.negative_stores = 0
+        self.negative_hits = 0
+
+    def configure(self, max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None,
+                  negative_ttl_seconds: Optional[float] = None, disk_path: Optional[str] = None):
+        """Apply settings from app_config.yaml; a new disk path starts a new cache"""
+        if negative_ttl_seconds is not None:
+            self.negative_ttl_seconds = negative_ttl_seconds
+        if disk_path is not None and disk_path != self._cache.disk_path:
+            self._cache.close()
+            self._cache = ResponseCache(
+                max_entries=max_entries or self._cache.max_entries,
+                ttl_seconds=ttl_seconds or self._cache.ttl_seconds,
+                disk_path=disk_path
+            )
+            return
+        if max_entries is not None:
+            self._cache.max_entries = max_entries
+        if ttl_seconds is not None:
+            self._cache.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def make_key(backend: str, query: str, **params) -> str:
+        # Case and spacing do not change what the backend returns
+        return ResponseCache.make_key(backend, "", " ".join(query.lower().split()), **params)
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Cached results (possibly an empty list), or None on a miss"""
+        cached = self._cache.get(key)
+        if cached is None:
+            return None
+        results = json.loads(cached)
+        if not results:
+            self.negative_hits += 1
+        return results
+
+    def set(self, key: str, results: List[Dict[str, Any]]):
+        if not results:
+            self.negative_stores += 1
+            self._cache.set(key, "[]", ttl_seconds=self.negative_ttl_seconds)
+            return
+        self._cache.set(key, json.dumps(results, ensure_ascii=False))
+
+    def clear(self):
+        self._cache.clear()
+
+    def close(self):
+        self._cache.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self._cache.get_stats()
+        stats["negative_stores"] = self.negative_stores
+        stats["negative_hits"] = self.negative_hits
+        return stats
+
+
+# Shared by every WebSearchTool, since each tutor agent creates its own tool
+search_result_cache = SearchResultCache()
+web_search_breaker = CircuitBreaker("Web search")
@@ -0,0 +1,376 @@
+"""
+Offline search index for StudyBuddy tools
+BM25 over a bundled corpus of learning resources and imported documentation,
+so resource search works without network access or an LLM generation
+"""
+
+import os
+import re
+import json
+import math
+import time
+import logging
+import threading
+from collections import Counter, defaultdict
+from dataclasses import dataclass, asdict
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_DAY4_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+
+# Corpus indexed when nothing else is configured: the bundled resources, plus
+# the workshop's docs/additional_resources.md in a source checkout
+DEFAULT_CORPUS_PATHS = [
+    os.path.join(_DAY4_DIR, "data", "search_corpus"),
+    os.path.join(_DAY4_DIR, "..", "..", "docs", "additional_resources.md"),
+]
+# File types picked up when a corpus path is a directory
+CORPUS_EXTENSIONS = (".md", ".txt", ".jsonl")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[+#]+|(?:\.[a-z0-9]+)+)?")
+_URL_RE = re.compile(r"https?://[^\s)>\]]+")
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*)$")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from how i in is it of on or that the this to what when where which "
+    "who why with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms without stopwords, with plural "s" stripped"""
+    terms = []
+    for term in _TOKEN_RE.findall(text.lower()):
+        if term in _STOPWORDS:
+            continue
+        if len(term) > 3 and term.endswith("s") and not term.endswith("ss"):
+            term = term[:-1]
+        terms.append(term)
+    return terms
+
+
+def _clean_markdown(line: str) -> str:
+    """Strip list markers, emphasis and quotes from a markdown line"""
+    line = re.sub(r"^\s*(?:[-*+]|\d+\.)\s+", "", line)
+    return line.replace("**", "").replace("__", "").replace("`", "").strip()
+
+
+def _slug(heading: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", heading.lower()).strip("-")
+
+
+@dataclass
+class IndexedDocument:
+    """One searchable passage, e.g. a list entry of a resource page"""
+    title: str
+    url: str
+    text: str
+    source: str
+    # Heading the passage sits under; searchable, but not part of the snippet
+    section: str = ""
+
+
+class SearchIndex:
+    """
+    Incrementally updated BM25 index over local files.
+
+    Markdown and text files are split into passages at blank lines, with
+    the nearest heading kept as context; JSON-lines documentation dumps
+    hold one {"title", "url", "text"} document per line. update() only
+    re-reads files whose size or modification time changed, and removes
+    documents of deleted files. The index can be saved to and loaded from
+    a JSON file so restarts skip re-parsing.
+
+    Documentation dumps added with import_paths() are remembered in the
+    index file and kept as corpus roots, so they survive a restart with a
+    corpus_paths setting that does not list them.
+    """
+
+    # BM25 parameters
+    K1 = 1.5
+    B = 0.75
+    # Title terms count this many times, so a matching title outranks a passing mention
+    TITLE_WEIGHT = 2
+    INDEX_VERSION = 1
+
+    def __init__(self, corpus_paths: Optional[Iterable[str]] = None, index_path: Optional[str] = None,
+                 refresh_interval_seconds: float = 60.0):
+        self.corpus_paths = list(corpus_paths) if corpus_paths is not None else list(DEFAULT_CORPUS_PATHS)
+        # Absolute paths imported into this index file, e.g. by scripts/build_search_index.py
+        self.imported_paths: List[str] = []
+        self.index_path = index_path
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self._lock = threading.RLock()
+
+        self._documents: Dict[int, IndexedDocument] = {}
+        self._term_counts: Dict[int, Dict[str, int]] = {}
+        self._lengths: Dict[int, int] = {}
+        self._postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self._total_length = 0
+        self._next_id = 0
+        # path -> {"mtime", "size", "doc_ids"} for incremental updates
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._last_refresh: Optional[float] = None
+
+        # Index metrics
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.updates = 0
+        self.last_update_seconds = 0.0
+
+    def configure(self, corpus_paths: Optional[Iterable[str]] = None, index_path: Optional[str] = None):
+        """Point the index at another corpus or index file, e.g. from app_config.yaml"""
+        with self._lock:
+            if corpus_paths is not None:
+                self.corpus_paths = list(corpus_paths)
+            if index_path is not None:
+                self.index_path = index_path
+            self._last_refresh = None
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    # Indexing
+
+    def import_paths(self, paths: Iterable[str]) -> List[str]:
+        """Add files or directories to this index for good; they are indexed on the next update()"""
+        with self._lock:
+            self._ensure_loaded()
+            for path in paths:
+                path = os.path.abspath(path)
+                if path not in self.imported_paths:
+                    self.imported_paths.append(path)
+            return list(self.imported_paths)
+
+    def _ensure_loaded(self):
+        if not self._files and not self.imported_paths and self.index_path and os.path.exists(self.index_path):
+            self.load()
+
+    def _corpus_files(self) -> List[str]:
+        files = []
+        for path in dict.fromkeys(os.path.abspath(path) for path in self.corpus_paths + self.imported_paths):
+            if os.path.isdir(path):
+                for root, _, names in os.walk(path):
+                    files.extend(os.path.join(root, name) for name in sorted(names)
+                                 if name.endswith(CORPUS_EXTENSIONS))
+            elif os.path.isfile(path):
+                files.append(path)
+        return list(dict.fromkeys(files))
+
+    def update(self) -> Dict[str, int]:
+        """Index new and changed corpus files, drop deleted ones, and save if anything changed"""
+        started_at = time.perf_counter()
+        with self._lock:
+            self._ensure_loaded()
+
+            added = changed = removed = 0
+            seen = set()
+            for path in self._corpus_files():
+                seen.add(path)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                known = self._files.get(path)
+                if known and known["mtime"] == stat.st_mtime and known["size"] == stat.st_size:
+                    continue
+                if known:
+                    self._remove_file(path)
+                    changed += 1
+                else:
+                    added += 1
+                try:
+                    documents = list(self._read_file(path))
+                except (OSError, UnicodeDecodeError) as e:
+                    logger.warning(f"⚠️ Could not index {path}: {e}")
+                    continue
+                self._files[path] = {
+                    "mtime": stat.st_mtime,
+                    "size": stat.st_size,
+                    "doc_ids": [self._add(document) for document in documents],
+                }
+
+            for path in [path for path in self._files if path not in seen]:
+                self._remove_file(path)
+                removed += 1
+
+            self._last_refresh = time.monotonic()
+            self.updates += 1
+            self.last_update_seconds = round(time.perf_counter() - started_at, 4)
+            if (added or changed or removed) and self.index_path:
+                self.save()
+
+        if added or changed or removed:
+            logger.info(f"🔎 Search index: {added} files added, {changed} changed, {removed} removed; "
+                        f"{len(self._documents)} passages in {self.last_update_seconds}s")
+        return {"added": added, "changed": changed, "removed": removed, "documents": len(self._documents)}
+
+    def refresh(self):
+        """Run update() if the corpus was not checked within refresh_interval_seconds"""
+        last = self._last_refresh
+        if last is None or time.monotonic() - last >= self.refresh_interval_seconds:
+            self.update()
+
+    def _read_file(self, path: str) -> Iterable[IndexedDocument]:
+        if path.endswith(".jsonl"):
+            yield from self._read_dump(path)
+        else:
+            yield from self._read_markdown(path)
+
+    def _read_dump(self, path: str) -> Iterable[IndexedDocument]:
+        """Documentation dump: one JSON object with title, url and text per line"""
+        with open(path, "r", encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"⚠️ Skipping bad line {number} in {path}")
+                    continue
+                text = str(record.get("text") or "")
+                title = str(record.get("title") or text[:80])
+                if title or text:
+                    yield IndexedDocument(title=title, url=str(record.get("url") or path),
+                                          text=text, source=path)
+
+    def _read_markdown(self, path: str) -> Iterable[IndexedDocument]:
+        """Passages separated by blank lines, each tagged with the heading it sits under"""
+        with open(path, "r", encoding="utf-8") as f:
+            content = f.read()
+
+        heading = ""
+        for block in re.split(r"\n\s*\n", content):
+            lines = [line for line in block.strip().splitlines() if line.strip()]
+            if not lines:
+                continue
+            match = _HEADING_RE.match(lines[0].strip())
+            if match:
+                heading = match.group(2).strip()
+                lines = lines[1:]
+                if not lines:
+                    continue
+            title = _clean_markdown(_URL_RE.sub("", lines[0]))
+            body = " ".join(_clean_markdown(_URL_RE.sub("", line)) for line in lines[1:])
+            links = _URL_RE.findall(block)
+            url = links[0] if links else f"{path}#{_slug(heading)}" if heading else path
+            yield IndexedDocument(title=title, url=url, text=body.strip(), source=path, section=heading)
+
+    def _add(self, document: IndexedDocument) -> int:
+        doc_id = self._next_id
+        self._next_id += 1
+        counts = Counter(tokenize(document.text) + tokenize(document.section))
+        for _ in range(self.TITLE_WEIGHT):
+            counts.update(tokenize(document.title))
+        self._index(doc_id, document, dict(counts))
+        return doc_id
+
+    def _index(self, doc_id: int, document: IndexedDocument, counts: Dict[str, int]):
+        self._documents[doc_id] = document
+        self._term_counts[doc_id] = counts
+        length = sum(counts.values())
+        self._lengths[doc_id] = length
+        self._total_length += length
+        for term, count in counts.items():
+            self._postings[term][doc_id] = count
+
+    def _remove_file(self, path: str):
+        for doc_id in self._files.pop(path, {}).get("doc_ids", []):
+            self._documents.pop(doc_id, None)
+            self._total_length -= self._lengths.pop(doc_id, 0)
+            for term in self._term_counts.pop(doc_id, {}):
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self._postings[term]
+
+    # Querying
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[IndexedDocument, float]]:
+        """Best passages for `query` with their BM25 scores, highest first"""
+        self.refresh()
+        started_at = time.perf_counter()
+        with self._lock:
+            count = len(self._documents)
+            scores: Dict[int, float] = defaultdict(float)
+            if count:
+                average_length = self._total_length / count
+                for term in set(tokenize(query)):
+                    postings = self._postings.get(term)
+                    if not postings:
+                        continue
+                    idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for doc_id, frequency in postings.items():
+                        norm = self.K1 * (1 - self.B + self.B * self._lengths[doc_id] / average_length)
+                        scores[doc_id] += idf * frequency * (self.K1 + 1) / (frequency + norm)
+            best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+            results = [(self._documents[doc_id], score) for doc_id, score in best]
+
+        with self._lock:
+            self.queries += 1
+            self.query_seconds += time.perf_counter() - started_at
+        return results
+
+    # Persistence
+
+    def save(self):
+        """Write the index to index_path (atomically)"""
+        if not self.index_path:
+            return
+        with self._lock:
+            payload = {
+                "version": self.INDEX_VERSION,
+                "imported_paths": self.imported_paths,
+                "files": self._files,
+                "documents": {
+                    str(doc_id): {"document": asdict(document), "counts": self._term_counts[doc_id]}
+                    for doc_id, document in self._documents.items()
+                },
+            }
+        os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(temp_path, self.index_path)
+
+    def load(self) -> bool:
+        """Replace the in-memory index with the saved one; False if it is missing or unreadable"""
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"⚠️ Could not load search index {self.index_path}: {e}")
+            return False
+        if payload.get("version") != self.INDEX_VERSION:
+            return False
+
+        with self._lock:
+            self._documents.clear()
+            self._term_counts.clear()
+            self._lengths.clear()
+            self._postings.clear()
+            self._total_length = 0
+            for doc_id, entry in payload["documents"].items():
+                self._index(int(doc_id), IndexedDocument(**entry["document"]), entry["counts"])
+            self._next_id = max(self._documents, default=-1) + 1
+            self._files = payload["files"]
+            # Imports made in this process before loading are kept as well
+            self.imported_paths = list(dict.fromkeys(payload.get("imported_paths", []) + self.imported_paths))
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Index size and query latency for monitoring"""
+        return {
+            "documents": len(self._documents),
+            "files": len(self._files),
+            "imported_paths": len(self.imported_paths),
+            "terms": len(self._postings),
+            "queries": self.queries,
+            "average_query_ms": round(self.query_seconds / max(self.queries, 1) * 1000, 3),
+            "last_update_seconds": self.last_update_seconds,
+        }
+
+
+# Process-wide index shared by every WebSearchTool
+search_index = SearchIndex()
@@ -10,7 +10,7 @@ import streamlit as st
 import requests
 import json
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Dict, Optional, Iterator
 import yaml
 
 # Configure page
@@ -52,6 +52,8 @@ if 'selected_agent' not in st.session_state:
     st.session_state.selected_agent = 'tutor'
 if 'api_available' not in st.session_state:
     st.session_state.api_available = None
+if 'student_id' not in st.session_state:
+    st.session_state.student_id = 'default_student'
 
 def check_api_health():
     """Check if the API is available"""
@@ -68,7 +70,8 @@ def call_agent_api(agent_type: str, message: str) -> Optional[str]:
             f"{API_BASE_URL}/chat",
             json={
                 "message": message,
-                "agent_type": agent_type
+                "agent_type": agent_type,
+                "student_id": st.session_state.student_id
             },
             timeout=30
         )
@@ -86,6 +89,43 @@ def call_agent_api(agent_type: str, message: str) -> Optional[str]:
     except Exception as e:
         return f"❌ Error: {str(e)}"
 
+def stream_agent_api(agent_type: str, message: str) -> Iterator[str]:
+    """Call the streaming agent API and yield response text as it arrives"""
+    try:
+        with requests.post(
+            f"{API_BASE_URL}/chat/stream",
+            json={
+                "message": message,
+                "agent_type": agent_type,
+                "student_id": st.session_state.student_id
+            },
+            stream=True,
+            timeout=(5, 30)  # The read timeout applies between chunks, not to the whole answer
+        ) as response:
+            if response.status_code != 200:
+                yield f"API Error: {response.status_code} - {response.text}"
+                return
+            
+            event = "message"
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:
+                    event = "message"
+                elif line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data = json.loads(line[len("data:"):].strip())
+                    if event == "error":
+                        yield f"\n\n❌ Error: {data.get('detail', 'Unknown error')}"
+                    elif event == "message":
+                        yield data.get("token", "")
+                    
+    except requests.exceptions.ConnectionError:
+        yield "❌ Cannot connect to StudyBuddy API. Please ensure the FastAPI server is running."
+    except requests.exceptions.Timeout:
+        yield "⏱️ Request timed out. The AI agent might be processing a complex request."
+    except Exception as e:
+        yield f"❌ Error: {str(e)}"
+
 def get_api_stats():
     """Get API statistics"""
     try:
@@ -133,6 +173,13 @@ def main():
     with st.sidebar:
         st.header("🤖 Agent Selection")
         
+        # Each student gets their own agents and history on the API
+        st.session_state.student_id = st.text_input(
+            "Student ID",
+            value=st.session_state.student_id,
+            help="Letters, digits, '.', '_' or '-'"
+        ).strip() or 'default_student'
+        
         # Agent selection
         agent_options = {
             'tutor': '📚 TutorAgent - Educational Specialist',
@@ -228,10 +275,19 @@ def main():
         
         # Get agent response
         with st.chat_message("assistant", avatar={"tutor": "📚", "session": "⏰", "goal": "🎯"}[selected_agent]):
-            with st.spinner(f"🤔 {agent_options[selected_agent].split(' - ')[0]} is thinking..."):
-                response = call_agent_api(selected_agent, user_input)
+            placeholder = st.empty()
+            placeholder.markdown(f"🤔 {agent_options[selected_agent].split(' - ')[0]} is thinking...")
+            
+            # Render tokens as they arrive instead of waiting for the full answer
+            response = ""
+            for chunk in stream_agent_api(selected_agent, user_input):
+                response += chunk
+                placeholder.markdown(response + "▌")
             
-            st.write(response)
+            if not response:
+                # Don't re-send the question: a second generation would only add load
+                response = "❌ The agent returned an empty response. Please try again."
+            placeholder.markdown(response)
             st.caption(f"*{timestamp} - {agent_options[selected_agent]}*")
         
         # Add to chat history
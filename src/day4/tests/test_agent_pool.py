@@ -0,0 +1,100 @@
+"""
+Tests for the per-student agent pool, with stand-in agents
+"""
+
+import pytest
+
+from studybuddy.agents.agent_pool import AgentPool
+
+
+class FakeAgent:
+    def __init__(self, llm_client, student_id, pool=None):
+        self.student_id = student_id
+        self.history = []
+        self.closed = False
+        self.pool = pool
+
+    def get_state(self):
+        # Saving must not hold up other students' acquire()
+        assert not self.pool._lock.locked()
+        return {"history": self.history}
+
+    def load_state(self, state):
+        self.history = state["history"]
+
+    def trim_history(self, max_history):
+        del self.history[:max(len(self.history) - max_history, 0)]
+
+    def close(self):
+        assert not self.pool._lock.locked()
+        self.closed = True
+
+
+@pytest.fixture
+def pool(tmp_path):
+    class FakePool(AgentPool):
+        AGENT_CLASSES = {"tutor": FakeAgent}
+
+    pool = FakePool(llm_client=None, state_dir=str(tmp_path), max_agents=2)
+    pool.agent_options = {"tutor": {"pool": pool}}
+    return pool
+
+
+def test_agents_are_per_student(pool):
+    with pool.lease("alice", "tutor") as alice, pool.lease("bob", "tutor") as bob:
+        assert alice is not bob
+    with pool.lease("alice", "tutor") as again:
+        assert again is alice
+    assert pool.get_stats()["hits"] == 1
+
+
+def test_least_recently_used_idle_agent_is_saved_and_restored(pool):
+    with pool.lease("alice", "tutor") as alice:
+        alice.history.append("loops")
+    with pool.lease("bob", "tutor"):
+        pass
+    with pool.lease("carol", "tutor"):
+        pass
+
+    assert alice.closed
+    assert pool.get_stats()["evictions"] == 1
+    assert pool.loaded_agent_types() == {"tutor": 2}
+    with pool.lease("alice", "tutor") as restored:
+        assert restored is not alice
+        assert restored.history == ["loops"]
+
+
+def test_leased_agents_are_not_evicted(pool):
+    alice = pool.acquire("alice", "tutor")
+    for student_id in ("bob", "carol", "dave"):
+        with pool.lease(student_id, "tutor"):
+            pass
+
+    assert not alice.closed
+    pool.release("alice", "tutor")
+    assert pool.get_stats()["in_use"] == 0
+
+
+def test_save_all_persists_every_agent(pool):
+    with pool.lease("alice", "tutor") as alice:
+        alice.history.append("recursion")
+    pool.save_all()
+
+    assert alice.closed
+    assert pool.get_stats()["loaded_agents"] == 0
+    with pool.lease("alice", "tutor") as restored:
+        assert restored.history == ["recursion"]
+
+
+@pytest.mark.parametrize("agent_type, history", [
+    ("tutor", "conversation_history"), ("session", "session_history"), ("goal", "progress_history")
+])
+def test_agents_trim_history_to_the_pool_limit(tmp_path, monkeypatch, agent_type, history):
+    monkeypatch.chdir(tmp_path)
+    for max_history, kept in ((2, ["b", "c"]), (0, [])):
+        pool = AgentPool(llm_client=None, state_dir=str(tmp_path / "agents"), max_history=max_history)
+        with pool.lease("alice", agent_type) as agent:
+            getattr(agent, history)[:] = ["a", "b", "c"]
+
+        assert getattr(agent, history) == kept
+        pool.save_all()
@@ -0,0 +1,139 @@
+"""
+Tests for the FastAPI app, served by the tiny model
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+
+import pytest
+
+from conftest import PROJECT_DIR
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'fastapi_app'))
+
+
+@pytest.fixture(scope="module")
+def api(tiny_model, tmp_path_factory):
+    """The app module, started with the tiny model in a scratch working directory"""
+    from studybuddy.core.llm_client import ProductionLLMClient
+    from studybuddy.core.model_registry import model_registry
+    import main
+
+    model, tokenizer = tiny_model
+    model_registry.register("default", lambda: ProductionLLMClient(
+        model=model, tokenizer=tokenizer, model_name="tiny", prefix_cache_mb=0
+    ))
+    cwd = os.getcwd()
+    scratch = tmp_path_factory.mktemp("api")
+    os.chdir(scratch)
+    # Keep the index out of the project's cache directory
+    main.config.setdefault("search", {})["index_path"] = str(scratch / "search_index.json")
+    try:
+        with TestClient(main.app) as client:
+            for _ in range(100):
+                if client.get("/health/ready").status_code == 200:
+                    break
+                time.sleep(0.1)
+            yield main, client
+    finally:
+        os.chdir(cwd)
+
+
+def parse_events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields.get("event", "message"), json.loads(fields["data"])))
+    return events
+
+
+def test_chat_stream_sends_tokens_then_done(api):
+    main, client = api
+    response = client.post("/chat/stream", json={"message": "What is a list?", "agent_type": "goal"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_events(response.text)
+    assert events[-1][0] == "done"
+    tokens = [data["token"] for event, data in events[:-1] if event == "message"]
+    assert "".join(tokens).strip()
+    assert main.agent_pool.get_stats()["in_use"] == 0
+
+
+def test_abandoned_stream_releases_lease_and_slot(api):
+    main, _ = api
+    # Held here so only closing it, not garbage collection, can release the lease
+    agent_chunks = main.stream_agent("abandoning_student", "goal", "Plan my week", main.request_deadline())
+
+    async def read_one_chunk():
+        chunks = main.inference_executor.stream(agent_chunks)
+        await chunks.__anext__()
+        # What the SSE endpoint does when the client goes away
+        await chunks.aclose()
+
+    asyncio.run(read_one_chunk())
+    for _ in range(100):
+        if main.inference_executor.get_stats()["in_flight"] == 0 and main.agent_pool.get_stats()["in_use"] == 0:
+            break
+        time.sleep(0.05)
+
+    assert main.inference_executor.get_stats()["in_flight"] == 0
+    assert main.agent_pool.get_stats()["in_use"] == 0
+    assert agent_chunks.gi_frame is None
+
+
+def test_stats_and_metrics_report_length_policy(api):
+    _, client = api
+    client.post("/chat", json={"message": "What is a list?", "agent_type": "tutor", "student_id": "length_student"})
+
+    tutor = client.get("/stats").json()["agents_status"]["length_policy"]["tutor"]
+    assert tutor["by_intent"]["quick"]["requests"] >= 1
+    assert tutor["tokens_saved"] > 0
+    metrics = client.get("/metrics").text
+    assert "studybuddy_length_tokens_saved_total" in metrics
+    assert 'studybuddy_length_max_tokens_bucket{agent_type="tutor",intent="quick"' in metrics
+
+
+def test_stats_and_metrics_report_uptime_and_latency(api):
+    main, client = api
+    client.post("/chat", json={"message": "What is a tuple?", "agent_type": "goal", "student_id": "latency_student"})
+
+    stats = client.get("/stats").json()
+    assert stats["uptime_seconds"] > 0
+    assert stats["uptime"].count(":") == 2
+    assert stats["latency"]["agent_request_seconds"]["agent_type=goal"]["count"] >= 1
+    chat = stats["latency"]["http_request_seconds"]["endpoint=/chat,method=POST,status=200"]
+    assert chat["count"] >= 1 and chat["p95"] is not None
+    assert stats["llm_stats"]["latency"]["time_to_first_token_seconds"]["count"] >= 1
+
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain")
+    metrics = response.text
+    assert "# TYPE studybuddy_uptime_seconds gauge" in metrics
+    assert 'studybuddy_api_http_request_seconds_count{endpoint="/chat",method="POST",status="200"}' in metrics
+    assert 'studybuddy_api_agent_request_seconds_bucket{agent_type="goal",le="+Inf"}' in metrics
+    assert "studybuddy_llm_time_to_first_token_seconds_bucket" in metrics
+
+
+def test_api_holds_a_reference_per_model_slot_it_uses(api):
+    from studybuddy.core.model_registry import model_registry
+    main, _ = api
+
+    # The tool slot aliases the default model in model_config.yaml
+    assert main.model_references == ["default", "tool"]
+    assert model_registry.get_stats()["default"]["references"] == 2
+
+
+def test_tutor_context_gathering_is_opt_in(api):
+    main, _ = api
+
+    assert not main.config["tutor"]["gather_context"]
+    with main.agent_pool.lease("config_student", "tutor") as tutor:
+        assert not tutor.gather_context
@@ -0,0 +1,95 @@
+"""
+Tests for the async generation path and the LangChain wrapper
+"""
+
+import asyncio
+
+import pytest
+
+from studybuddy.core.llm_client import ProductionLLMClient, QwenLangChainLLM
+
+PROMPTS = ["What is a list?", "Explain tuples", "Why use a dict?"]
+
+
+@pytest.fixture
+def make_client(tiny_model):
+    model, tokenizer = tiny_model
+    clients = []
+
+    def make(**kwargs):
+        client = ProductionLLMClient(model=model, tokenizer=tokenizer, prefix_cache_mb=0,
+                                     coalesce_requests=False, **kwargs)
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.close()
+
+
+@pytest.mark.parametrize("enable_batching", [True, False])
+def test_async_answers_match_sync_answers(make_client, enable_batching):
+    client = make_client(enable_batching=enable_batching)
+    expected = [client.generate_response(prompt, max_tokens=12, temperature=0.0, use_cache=False)
+                for prompt in PROMPTS]
+
+    async def answer_all():
+        return await asyncio.gather(*[
+            client.agenerate_response(prompt, max_tokens=12, temperature=0.0, use_cache=False)
+            for prompt in PROMPTS
+        ])
+
+    assert asyncio.run(answer_all()) == expected
+
+
+def test_concurrent_async_calls_share_the_decode_batch(make_client):
+    client = make_client(enable_batching=True)
+
+    async def answer_all():
+        return await asyncio.gather(*[
+            client.agenerate_response(prompt, max_tokens=16, temperature=0.0, use_cache=False)
+            for prompt in PROMPTS
+        ])
+
+    assert all(asyncio.run(answer_all()))
+    assert client.get_stats()["batching"]["peak_batch_size"] > 1
+
+
+def test_unbatched_async_calls_wait_for_room_in_the_queue(make_client, monkeypatch):
+    monkeypatch.setattr(ProductionLLMClient, "MAX_DIRECT_ASYNC_PENDING", 1)
+    client = make_client(enable_batching=False)
+    pending = []
+    generate = client._direct_generate
+
+    def record(*args, **kwargs):
+        pending.append(client._direct_pending)
+        return generate(*args, **kwargs)
+
+    monkeypatch.setattr(client, "_direct_generate", record)
+
+    async def answer_all():
+        return await asyncio.gather(*[
+            client.agenerate_response(prompt, max_tokens=8, temperature=0.0, use_cache=False)
+            for prompt in PROMPTS
+        ])
+
+    responses = asyncio.run(answer_all())
+    assert all("technical difficulties" not in response for response in responses)
+    # Callers past the limit waited instead of queueing more work
+    assert pending == [1, 1, 1]
+
+
+def test_langchain_async_calls_use_the_client(make_client):
+    client = make_client(enable_batching=True)
+    llm = QwenLangChainLLM(client)
+    expected = client.generate_response(PROMPTS[0], max_tokens=12, temperature=0.0)
+
+    async def run():
+        single = await llm._acall(PROMPTS[0], max_tokens=12, temperature=0.0)
+        batch = await llm._agenerate(PROMPTS, max_tokens=12, temperature=0.0)
+        return single, batch
+
+    single, batch = asyncio.run(run())
+    assert single == expected
+    assert [generations[0].text for generations in batch.generations][0] == expected
+    assert len(batch.generations) == len(PROMPTS)
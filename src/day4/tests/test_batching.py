@@ -0,0 +1,60 @@
+"""
+Tests for the continuous batching scheduler on a tiny random-weight model
+"""
+
+import threading
+
+import pytest
+
+from studybuddy.core.llm_client import ProductionLLMClient
+
+# Different lengths, so the decode batch has to pad and merge their caches
+PROMPTS = ["Hi", "What is a list?", "Explain how a for loop walks over the items of a tuple, step by step"]
+MAX_TOKENS = [6, 20, 12]
+
+
+@pytest.fixture
+def clients(tiny_model):
+    model, tokenizer = tiny_model
+    batched = ProductionLLMClient(model=model, tokenizer=tokenizer, enable_batching=True,
+                                  prefix_cache_mb=0, coalesce_requests=False)
+    unbatched = ProductionLLMClient(model=model, tokenizer=tokenizer, enable_batching=False,
+                                    prefix_cache_mb=0, coalesce_requests=False)
+    yield batched, unbatched
+    batched.close()
+    unbatched.close()
+
+
+def greedy(client, prompt, max_tokens):
+    return client.generate_response(prompt, max_tokens=max_tokens, temperature=0.0, use_cache=False)
+
+
+def test_batched_greedy_matches_unbatched(clients):
+    batched, unbatched = clients
+    for prompt, max_tokens in zip(PROMPTS, MAX_TOKENS):
+        assert greedy(batched, prompt, max_tokens) == greedy(unbatched, prompt, max_tokens)
+
+
+def test_concurrent_requests_share_the_batch_and_leave_it(clients):
+    batched, unbatched = clients
+    expected = [greedy(unbatched, prompt, max_tokens) for prompt, max_tokens in zip(PROMPTS, MAX_TOKENS)]
+
+    start = threading.Barrier(len(PROMPTS))
+    responses = [None] * len(PROMPTS)
+
+    def run(i):
+        start.wait()
+        responses[i] = greedy(batched, PROMPTS[i], MAX_TOKENS[i])
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(PROMPTS))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+
+    # Merging new requests into the running batch and evicting finished ones
+    # leaves every sequence with the tokens it would get on its own
+    assert responses == expected
+    stats = batched.get_stats()["batching"]
+    assert stats["peak_batch_size"] > 1
+    assert stats["active_sequences"] == 0
@@ -0,0 +1,117 @@
+"""
+Tests for single-flight coalescing of identical concurrent generations
+"""
+
+import time
+import threading
+
+import pytest
+
+from studybuddy.core.llm_client import ProductionLLMClient
+from studybuddy.core.request_scheduler import Priority, RequestExpiredError, request_context
+
+CALLERS = 4
+
+
+@pytest.fixture
+def client(tiny_model):
+    model, tokenizer = tiny_model
+    client = ProductionLLMClient(model=model, tokenizer=tokenizer, prefix_cache_mb=0)
+    yield client
+    client.close()
+
+
+def run_concurrently(client, monkeypatch, prompts, use_cache=True, contexts=None, fail_first=False):
+    """
+    Call generate_response once per prompt, holding generations until every
+    caller has arrived. `contexts` gives each caller's request_context
+    arguments; with `fail_first` the first generation raises.
+    """
+    generations = []
+    release = threading.Event()
+    generate = client._generate_qwen_response
+
+    def held(*args, **kwargs):
+        generations.append(args[0])
+        first = len(generations) == 1
+        release.wait(timeout=10)
+        if fail_first and first:
+            raise RequestExpiredError("Request expired before it reached the model")
+        return generate(*args, **kwargs)
+
+    monkeypatch.setattr(client, "_generate_qwen_response", held)
+    responses = [None] * len(prompts)
+    contexts = contexts or [{}] * len(prompts)
+
+    def call(i):
+        with request_context(**contexts[i]):
+            responses[i] = client.generate_response(prompts[i], max_tokens=16, temperature=0.0, use_cache=use_cache)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(prompts))]
+    # The first caller leads: it is generating before anyone else arrives
+    threads[0].start()
+    deadline = time.monotonic() + 10
+    while not generations and time.monotonic() < deadline:
+        time.sleep(0.01)
+    for thread in threads[1:]:
+        thread.start()
+    while client.get_stats()["requests_processed"] < len(prompts) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # Let late callers reach the flight table before the leader lands
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(timeout=30)
+    return responses, generations
+
+
+def test_identical_requests_share_one_generation(client, monkeypatch):
+    # Whitespace differences still share the flight
+    prompts = ["What is a list?", "What  is a list? "] * (CALLERS // 2)
+    responses, generations = run_concurrently(client, monkeypatch, prompts)
+
+    assert len(generations) == 1
+    assert len(set(responses)) == 1
+    coalescing = client.get_stats()["coalescing"]
+    assert coalescing["coalesced_requests"] == CALLERS - 1
+    assert coalescing["shared_generations"] == 1
+    assert coalescing["in_flight_prompts"] == 0
+
+
+def test_different_prompts_are_not_coalesced(client, monkeypatch):
+    _, generations = run_concurrently(client, monkeypatch, ["What is a list?", "What is a tuple?"])
+
+    assert len(generations) == 2
+    assert client.get_stats()["coalescing"]["coalesced_requests"] == 0
+
+
+def test_uncached_requests_are_never_shared(client, monkeypatch):
+    _, generations = run_concurrently(client, monkeypatch, ["Tell me a joke"] * 2, use_cache=False)
+
+    assert len(generations) == 2
+    assert client.get_stats()["coalescing"]["coalesced_requests"] == 0
+
+
+def test_followers_of_a_failed_leader_generate_their_own_answer(client, monkeypatch):
+    responses, generations = run_concurrently(client, monkeypatch, ["What is a list?"] * 2, fail_first=True)
+
+    assert len(generations) == 2
+    assert sum("technical difficulties" in response for response in responses) == 1
+    assert client.get_stats()["coalescing"]["coalesced_requests"] == 1
+
+
+def test_flights_are_not_shared_across_priorities(client, monkeypatch):
+    contexts = [{"priority": Priority.BACKGROUND}, {"priority": Priority.INTERACTIVE}]
+    _, generations = run_concurrently(client, monkeypatch, ["What is a list?"] * 2, contexts=contexts)
+
+    assert len(generations) == 2
+    assert client.get_stats()["coalescing"]["coalesced_requests"] == 0
+
+
+def test_callers_do_not_wait_on_a_leader_with_an_earlier_deadline(client, monkeypatch):
+    now = time.monotonic()
+    contexts = [{"deadline": now + 30}, {"deadline": now + 60}]
+    _, generations = run_concurrently(client, monkeypatch, ["What is a list?"] * 2, contexts=contexts)
+
+    assert len(generations) == 2
+    assert client.get_stats()["coalescing"]["coalesced_requests"] == 0
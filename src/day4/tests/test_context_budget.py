@@ -0,0 +1,117 @@
+"""
+Tests for fitting prompts into the context window
+"""
+
+import pytest
+
+from studybuddy.core.context_budget import ContextBudget, PromptSection
+
+QUESTION = "How do I reverse a list in Python?"
+MARKER = ContextBudget.TRUNCATION_MARKER
+
+
+@pytest.fixture
+def budget(tiny_model):
+    return ContextBudget(tiny_model[1], max_context_tokens=512)
+
+
+def texts(sections):
+    return {section.name: section.text for section in sections}
+
+
+def test_sections_that_fit_are_untouched(budget):
+    sections = [PromptSection("memory", name="memory"), PromptSection(QUESTION, name="question", required=True)]
+
+    assert budget.fit(sections, budget=100) == sections
+    assert budget.get_stats()["trimmed_prompts"] == 0
+
+
+def test_lowest_priority_section_goes_first_and_the_question_stays(budget):
+    sections = [
+        PromptSection("m" * 200, name="memory", priority=0),
+        PromptSection("recent topics: lists", name="history", priority=1),
+        PromptSection(QUESTION, name="question", required=True),
+    ]
+    fitted = texts(budget.fit(sections, budget=budget.count_tokens(QUESTION) + 40))
+
+    assert fitted["question"] == QUESTION
+    assert fitted["history"] == "recent topics: lists"
+    assert len(fitted.get("memory", "")) < 200
+    assert budget.get_stats()["trimmed_prompts"] == 1
+
+
+def test_sections_with_nothing_useful_left_are_dropped(budget):
+    sections = [PromptSection("m" * 200, name="memory"), PromptSection(QUESTION, name="question", required=True)]
+    fitted = budget.fit(sections, budget=budget.count_tokens(QUESTION) + 4)
+
+    assert texts(fitted) == {"question": QUESTION}
+    assert budget.get_stats()["dropped_sections"] == 1
+
+
+def test_keep_end_trims_old_lines_first(budget):
+    lines = [f"turn {n}" for n in range(10)]
+    trimmed = texts(budget.fit([PromptSection("\n".join(lines), name="history", keep="end")], budget=22))["history"]
+
+    kept = trimmed.split("\n")
+    assert kept[0] == MARKER
+    assert 0 < len(kept) - 1 < len(lines)
+    assert kept[1:] == lines[-(len(kept) - 1):]
+    assert budget.count_tokens(trimmed) <= 22
+
+
+def test_keep_start_keeps_the_first_lines(budget):
+    lines = [f"note {n}" for n in range(10)]
+    trimmed = texts(budget.fit([PromptSection("\n".join(lines), name="notes")], budget=22))["notes"]
+
+    kept = trimmed.split("\n")
+    assert kept[-1] == MARKER
+    assert 0 < len(kept) - 1 < len(lines)
+    assert kept[:-1] == lines[:len(kept) - 1]
+    assert budget.count_tokens(trimmed) <= 22
+
+
+def test_keep_both_cuts_from_the_middle(budget):
+    prompt = "a" * 30 + "b" * 30
+    trimmed = texts(budget.fit([PromptSection(prompt, name="prompt", required=True, keep="both")], budget=21))["prompt"]
+
+    head, tail = trimmed.split(MARKER)
+    assert head and set(head) == {"a"}
+    assert tail and set(tail) == {"b"}
+    assert abs(len(head) - len(tail)) <= 1
+    assert budget.count_tokens(trimmed) <= 21
+
+
+def test_fit_chat_trims_the_system_message_before_the_prompt(budget):
+    template = budget.template_tokens()
+    system, prompt = budget.fit_chat("s" * 400, QUESTION, max_new_tokens=512 - template - 60)
+
+    assert prompt == QUESTION
+    assert system.startswith("s") and system.endswith(MARKER)
+    assert budget.count_tokens(system) + budget.count_tokens(QUESTION) <= 60
+
+
+def test_context_is_capped_at_the_model_length(tiny_model):
+    model, tokenizer = tiny_model
+    budget = ContextBudget.from_config(tokenizer, model, {"max_context_tokens": 100000})
+
+    assert budget.max_context_tokens == model.config.max_position_embeddings
+
+
+def test_client_prompts_keep_the_question_at_the_end(tiny_model):
+    from studybuddy.core.llm_client import ProductionLLMClient
+    model, tokenizer = tiny_model
+    client = ProductionLLMClient(model=model, tokenizer=tokenizer, prefix_cache_mb=0, max_context_tokens=256)
+    try:
+        prompt = client.fit_prompt([
+            PromptSection("Earlier: " + "we covered loops. " * 40, name="memory"),
+            PromptSection(QUESTION, name="question", required=True),
+        ], system_message="You are a tutor.", max_tokens=64)
+        inputs = client._prepare_inputs(prompt, "You are a tutor.", max_tokens=64)
+
+        assert prompt.endswith(QUESTION)
+        assert inputs.input_ids.shape[1] + 64 <= 256
+        # The test tokenizer drops spaces
+        assert tokenizer.decode(inputs.input_ids[0]).endswith(
+            QUESTION.replace(" ", "") + "<|im_end|><|im_start|>assistant")
+    finally:
+        client.close()
@@ -0,0 +1,75 @@
+"""
+Tests for concurrent context gathering under a latency budget
+"""
+
+import time
+
+from studybuddy.agents.context_gathering import ContextGatherer
+from studybuddy.core.request_scheduler import Priority, current_request_context
+
+
+def sleeper(seconds, result):
+    def source():
+        time.sleep(seconds)
+        return result
+    return source
+
+
+def test_sources_run_concurrently():
+    gatherer = ContextGatherer()
+    started_at = time.perf_counter()
+    gathered = gatherer.gather({"memory": sleeper(0.2, "m"), "web_search": sleeper(0.2, "w")}, budget_seconds=2)
+
+    assert time.perf_counter() - started_at < 0.38
+    assert gathered.results == {"memory": "m", "web_search": "w"}
+    gatherer.shutdown()
+
+
+def test_late_and_failing_sources_are_left_out():
+    def broken():
+        raise ValueError("no index")
+
+    gatherer = ContextGatherer()
+    gathered = gatherer.gather({"fast": sleeper(0, "f"), "slow": sleeper(1, "s"), "broken": broken},
+                               budget_seconds=0.2)
+
+    assert gathered.results == {"fast": "f"}
+    assert {name: timing["status"] for name, timing in gathered.timings.items()} == \
+        {"fast": "ok", "slow": "timeout", "broken": "error"}
+    assert gathered.elapsed_seconds < 0.5
+    stats = gatherer.get_stats()
+    assert (stats["gathers"], stats["timeouts"], stats["errors"]) == (1, 1, 1)
+    gatherer.shutdown()
+
+
+def test_sources_run_at_tool_priority_within_the_budget():
+    gatherer = ContextGatherer()
+    gathered = gatherer.gather({"context": current_request_context}, budget_seconds=5)
+
+    context = gathered.results["context"]
+    assert context.priority == Priority.TOOL
+    assert 0 < context.deadline - time.monotonic() <= 5
+    gatherer.shutdown()
+
+
+def test_tutor_only_gathers_when_the_mode_is_on(tiny_model, tmp_path, monkeypatch):
+    from studybuddy.agents import enhanced_tutor
+    from studybuddy.core.llm_client import ProductionLLMClient
+    monkeypatch.chdir(tmp_path)
+    model, tokenizer = tiny_model
+    client = ProductionLLMClient(model=model, tokenizer=tokenizer, prefix_cache_mb=0)
+    gatherer = ContextGatherer()
+    monkeypatch.setattr(enhanced_tutor, "context_gatherer", gatherer)
+    try:
+        default = enhanced_tutor.EnhancedTutorAgent(client, student_id="gather_default")
+        default.teach("What is a list?", topic="python")
+        assert gatherer.gathers == 0
+
+        gathering = enhanced_tutor.EnhancedTutorAgent(client, student_id="gather_on", gather_context=True,
+                                                      context_budget_seconds=0.5)
+        gathering.teach("What is a list?", topic="python")
+        assert gatherer.gathers == 1
+        assert "memory" in gathering.last_context_timings
+    finally:
+        gatherer.shutdown()
+        client.close()
@@ -0,0 +1,57 @@
+"""
+Tests for the CPU inference backend
+"""
+
+import pytest
+import torch
+
+from studybuddy.core.cpu_backend import CPUBackendConfig, configure_threads, load_cpu_model
+from studybuddy.core.llm_client import ProductionLLMClient
+
+
+def test_config_defaults_and_validation():
+    config = CPUBackendConfig.from_dict({"dtype": "int8", "compile": True, "num_threads": None})
+
+    assert config.backend_name == "cpu-int8-compiled"
+    assert CPUBackendConfig.from_dict(None).backend_name == "cpu-bfloat16"
+    with pytest.raises(ValueError):
+        CPUBackendConfig.from_dict({"dtype": "float8"})
+
+
+def test_thread_settings_are_applied():
+    threads = torch.get_num_threads()
+    try:
+        configure_threads(CPUBackendConfig(num_threads=2))
+        assert torch.get_num_threads() == 2
+    finally:
+        torch.set_num_threads(threads)
+
+
+def test_bfloat16_weights(tiny_model_dir):
+    model = load_cpu_model(tiny_model_dir, CPUBackendConfig(dtype="bfloat16", num_interop_threads=None))
+
+    assert {parameter.dtype for parameter in model.parameters()} == {torch.bfloat16}
+
+
+def test_int8_quantizes_linear_layers(tiny_model_dir):
+    model = load_cpu_model(tiny_model_dir, CPUBackendConfig(dtype="int8", num_interop_threads=None))
+
+    linear_types = {type(module).__module__ for module in model.modules() if "Linear" in type(module).__name__}
+    assert linear_types and all("quantized" in name for name in linear_types)
+
+
+def test_client_reports_the_configured_backend(tiny_model_dir):
+    client = ProductionLLMClient(model_config={
+        # The CPU model name replaces the GPU checkpoint
+        "model": {"name": "unavailable/gpu-only-checkpoint", "device": "cpu"},
+        "cpu": {"model_name": tiny_model_dir, "dtype": "int8", "num_interop_threads": None},
+    }, prefix_cache_mb=0)
+    try:
+        assert client.generate_response("What is a list?", max_tokens=8, temperature=0.0)
+        backend = client.get_stats()["backend"]
+        assert backend["name"] == "cpu-int8"
+        assert backend["device"] == "cpu"
+        assert backend["tokens_per_second"] > 0
+        assert client.model_name == tiny_model_dir
+    finally:
+        client.close()
@@ -0,0 +1,158 @@
+"""
+Tests for the conversation memory
+"""
+
+import os
+import json
+
+import pytest
+
+from studybuddy.core import enhanced_memory
+from studybuddy.core.enhanced_memory import EmbeddingModelUnavailable
+
+
+def test_failed_embedding_model_load_is_remembered(monkeypatch):
+    attempts = []
+
+    def unreachable(model_name):
+        attempts.append(model_name)
+        raise OSError("no network")
+
+    monkeypatch.setattr(enhanced_memory, "SentenceTransformer", unreachable, raising=False)
+    monkeypatch.setattr(enhanced_memory, "_failed_embedding_models", {})
+
+    for _ in range(3):
+        with pytest.raises(EmbeddingModelUnavailable, match="no network"):
+            enhanced_memory._get_embedding_model("offline/model")
+    assert attempts == ["offline/model"]
+
+
+def open_memory(tmp_path, **kwargs):
+    return enhanced_memory.ConversationMemory("alice", memory_dir=str(tmp_path), semantic_search=False, **kwargs)
+
+
+def store(memory, n, topic="python"):
+    message = f"Question {n}: explain lists with an example"
+    memory.store_conversation("tutor", message, f"Answer {n}", topic=topic,
+                              emotion_data=memory.emotion_analyzer.analyze_emotion(message),
+                              understanding_level=float(n % 10))
+
+
+def log_lines(memory):
+    with open(memory.conversation_file) as f:
+        return f.read().splitlines()
+
+
+def test_conversations_are_appended_and_reloaded(tmp_path):
+    memory = open_memory(tmp_path)
+    for n in range(3):
+        store(memory, n)
+    memory.close()
+
+    assert len(log_lines(memory)) == 3
+    reopened = open_memory(tmp_path)
+    assert [conv["agent_response"] for conv in reopened.conversations] == ["Answer 0", "Answer 1", "Answer 2"]
+    reopened.close()
+
+
+def test_torn_lines_are_dropped_by_compaction(tmp_path):
+    memory = open_memory(tmp_path)
+    store(memory, 0)
+    memory.close()
+    with open(memory.conversation_file, "a") as f:
+        f.write('{"timestamp": "2024-01-0')
+
+    reopened = open_memory(tmp_path)
+    assert len(reopened.conversations) == 1
+    assert len(log_lines(reopened)) == 1
+    reopened.close()
+
+
+def test_compaction_keeps_the_most_recent_records(tmp_path):
+    memory = open_memory(tmp_path, max_records=10)
+    for n in range(12):
+        store(memory, n)
+
+    # Compaction waits for a 10% overshoot, then trims back to max_records
+    assert len(memory.conversations) == 10
+    assert memory.conversations[0]["agent_response"] == "Answer 2"
+    assert len(log_lines(memory)) == 10
+    memory.close()
+
+
+def test_legacy_json_history_is_migrated(tmp_path):
+    memory = open_memory(tmp_path)
+    store(memory, 0)
+    memory.close()
+    legacy = memory.conversations
+    os.remove(memory.conversation_file)
+    os.remove(memory.profile_file)
+    with open(memory.legacy_conversation_file, "w") as f:
+        json.dump(legacy, f)
+
+    migrated = open_memory(tmp_path)
+    assert migrated.conversations == legacy
+    assert len(log_lines(migrated)) == 1
+    migrated.close()
+
+
+def rescanned(conversations):
+    aggregates = enhanced_memory.ProfileAggregates()
+    for conversation in conversations:
+        aggregates.add(conversation)
+    return aggregates.to_dict()
+
+
+def test_profile_aggregates_round_trip():
+    memory_aggregates = enhanced_memory.ProfileAggregates()
+    memory_aggregates.add({
+        "timestamp": "2024-03-01T09:30:00", "topic": "loops", "understanding_level": 7.0,
+        "emotion_analysis": {"primary_emotion": "confident"}, "user_message": "Show an example",
+    })
+    restored = enhanced_memory.ProfileAggregates.from_dict(json.loads(json.dumps(memory_aggregates.to_dict())))
+
+    assert restored.to_dict() == memory_aggregates.to_dict()
+    assert restored.hour_counts == {9: 1}
+
+
+def test_aggregates_match_a_full_rescan_after_reload(tmp_path):
+    memory = open_memory(tmp_path)
+    for n in range(4):
+        store(memory, n, topic="python" if n % 2 else "loops")
+    memory.close()
+    with open(memory.profile_file) as f:
+        assert json.load(f)["record_count"] == 4
+
+    # A turn logged after the totals were saved is folded in on load
+    late = dict(memory.conversations[-1], topic="recursion")
+    with open(memory.conversation_file, "a") as f:
+        f.write(json.dumps(late) + "\n")
+    reopened = open_memory(tmp_path)
+
+    assert reopened.aggregates.to_dict() == rescanned(reopened.conversations)
+    profile = reopened.get_student_profile()
+    assert profile["total_conversations"] == 5
+    assert sorted(profile["topics_studied"]) == ["loops", "python", "recursion"]
+    reopened.close()
+
+
+def test_stale_profile_file_is_rebuilt(tmp_path):
+    memory = open_memory(tmp_path)
+    for n in range(3):
+        store(memory, n)
+    memory.close()
+    with open(memory.profile_file, "w") as f:
+        json.dump(dict(rescanned(memory.conversations), record_count=7), f)
+
+    reopened = open_memory(tmp_path)
+    assert reopened.aggregates.to_dict() == rescanned(reopened.conversations)
+    reopened.close()
+
+
+def test_compaction_rebuilds_aggregates_for_the_kept_records(tmp_path):
+    memory = open_memory(tmp_path, max_records=10)
+    for n in range(12):
+        store(memory, n)
+
+    assert memory.aggregates.to_dict() == rescanned(memory.conversations)
+    memory.close()
@@ -0,0 +1,55 @@
+"""
+Tests for the shared keyword matcher
+"""
+
+from studybuddy.core.keyword_matcher import KeywordMatcher, first_category, shared_matcher, top_category
+
+TEXTS = [
+    "I'm so frustrated, I don't understand recursion and I'm stressed about the deadline",
+    "Got it! That makes sense, I'm excited and ready to code",
+    "Can you explain the difference between a list vs a tuple, with an example?",
+    "I keep getting distracted and I'm putting off my study plan for the week",
+    "Finally got it, it clicked after I finished my goal",
+    "",
+    "nothing to see here",
+]
+
+
+def naive_scores(lexicons, text):
+    """What the agents computed before the matcher: one substring test per keyword"""
+    text = text.lower()
+    scores = {}
+    for lexicon, categories in lexicons.items():
+        scores[lexicon] = {}
+        for category, keywords in categories.items():
+            count = sum(1 for keyword in keywords if keyword in text)
+            if count:
+                scores[lexicon][category] = count
+    return scores
+
+
+def test_scores_match_per_keyword_substring_scans():
+    for text in TEXTS:
+        assert shared_matcher.score(text) == naive_scores(shared_matcher.lexicons, text)
+
+
+def test_overlapping_and_nested_keywords_are_all_found():
+    matcher = KeywordMatcher({"test": {"a": ["under", "understand", "stand"], "b": ["and i", "dig"]}})
+
+    assert matcher.find_keywords("Understand and I dig") == {"under", "understand", "stand", "and i", "dig"}
+    assert matcher.score("understand")["test"] == {"a": 3}
+
+
+def test_batch_scores_match_single_scores():
+    assert shared_matcher.score_batch(TEXTS) == [shared_matcher.score(text) for text in TEXTS]
+    assert shared_matcher.score_batch([]) == []
+
+
+def test_scores_keep_lexicon_order_for_ties():
+    scores = shared_matcher.score("I'm stuck and worried")["emotion"]
+
+    assert list(scores) == ["frustrated", "anxious"]
+    assert first_category(scores) == "frustrated"
+    assert top_category(scores) == "frustrated"
+    assert first_category({}) == "unknown"
+    assert top_category({}) == "neutral"
@@ -0,0 +1,40 @@
+"""
+Tests for the response length policy
+"""
+
+from studybuddy.agents.length_policy import (
+    ResponseLengthPolicy, length_metrics, length_policy_stats, shared_length_policy
+)
+
+
+def test_short_questions_get_smaller_budgets():
+    policy = ResponseLengthPolicy(max_tokens=400)
+
+    assert policy.predict("What is a list?") == 160
+    assert policy.predict("Create a study plan for next week") == 400
+    assert policy.predict("Tell me something") == 280
+
+
+def test_stats_report_budgets_per_intent_and_tokens_saved():
+    policy = ResponseLengthPolicy(max_tokens=400, agent_type="stats_test")
+    for message in ("What is a list?", "What is a tuple?", "Create a study plan", " ".join(["word"] * 50)):
+        policy.predict(message)
+
+    stats = policy.get_stats()
+    assert stats["predictions"] == 4
+    assert stats["tokens_saved"] == 2 * (400 - 160) + (400 - 340)
+    assert stats["by_intent"] == {
+        "quick": {"requests": 2, "average_budget": 160.0},
+        "plan": {"requests": 1, "average_budget": 400.0},
+        "long": {"requests": 1, "average_budget": 340.0},
+    }
+    assert 'studybuddy_length_max_tokens_count{agent_type="stats_test",intent="quick"} 2' in \
+        length_metrics.to_prometheus()
+
+
+def test_agents_of_one_type_share_a_policy():
+    policy = shared_length_policy("shared_test", max_tokens=300)
+
+    assert shared_length_policy("shared_test", max_tokens=300) is policy
+    policy.predict("Define recursion")
+    assert length_policy_stats()["shared_test"]["predictions"] == 1
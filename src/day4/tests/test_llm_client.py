@@ -0,0 +1,95 @@
+"""
+Tests for ProductionLLMClient on a tiny random-weight model
+"""
+
+import time
+
+import pytest
+
+from studybuddy.core.llm_client import ProductionLLMClient
+from studybuddy.core.request_scheduler import Priority, current_request_context
+
+PROMPTS = ["What is a list?", "Explain tuples", "Why use a dict over a list of pairs?"]
+
+
+@pytest.fixture
+def make_client(tiny_model):
+    model, tokenizer = tiny_model
+    clients = []
+
+    def make(**kwargs):
+        kwargs.setdefault("prefix_cache_mb", 0)
+        client = ProductionLLMClient(model=model, tokenizer=tokenizer, **kwargs)
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.close()
+
+
+def test_generate_batch_joins_the_scheduler_at_background_priority(make_client):
+    client = make_client(enable_batching=True)
+    responses = client.generate_batch(PROMPTS, max_tokens=12, temperature=0.0, batch_size=2)
+
+    assert len(responses) == len(PROMPTS)
+    admitted = client.get_stats()["batching"]["admitted_by_priority"]
+    assert admitted["background"] == len(PROMPTS)
+    assert admitted["interactive"] == 0
+
+
+def test_generate_batch_takes_the_priority_gate_per_micro_batch(make_client, monkeypatch):
+    client = make_client(enable_batching=False)
+    seen = []
+    generate = client._generate_micro_batch
+
+    def record(input_ids, max_tokens, temperature):
+        seen.append((current_request_context().priority, client._direct_gate.get_stats()["running"]))
+        return generate(input_ids, max_tokens, temperature)
+
+    monkeypatch.setattr(client, "_generate_micro_batch", record)
+    client.generate_batch(PROMPTS, max_tokens=8, temperature=0.0, batch_size=2)
+
+    # Two micro-batches, each holding the model's only slot at background priority
+    assert seen == [(Priority.BACKGROUND, 1), (Priority.BACKGROUND, 1)]
+    assert client._direct_gate.get_stats()["running"] == 0
+
+
+@pytest.mark.parametrize("enable_batching", [True, False])
+def test_stream_matches_generate_response(make_client, enable_batching):
+    client = make_client(enable_batching=enable_batching)
+    for max_tokens in (2, 24):
+        expected = client.generate_response(PROMPTS[0], max_tokens=max_tokens, temperature=0.0)
+        streamed = "".join(client.generate_stream(PROMPTS[0], max_tokens=max_tokens, temperature=0.0))
+        assert streamed == expected
+
+
+def test_short_stream_gets_the_fallback_message(make_client):
+    client = make_client(enable_batching=True)
+    # Two characters never pass the quality check
+    assert "".join(client.generate_stream(PROMPTS[0], max_tokens=2, temperature=0.0)) == \
+        ProductionLLMClient.FALLBACK_RESPONSE
+
+
+@pytest.mark.parametrize("enable_batching", [True, False])
+def test_closing_a_stream_stops_its_generation(make_client, enable_batching):
+    client = make_client(enable_batching=enable_batching, coalesce_requests=False)
+    passes = []
+    hook = client.model.register_forward_hook(lambda *args: passes.append(1))
+    try:
+        # A high temperature keeps the random model from ending on EOS early
+        stream = client.generate_stream(PROMPTS[1], max_tokens=400, temperature=5.0)
+        next(stream)
+        stream.close()
+        time.sleep(0.5)
+        settled = len(passes)
+        time.sleep(0.3)
+    finally:
+        hook.remove()
+
+    assert len(passes) == settled
+    assert settled < 300
+    if enable_batching:
+        assert client.get_stats()["batching"]["active_sequences"] == 0
+    else:
+        assert client._direct_gate.get_stats()["running"] == 0
@@ -0,0 +1,83 @@
+"""
+Tests for the latency histograms behind /stats and /metrics
+"""
+
+import pytest
+
+from studybuddy.core.metrics import Histogram, LatencyMetrics, prometheus_sample
+
+
+def test_percentiles_use_nearest_rank():
+    histogram = Histogram(buckets=(1.0, 10.0))
+    assert histogram.to_dict() == {"count": 0, "mean": None, "p50": None, "p95": None, "p99": None}
+
+    for value in range(1, 101):
+        histogram.observe(value / 10)
+
+    summary = histogram.to_dict()
+    assert summary["count"] == 100
+    assert summary["mean"] == pytest.approx(5.05)
+    assert (summary["p50"], summary["p95"], summary["p99"]) == (5.0, 9.5, 9.9)
+
+
+def test_labelled_series_are_kept_apart():
+    metrics = LatencyMetrics()
+    metrics.observe("request_seconds", 0.2, agent_type="tutor")
+    metrics.observe("request_seconds", 0.4, agent_type="goal")
+    metrics.observe("tokenize_seconds", 0.001)
+
+    result = metrics.to_dict()
+    assert result["request_seconds"]["agent_type=tutor"]["p50"] == 0.2
+    assert result["request_seconds"]["agent_type=goal"]["p50"] == 0.4
+    assert result["tokenize_seconds"]["count"] == 1
+
+
+def test_timer_observes_a_block_that_raises():
+    metrics = LatencyMetrics()
+    with pytest.raises(RuntimeError):
+        with metrics.time("request_seconds"):
+            raise RuntimeError("boom")
+
+    assert metrics.to_dict()["request_seconds"]["count"] == 1
+
+
+def test_prometheus_buckets_are_cumulative():
+    metrics = LatencyMetrics(namespace="test")
+    for value in (0.5, 2.0, 20.0):
+        metrics.observe("request_seconds", value, buckets=(1.0, 5.0), agent_type='tu"tor')
+
+    lines = metrics.to_prometheus().splitlines()
+    assert lines[0] == "# TYPE test_request_seconds histogram"
+    assert lines[1:] == [
+        'test_request_seconds_bucket{agent_type="tu\\"tor",le="1.0"} 1',
+        'test_request_seconds_bucket{agent_type="tu\\"tor",le="5.0"} 2',
+        'test_request_seconds_bucket{agent_type="tu\\"tor",le="+Inf"} 3',
+        'test_request_seconds_sum{agent_type="tu\\"tor"} 22.5',
+        'test_request_seconds_count{agent_type="tu\\"tor"} 3',
+    ]
+    assert LatencyMetrics().to_prometheus() == ""
+
+
+def test_prometheus_sample():
+    assert prometheus_sample("studybuddy_uptime_seconds", 12.5, help_text="Uptime") == (
+        "# HELP studybuddy_uptime_seconds Uptime\n"
+        "# TYPE studybuddy_uptime_seconds gauge\n"
+        "studybuddy_uptime_seconds 12.5\n"
+    )
+
+
+def test_client_records_generation_phases(tiny_model):
+    from studybuddy.core.llm_client import ProductionLLMClient
+
+    model, tokenizer = tiny_model
+    client = ProductionLLMClient(model=model, tokenizer=tokenizer, enable_batching=False, prefix_cache_mb=0)
+    try:
+        client.generate_response("What is a list?", max_tokens=8, temperature=0.0, use_cache=False)
+        latency = client.get_stats()["latency"]
+    finally:
+        client.close()
+
+    for name in ("tokenize_seconds", "queue_wait_seconds", "prefill_seconds",
+                 "time_to_first_token_seconds", "decode_seconds", "generation_seconds"):
+        assert latency[name]["count"] == 1, name
+    assert latency["time_to_first_token_seconds"]["p50"] >= latency["prefill_seconds"]["p50"]
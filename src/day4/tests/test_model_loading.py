@@ -0,0 +1,52 @@
+"""
+Tests for loading checkpoints from model_config.yaml settings
+"""
+
+import os
+import shutil
+
+import pytest
+import torch
+from transformers import AutoConfig, AutoModelForCausalLM
+
+from studybuddy.core.llm_client import ProductionLLMClient
+
+
+@pytest.fixture
+def bin_only_checkpoint(tiny_model_dir, tmp_path):
+    """The tiny model saved as pytorch_model.bin, with no .safetensors file"""
+    for name in os.listdir(tiny_model_dir):
+        if not name.endswith(".safetensors"):
+            shutil.copy(os.path.join(tiny_model_dir, name), tmp_path)
+    model = AutoModelForCausalLM.from_pretrained(tiny_model_dir)
+    torch.save(model.state_dict(), tmp_path / "pytorch_model.bin")
+    AutoConfig.from_pretrained(tiny_model_dir).save_pretrained(tmp_path)
+    return str(tmp_path)
+
+
+def load(path, startup):
+    return ProductionLLMClient(model_config={
+        "model": {"name": path, "device": "cpu"},
+        "cpu": {"dtype": "float32"},
+        "startup": startup,
+    }, prefix_cache_mb=0)
+
+
+@pytest.mark.parametrize("low_memory_load", [True, False])
+def test_bin_checkpoints_load(bin_only_checkpoint, low_memory_load):
+    client = load(bin_only_checkpoint, {"low_memory_load": low_memory_load})
+    try:
+        assert client.generate_response("What is a list?", max_tokens=4, temperature=0.0)
+    finally:
+        client.close()
+
+
+def test_low_memory_load_is_opt_in(tiny_model_dir, monkeypatch):
+    seen = []
+    monkeypatch.setattr(ProductionLLMClient, "_load_causal_lm",
+                        staticmethod(lambda name, cpu_config, **kwargs: seen.append(kwargs) or
+                                     AutoModelForCausalLM.from_pretrained(name).eval()))
+    load(tiny_model_dir, {}).close()
+    load(tiny_model_dir, {"low_memory_load": True}).close()
+
+    assert seen == [{}, {"low_cpu_mem_usage": True}]
@@ -0,0 +1,104 @@
+"""
+Tests for the model registry's loading, references and unloading
+"""
+
+import threading
+
+import pytest
+
+from studybuddy.core import model_registry as registry_module
+from studybuddy.core.llm_client import ensure_production_llm
+from studybuddy.core.model_registry import ModelRegistry
+
+
+class FakeClient:
+    """Stands in for a ProductionLLMClient"""
+    model_name = "fake"
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def registry():
+    registry = ModelRegistry(model_config={"models": {"tool": "default", "small": {}}})
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return FakeClient()
+
+    registry.register("default", loader)
+    registry.loads = loads
+    return registry
+
+
+def references(registry, name="default"):
+    return registry.get_stats()[name]["references"]
+
+
+def test_acquire_and_release_count_references(registry):
+    client = registry.acquire("default")
+    # Aliases share the slot they point to
+    assert registry.acquire("tool") is client
+    assert references(registry) == 2
+    assert registry.get_stats()["tool"] == {"alias_of": "default"}
+
+    registry.release("tool")
+    registry.release("default")
+    assert references(registry) == 0
+    with pytest.raises(ValueError):
+        registry.release("default")
+
+
+def test_unload_refuses_while_referenced(registry):
+    with registry.lease("default") as client:
+        with pytest.raises(RuntimeError):
+            registry.unload("default")
+        assert not client.closed
+
+    assert registry.unload("default")
+    assert client.closed
+    assert not registry.is_loaded("default")
+    assert not registry.unload("default")
+
+
+def test_get_loads_without_a_reference(registry):
+    client = registry.get("default")
+
+    assert references(registry) == 0
+    assert registry.unload("default")
+    assert client.closed
+
+
+def test_forced_unload_and_reload(registry):
+    first = registry.acquire("default")
+    assert registry.unload("default", force=True)
+    assert references(registry) == 0
+
+    assert registry.acquire("default") is not first
+    assert len(registry.loads) == 2
+
+
+def test_concurrent_first_acquires_load_once(registry):
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(registry.acquire("default"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert len(registry.loads) == 1
+    assert len({id(client) for client in clients}) == 1
+    assert references(registry) == 8
+
+
+def test_ensure_production_llm_leaves_the_model_unloadable(registry, monkeypatch):
+    monkeypatch.setattr(registry_module, "model_registry", registry)
+
+    assert ensure_production_llm() is ensure_production_llm()
+    assert references(registry) == 0
+    assert registry.unload("default")
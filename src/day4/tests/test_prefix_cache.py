@@ -0,0 +1,57 @@
+"""
+Tests for reusing prompt KV caches across requests sharing a token prefix
+"""
+
+import torch
+
+from studybuddy.core.llm_client import PrefixKVCache, ProductionLLMClient
+
+SYSTEM = "You are a patient Python tutor. Keep answers short, use examples, and check understanding. " * 2
+
+
+def layers(length, layer_count=2):
+    return [(torch.zeros(1, 2, length, 4), torch.zeros(1, 2, length, 4)) for _ in range(layer_count)]
+
+
+def test_lookup_returns_the_longest_shared_prefix():
+    cache = PrefixKVCache(min_prefix_tokens=4)
+    cache.store(torch.arange(10), layers(10))
+
+    reused, cropped = cache.lookup(torch.cat([torch.arange(6), torch.tensor([99, 98])]))
+    assert reused == 6
+    assert cropped[0][0].shape[2] == 6
+    # The whole prompt cached: one token is still left to prefill
+    assert cache.lookup(torch.arange(10))[0] == 9
+    assert cache.lookup(torch.tensor([5, 4, 3, 2, 1]))[0] == 0
+
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["prefill_tokens_reused"]) == (2, 1, 15)
+
+
+def test_least_recently_used_entries_are_evicted():
+    entry_bytes = sum(k.numel() * k.element_size() * 2 for k, _ in layers(8))
+    cache = PrefixKVCache(max_memory_mb=1, min_prefix_tokens=4)
+    cache.max_memory_bytes = 2 * entry_bytes
+    first, second, third = (torch.arange(8) + 100 * n for n in range(3))
+    cache.store(first, layers(8))
+    cache.store(second, layers(8))
+    cache.lookup(first)
+    cache.store(third, layers(8))
+
+    assert cache.get_stats()["evictions"] == 1
+    assert cache.lookup(second)[0] == 0
+    assert cache.lookup(first)[0] == 7
+
+
+def test_cached_prefix_gives_the_same_greedy_answers(tiny_model):
+    model, tokenizer = tiny_model
+    cached = ProductionLLMClient(model=model, tokenizer=tokenizer, prefix_cache_mb=16, coalesce_requests=False)
+    uncached = ProductionLLMClient(model=model, tokenizer=tokenizer, prefix_cache_mb=0, coalesce_requests=False)
+    try:
+        for prompt in ("What is a list?", "What is a dict?", "Explain tuples"):
+            kwargs = dict(max_tokens=12, temperature=0.0, system_message=SYSTEM, use_cache=False)
+            assert cached.generate_response(prompt, **kwargs) == uncached.generate_response(prompt, **kwargs)
+        assert cached.get_stats()["prefix_cache"]["hits"] >= 2
+    finally:
+        cached.close()
+        uncached.close()
@@ -0,0 +1,62 @@
+"""
+Tests for the chat-template token cache
+"""
+
+import pytest
+
+from studybuddy.core.llm_client import PromptTokenCache
+
+SYSTEMS = ["You are a patient Python tutor.", "You are a study coach. Keep plans short."]
+PROMPTS = ["What is a list?", "Explain <tags> and\nnew lines", "", "  spaced  "]
+
+
+@pytest.fixture
+def tokenizer(tiny_model):
+    return tiny_model[1]
+
+
+def full_encode(tokenizer, system_message, prompt, max_length=2048):
+    text = tokenizer.apply_chat_template(
+        [{"role": "system", "content": system_message}, {"role": "user", "content": prompt}],
+        tokenize=False, add_generation_prompt=True
+    )
+    return tokenizer(text, truncation=True, max_length=max_length).input_ids
+
+
+def test_segment_encoding_matches_full_encoding(tokenizer):
+    cache = PromptTokenCache(tokenizer)
+    for system_message in SYSTEMS:
+        for prompt in PROMPTS:
+            assert cache.encode(system_message, prompt) == full_encode(tokenizer, system_message, prompt)
+
+    stats = cache.get_stats()
+    assert (stats["misses"], stats["hits"]) == (2, 6)
+    # Only the first prompt per system message is tokenized in full
+    assert stats["full_tokenizations"] == 2
+
+
+def test_long_prompts_are_truncated_like_the_tokenizer(tokenizer):
+    cache = PromptTokenCache(tokenizer, max_length=64)
+    prompt = "word " * 40
+    cache.encode(SYSTEMS[0], "warm up")
+
+    assert cache.encode(SYSTEMS[0], prompt) == full_encode(tokenizer, SYSTEMS[0], prompt, max_length=64)
+
+
+def test_least_recently_used_system_messages_are_evicted(tokenizer):
+    cache = PromptTokenCache(tokenizer, max_entries=1)
+    cache.encode(SYSTEMS[0], "hi")
+    cache.encode(SYSTEMS[1], "hi")
+    cache.encode(SYSTEMS[0], "hi")
+
+    stats = cache.get_stats()
+    assert (stats["entries"], stats["evictions"], stats["misses"]) == (1, 2, 3)
+
+
+def test_templates_that_do_not_split_fall_back_to_full_encoding(tokenizer, monkeypatch):
+    cache = PromptTokenCache(tokenizer)
+    monkeypatch.setattr(cache, "_encode_segments", lambda entry, prompt: [])
+
+    for prompt in PROMPTS:
+        assert cache.encode(SYSTEMS[0], prompt) == full_encode(tokenizer, SYSTEMS[0], prompt)
+    assert cache.get_stats()["full_tokenizations"] == len(PROMPTS)
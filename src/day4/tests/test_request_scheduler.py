@@ -0,0 +1,153 @@
+"""
+Tests for request priorities, fair queueing and deadlines
+"""
+
+import time
+import queue
+import threading
+from dataclasses import dataclass
+
+import pytest
+
+from studybuddy.core.request_scheduler import (
+    Priority, RequestContext, RequestExpiredError, FairRequestQueue, PriorityGate,
+    current_request_context, request_context
+)
+
+
+@dataclass
+class Item:
+    name: str
+    context: RequestContext
+
+
+def item(name, priority=Priority.INTERACTIVE, student_id="alice", deadline=None):
+    return Item(name, RequestContext(priority=priority, student_id=student_id, deadline=deadline))
+
+
+def drain_names(fair_queue, **kwargs):
+    names = []
+    while True:
+        try:
+            names.append(fair_queue.get_nowait(**kwargs).name)
+        except queue.Empty:
+            return names
+
+
+def test_request_context_inherits_and_only_tightens_deadlines():
+    with request_context(priority=Priority.INTERACTIVE, student_id="alice", timeout=10) as outer:
+        with request_context(priority=Priority.TOOL, timeout=60) as inner:
+            assert inner.student_id == "alice"
+            assert inner.priority == Priority.TOOL
+            assert inner.deadline == outer.deadline
+        assert current_request_context() == outer
+    assert current_request_context().deadline is None
+
+
+def test_queue_serves_priority_classes_in_order():
+    fair_queue = FairRequestQueue()
+    fair_queue.put(item("plan", Priority.BACKGROUND))
+    fair_queue.put(item("search", Priority.TOOL))
+    fair_queue.put(item("chat", Priority.INTERACTIVE))
+
+    assert drain_names(fair_queue) == ["chat", "search", "plan"]
+
+
+def test_queue_round_robins_students_within_a_class():
+    fair_queue = FairRequestQueue()
+    for n in range(3):
+        fair_queue.put(item(f"alice-{n}", student_id="alice"))
+    fair_queue.put(item("bob-0", student_id="bob"))
+
+    assert drain_names(fair_queue) == ["alice-0", "bob-0", "alice-1", "alice-2"]
+
+
+def test_queue_respects_max_priority():
+    fair_queue = FairRequestQueue()
+    fair_queue.put(item("plan", Priority.BACKGROUND))
+
+    assert drain_names(fair_queue, max_priority=Priority.INTERACTIVE) == []
+    assert drain_names(fair_queue) == ["plan"]
+
+
+def test_queue_hands_expired_items_to_callback():
+    dropped = []
+    fair_queue = FairRequestQueue(on_expired=dropped.append)
+    fair_queue.put(item("late", deadline=time.monotonic() - 1))
+    fair_queue.put(item("on-time", deadline=time.monotonic() + 60))
+
+    assert drain_names(fair_queue) == ["on-time"]
+    assert [late.name for late in dropped] == ["late"]
+    assert fair_queue.get_stats()["expired"] == 1
+
+
+def test_queue_full_without_blocking():
+    fair_queue = FairRequestQueue(max_size=1)
+    fair_queue.put(item("first"))
+    with pytest.raises(queue.Full):
+        fair_queue.put(item("second"), block=False)
+
+
+def test_gate_admits_waiters_by_priority():
+    gate = PriorityGate(capacity=1)
+    order = []
+    release = threading.Event()
+
+    def holder():
+        with gate.slot(RequestContext()):
+            release.wait()
+
+    def waiter(name, priority):
+        with gate.slot(RequestContext(priority=priority)):
+            order.append(name)
+
+    threads = [threading.Thread(target=holder)]
+    threads[0].start()
+    while gate.get_stats()["running"] == 0:
+        time.sleep(0.001)
+    for name, priority in (("plan", Priority.BACKGROUND), ("chat", Priority.INTERACTIVE)):
+        thread = threading.Thread(target=waiter, args=(name, priority))
+        thread.start()
+        threads.append(thread)
+        while sum(gate.get_stats()["queued"].values()) < len(threads) - 1:
+            time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert order == ["chat", "plan"]
+    assert gate.get_stats()["running"] == 0
+
+
+def test_gate_refuses_a_free_slot_to_an_expired_caller():
+    gate = PriorityGate(capacity=1)
+    with pytest.raises(RequestExpiredError):
+        with gate.slot(RequestContext(deadline=time.monotonic() - 1)):
+            pytest.fail("expired caller was admitted")
+
+    stats = gate.get_stats()
+    assert stats["expired"] == 1
+    # The slot was handed back
+    assert stats["running"] == 0
+    with gate.slot(RequestContext()):
+        assert gate.get_stats()["running"] == 1
+
+
+@pytest.mark.parametrize("enable_batching", [True, False])
+def test_client_drops_expired_requests_on_both_paths(tiny_model, enable_batching):
+    from studybuddy.core.llm_client import ProductionLLMClient
+    model, tokenizer = tiny_model
+    client = ProductionLLMClient(model=model, tokenizer=tokenizer, enable_batching=enable_batching, prefix_cache_mb=0)
+    try:
+        with request_context(deadline=time.monotonic() - 1):
+            response = client.generate_response("Too late", max_tokens=20, temperature=0.0)
+
+        assert "technical difficulties" in response
+        stats = client.get_stats()
+        assert stats["total_tokens_generated"] == 0
+        if enable_batching:
+            assert stats["batching"]["expired_while_queued"] == 1
+        else:
+            assert stats["scheduling"]["expired"] == 1
+    finally:
+        client.close()
@@ -0,0 +1,57 @@
+"""
+Tests for the opt-in response cache
+"""
+
+import pytest
+
+from studybuddy.core.llm_client import ProductionLLMClient
+from studybuddy.core.response_cache import ResponseCache
+from studybuddy.agents.enhanced_session import EnhancedSessionAgent
+from studybuddy.agents.enhanced_tutor import EnhancedTutorAgent
+
+
+@pytest.fixture
+def client(tiny_model):
+    model, tokenizer = tiny_model
+    client = ProductionLLMClient(model=model, tokenizer=tokenizer, prefix_cache_mb=0,
+                                 response_cache=ResponseCache(max_entries=16))
+    yield client
+    client.close()
+
+
+def hits(client):
+    stats = client.response_cache.get_stats()
+    return stats["memory_hits"] + stats["disk_hits"]
+
+
+def test_repeated_prompts_are_served_from_the_cache(client):
+    first = client.generate_response("What is a list?", max_tokens=8, temperature=0.7)
+
+    assert client.generate_response("What is a list?", max_tokens=8, temperature=0.7) == first
+    assert hits(client) == 1
+
+
+def test_sampled_calls_can_bypass_the_cache(client):
+    for _ in range(2):
+        client.generate_response("What is a list?", max_tokens=8, temperature=0.7, use_cache=False)
+        "".join(client.generate_stream("What is a list?", max_tokens=8, temperature=0.7, use_cache=False))
+
+    assert hits(client) == 0
+    assert client.response_cache.get_stats()["stores"] == 0
+
+
+def test_agent_answers_do_not_hit_the_cache(client, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    tutor = EnhancedTutorAgent(client, student_id="cache_student")
+    session = EnhancedSessionAgent(client, student_id="cache_student")
+    try:
+        for _ in range(2):
+            tutor.teach("What is a list?", topic="python")
+            "".join(tutor.teach_stream("What is a list?", topic="python"))
+            session.manage_time("Plan my study week")
+            "".join(session.manage_time_stream("Plan my study week"))
+    finally:
+        tutor.close()
+
+    assert hits(client) == 0
+    assert client.response_cache.get_stats()["stores"] == 0
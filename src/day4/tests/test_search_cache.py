@@ -0,0 +1,144 @@
+"""
+Tests for the web search circuit breaker and result cache
+"""
+
+import sys
+import time
+import types
+
+import pytest
+
+from studybuddy.tools.learning_tools import WebSearchTool
+from studybuddy.tools.search_cache import CircuitBreaker, SearchResultCache
+from studybuddy.tools.search_index import SearchIndex
+
+
+def test_breaker_opens_half_opens_and_closes():
+    breaker = CircuitBreaker("test", failure_threshold=2, cooldown_seconds=0.05)
+    breaker.record_failure("timeout")
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure("timeout")
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # One probe goes through, everyone else keeps short-circuiting
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    stats = breaker.get_stats()
+    assert stats["trips"] == 1
+    assert stats["short_circuits"] == 2
+
+
+def test_failed_probe_reopens_the_breaker():
+    breaker = CircuitBreaker("test", failure_threshold=1, cooldown_seconds=0.05)
+    breaker.record_failure("timeout")
+    time.sleep(0.06)
+    assert breaker.allow()
+
+    breaker.record_failure("still down")
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.get_stats()["trips"] == 2
+
+
+def test_permanent_failure_stays_open_until_reset():
+    breaker = CircuitBreaker("test", cooldown_seconds=0.01)
+    breaker.record_failure("not installed", permanent=True)
+    time.sleep(0.02)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    breaker.reset()
+    assert breaker.allow()
+
+
+def test_cache_keeps_empty_results_for_the_negative_ttl(tmp_path):
+    cache = SearchResultCache(negative_ttl_seconds=0.05, disk_path=str(tmp_path / "search.sqlite"))
+    found = SearchResultCache.make_key("duckduckgo", "Python loops")
+    empty = SearchResultCache.make_key("duckduckgo", "zzz")
+    cache.set(found, [{"title": "Loops"}])
+    cache.set(empty, [])
+
+    # Case and spacing are folded into the key
+    assert cache.get(SearchResultCache.make_key("duckduckgo", "  python   LOOPS")) == [{"title": "Loops"}]
+    assert cache.get(empty) == []
+    time.sleep(0.06)
+    assert cache.get(empty) is None
+    assert cache.get(found) == [{"title": "Loops"}]
+    assert cache.get_stats()["negative_hits"] == 1
+    cache.close()
+
+    reopened = SearchResultCache(disk_path=str(tmp_path / "search.sqlite"))
+    assert reopened.get(found) == [{"title": "Loops"}]
+    reopened.close()
+
+
+class FakeDDGS:
+    """Stands in for duckduckgo_search.DDGS"""
+    calls = 0
+    mode = "ok"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def text(self, query, max_results=5):
+        FakeDDGS.calls += 1
+        if FakeDDGS.mode == "fail":
+            raise RuntimeError("unreachable")
+        if FakeDDGS.mode == "empty":
+            return []
+        return [{"title": "Python loops", "href": "https://example.org/loops", "body": "for and while"}]
+
+
+@pytest.fixture
+def tool(tmp_path, monkeypatch):
+    FakeDDGS.calls, FakeDDGS.mode = 0, "ok"
+    monkeypatch.setitem(sys.modules, "duckduckgo_search", types.SimpleNamespace(DDGS=FakeDDGS))
+    return WebSearchTool(
+        search_index=SearchIndex(corpus_paths=[], index_path=str(tmp_path / "index.json")),
+        result_cache=SearchResultCache(negative_ttl_seconds=60),
+        breaker=CircuitBreaker("Web search", failure_threshold=2, cooldown_seconds=60),
+        offline=False
+    )
+
+
+def test_repeated_searches_hit_the_cache(tool):
+    first = tool.search_educational_content("loops", "python")
+    again = tool.search_educational_content("LOOPS ", "python")
+
+    assert [result.title for result in first] == [result.title for result in again] == ["Python loops"]
+    assert FakeDDGS.calls == 1
+
+
+def test_searches_without_results_are_not_resent(tool):
+    FakeDDGS.mode = "empty"
+    tool.search_educational_content("zzz", "python")
+    tool.search_educational_content("zzz", "python")
+
+    assert FakeDDGS.calls == 1
+    assert tool.result_cache.get_stats()["negative_hits"] == 1
+
+
+def test_failing_backend_is_skipped(tool):
+    FakeDDGS.mode = "fail"
+    for n in range(5):
+        assert tool.search_educational_content(f"query {n}", "python")
+
+    # Two failures trip the breaker; the rest go straight to the fallbacks
+    assert FakeDDGS.calls == 2
+    assert tool.breaker.get_stats()["short_circuits"] == 3
+
+
+def test_missing_client_library_opens_the_breaker_for_good(tool, monkeypatch):
+    monkeypatch.setitem(sys.modules, "duckduckgo_search", None)
+    tool.search_educational_content("loops", "python")
+
+    assert tool.breaker.state == CircuitBreaker.OPEN
+    assert "not available" in tool.breaker.get_stats()["last_error"]
@@ -0,0 +1,94 @@
+"""
+Tests for the offline BM25 search index
+"""
+
+import os
+import json
+import subprocess
+import sys
+
+import yaml
+
+from conftest import PROJECT_DIR
+from studybuddy.tools.search_index import SearchIndex, tokenize
+
+
+def write(path, content):
+    path.write_text(content, encoding="utf-8")
+    # Make sure a rewrite within the same second still looks changed
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 1))
+
+
+def titles(results):
+    return [document.title for document, _ in results]
+
+
+def test_tokenize_drops_stopwords_and_plurals():
+    assert tokenize("What are the Python lists?") == ["python", "list"]
+
+
+def test_add_change_remove_cycle(tmp_path):
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    guide = corpus / "guide.md"
+    write(guide, "# Loops\n\nFor loops guide\nIterate over a range with for.\n")
+    index = SearchIndex(corpus_paths=[str(corpus)], index_path=str(tmp_path / "index.json"))
+
+    assert index.update() == {"added": 1, "changed": 0, "removed": 0, "documents": 1}
+    assert titles(index.search("iterate range")) == ["For loops guide"]
+    # Nothing changed on disk: nothing is re-read
+    assert index.update() == {"added": 0, "changed": 0, "removed": 0, "documents": 1}
+
+    dump = corpus / "dump.jsonl"
+    write(dump, json.dumps({"title": "Dict methods", "url": "https://docs.python.org/3/", "text": "get keys items"}))
+    assert index.update()["added"] == 1
+    assert titles(index.search("dict keys")) == ["Dict methods"]
+
+    write(guide, "# Functions\n\nDefining functions\nUse def and return values.\n")
+    assert index.update()["changed"] == 1
+    assert index.search("iterate range") == []
+    assert titles(index.search("def return")) == ["Defining functions"]
+
+    dump.unlink()
+    assert index.update() == {"added": 0, "changed": 0, "removed": 1, "documents": 1}
+    assert index.search("dict keys") == []
+    # Postings of removed passages are cleaned up too
+    assert "dict" not in index._postings
+
+
+def test_saved_index_reloads_without_reparsing(tmp_path):
+    corpus = tmp_path / "notes.md"
+    write(corpus, "Recursion basics\nA function calling itself.\n")
+    index_path = str(tmp_path / "index.json")
+    SearchIndex(corpus_paths=[str(corpus)], index_path=index_path).update()
+
+    reopened = SearchIndex(corpus_paths=[str(corpus)], index_path=index_path)
+    assert reopened.update()["added"] == 0
+    assert titles(reopened.search("recursion")) == ["Recursion basics"]
+
+
+def test_cli_import_survives_reopening_with_app_config(tmp_path):
+    dump = tmp_path / "dump.jsonl"
+    write(dump, json.dumps({"title": "Zebra library", "url": "https://example.org/zebra", "text": "stripes"}))
+    index_path = str(tmp_path / "index.json")
+    subprocess.run(
+        [sys.executable, os.path.join(PROJECT_DIR, "scripts", "build_search_index.py"), str(dump),
+         "--index", index_path],
+        check=True, capture_output=True
+    )
+
+    # Open it the way the API does: only the corpus paths from app_config.yaml
+    with open(os.path.join(PROJECT_DIR, "config", "app_config.yaml")) as f:
+        search_config = yaml.safe_load(f)["search"]
+    corpus_paths = [os.path.join(PROJECT_DIR, path) for path in search_config["corpus_paths"]]
+    index = SearchIndex(corpus_paths=corpus_paths, index_path=index_path)
+
+    assert index.update()["removed"] == 0
+    assert titles(index.search("zebra")) == ["Zebra library"]
+    assert index.imported_paths == [str(dump)]
+
+    # An imported file that is deleted is dropped like any other
+    dump.unlink()
+    assert index.update()["removed"] == 1
+    assert index.search("zebra") == []
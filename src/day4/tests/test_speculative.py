@@ -0,0 +1,90 @@
+"""
+Tests for assisted (speculative) generation with a draft model
+"""
+
+import pytest
+import torch
+from transformers import AutoModelForCausalLM, Qwen2Config, Qwen2ForCausalLM
+
+from studybuddy.core.llm_client import ProductionLLMClient
+
+QUESTION = "What is a list comprehension?"
+
+
+def make_draft(model, seed, vocab_size=None):
+    """A smaller random model sharing the target's tokenizer"""
+    torch.manual_seed(seed)
+    config = Qwen2Config(
+        vocab_size=vocab_size or model.config.vocab_size, hidden_size=32, intermediate_size=64,
+        num_hidden_layers=1, num_attention_heads=2, num_key_value_heads=1, max_position_embeddings=4096,
+        eos_token_id=model.config.eos_token_id, pad_token_id=model.config.pad_token_id
+    )
+    return Qwen2ForCausalLM(config).eval()
+
+
+@pytest.fixture
+def make_client(tiny_model):
+    model, tokenizer = tiny_model
+    clients = []
+
+    def make(**kwargs):
+        client = ProductionLLMClient(model=model, tokenizer=tokenizer, prefix_cache_mb=0, **kwargs)
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.close()
+
+
+def test_greedy_output_matches_plain_generation(make_client, tiny_model):
+    plain = make_client(enable_batching=False)
+    assisted = make_client(draft_model=make_draft(tiny_model[0], seed=1), draft_model_name="tiny-draft")
+
+    expected = plain.generate_response(QUESTION, max_tokens=16, temperature=0.0, use_cache=False)
+    assert assisted.generate_response(QUESTION, max_tokens=16, temperature=0.0, use_cache=False) == expected
+
+    stats = assisted.get_stats()
+    assert "batching" not in stats
+    speculative = stats["speculative"]
+    assert speculative["draft_model"] == "tiny-draft"
+    assert speculative["assisted_requests"] == 1
+    assert speculative["drafted_tokens"] > 0
+    assert 0 <= speculative["acceptance_rate"] <= 1
+    assert speculative["tokens_per_target_step"] >= 1
+
+
+def test_draft_with_the_same_weights_accepts_its_tokens(make_client, tiny_model_dir):
+    client = make_client(draft_model=AutoModelForCausalLM.from_pretrained(tiny_model_dir).eval())
+
+    client.generate_response(QUESTION, max_tokens=16, temperature=0.0, use_cache=False)
+
+    speculative = client.get_stats()["speculative"]
+    assert speculative["accepted_tokens"] > 0
+    assert speculative["tokens_per_target_step"] > 1
+
+
+def test_draft_with_a_padded_vocabulary_assists_greedy_requests_only(make_client, tiny_model):
+    model, _ = tiny_model
+    plain = make_client(enable_batching=False)
+    client = make_client(draft_model=make_draft(model, seed=2, vocab_size=model.config.vocab_size + 8))
+
+    client.generate_response(QUESTION, max_tokens=8, temperature=0.7, use_cache=False)
+    assert client.get_stats()["speculative"]["assisted_requests"] == 0
+
+    expected = plain.generate_response(QUESTION, max_tokens=8, temperature=0.0, use_cache=False)
+    assert client.generate_response(QUESTION, max_tokens=8, temperature=0.0, use_cache=False) == expected
+    assert client.get_stats()["speculative"]["assisted_requests"] == 1
+
+
+def test_close_removes_the_forward_hooks(tiny_model):
+    model, tokenizer = tiny_model
+    draft = make_draft(model, seed=3)
+    hooks = len(model._forward_hooks)
+
+    client = ProductionLLMClient(model=model, tokenizer=tokenizer, prefix_cache_mb=0, draft_model=draft)
+    assert len(model._forward_hooks) == hooks + 1
+    client.close()
+
+    assert len(model._forward_hooks) == hooks
+    assert not draft._forward_hooks